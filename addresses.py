@@ -0,0 +1,104 @@
+import re
+from functools import cached_property
+from types import MappingProxyType
+from typing import Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+# USPS street suffix abbreviations (Publication 28, common forms)
+STREET_SUFFIXES = MappingProxyType({
+    'ALLEY': 'ALY', 'AVENUE': 'AVE', 'AV': 'AVE', 'BOULEVARD': 'BLVD', 'BOUL': 'BLVD', 'BYPASS': 'BYP',
+    'CENTER': 'CTR', 'CENTRE': 'CTR', 'CIRCLE': 'CIR', 'COURT': 'CT', 'COVE': 'CV', 'CROSSING': 'XING',
+    'DRIVE': 'DR', 'EXPRESSWAY': 'EXPY', 'EXTENSION': 'EXT', 'FREEWAY': 'FWY', 'HIGHWAY': 'HWY',
+    'HWAY': 'HWY', 'JUNCTION': 'JCT', 'LANE': 'LN', 'LOOP': 'LOOP', 'MALL': 'MALL', 'PARKWAY': 'PKWY',
+    'PKY': 'PKWY', 'PIKE': 'PIKE', 'PLACE': 'PL', 'PLAZA': 'PLZ', 'POINT': 'PT', 'ROAD': 'RD',
+    'ROUTE': 'RTE', 'SQUARE': 'SQ', 'STREET': 'ST', 'STR': 'ST', 'TERRACE': 'TER', 'TRAIL': 'TRL',
+    'TURNPIKE': 'TPKE', 'WAY': 'WAY'
+})
+
+DIRECTIONALS = MappingProxyType({
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW'
+})
+
+UNIT_DESIGNATORS = MappingProxyType({
+    'APARTMENT': 'APT', 'BUILDING': 'BLDG', 'DEPARTMENT': 'DEPT', 'FLOOR': 'FL', 'ROOM': 'RM',
+    'SUITE': 'STE', 'UNIT': 'UNIT'
+})
+
+# Every word that has a canonical short form
+CANONICAL_WORDS = MappingProxyType({**STREET_SUFFIXES, **DIRECTIONALS, **UNIT_DESIGNATORS})
+
+# Periods and apostrophes vanish ("N.W." -> "NW"); any other punctuation separates words
+_DROPPED = re.compile(r"[.'’]")
+_SEPARATORS = re.compile(r'[^\w\s]|_')
+
+
+def canonical_address(text: str) -> str:
+    """Case-folded, punctuation-free, whitespace-collapsed address with suffixes and directionals abbreviated"""
+    text = _SEPARATORS.sub(' ', _DROPPED.sub('', text.upper()))
+    return ' '.join([CANONICAL_WORDS.get(word, word) for word in text.split()])
+
+
+def factorize_cells(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """pd.factorize (missing cells coded -1) that keeps equal values of different types apart
+
+    pd.factorize puts 1, 1.0 and True under one code, so anything evaluated once per distinct
+    value would see whichever came first. In object columns each (type, value) pair gets its
+    own code; columns of a single dtype cannot mix types and are factorized as they are.
+    """
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    if column.dtype != object or len(uniques) == 0:
+        return codes, uniques
+    type_codes, types = pd.factorize(column.map(type, na_action='ignore'), use_na_sentinel=True)
+    if len(types) <= 1:
+        return codes, uniques
+    
+    present = np.flatnonzero(codes >= 0)
+    pair_codes = np.full(len(codes), -1, dtype=np.int64)
+    pair_codes[present], _ = pd.factorize(codes[present].astype(np.int64) * len(types) + type_codes[present])
+    # Codes are numbered in order of first appearance, so the first rows give the values in code order
+    _, first = np.unique(pair_codes[present], return_index=True)
+    return pair_codes, column.to_numpy(dtype=object)[present[first]]
+
+
+class NormalizedColumn:
+    """One address-like column, normalized once per distinct cell value
+
+    codes maps each row to an entry of the per-value arrays (-1 for missing cells):
+    text is str() of the cell, folded its upper-cased text, blank whether it is only
+    whitespace, and canonical the canonical_address() form (built on first use).
+    """
+
+    def __init__(self, column: pd.Series):
+        codes, uniques = factorize_cells(column)
+        self.codes = codes.astype(np.int64)
+        self.text = np.array([str(value) for value in uniques], dtype=object)
+        self.folded = np.array([text.upper() for text in self.text], dtype=object)
+        self.blank = np.array([not text.strip() for text in self.text], dtype=bool)
+
+    @cached_property
+    def canonical(self) -> np.ndarray:
+        return np.array([canonical_address(text) for text in self.text], dtype=object)
+
+    def factorized(self, start: int = 0, form: str = 'text'):
+        """(codes, values) from row start on, in the shape DataValidator.evaluate_factorized takes"""
+        return self.codes[start:], getattr(self, form)
+
+    def rows_where(self, value_mask: np.ndarray) -> np.ndarray:
+        """Row positions whose (non-missing) value is selected by a per-value mask"""
+        if len(value_mask) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero((self.codes >= 0) & value_mask[self.codes])
+
+    def missing_or_blank(self) -> np.ndarray:
+        """Per-row mask of missing or whitespace-only cells"""
+        if len(self.blank) == 0:
+            return self.codes < 0
+        return (self.codes < 0) | self.blank[self.codes]
+
+    def value(self, position: int, form: str = 'text') -> Any:
+        """One row's value in the given form, '' for a missing cell"""
+        code = self.codes[position]
+        return getattr(self, form)[code] if code >= 0 else ''
@@ -0,0 +1,63 @@
+import os
+from typing import Optional, Tuple
+
+# Peak working memory per sheet cell, measured on typical matching files (44 columns,
+# mostly short text; parsing with xlsx_reader, as peak RSS over the imported modules)
+# and rounded up for headroom
+PARSE_BYTES_PER_CELL = 64
+VALIDATE_BYTES_PER_CELL = 64
+
+# An .xlsx expands to roughly this many bytes of parse memory per byte on disk;
+# used when the sheet does not declare its dimensions
+PARSE_BYTES_PER_FILE_BYTE = 20
+
+# Fixed overhead of any job (interpreter objects, openpyxl workbook, result lists)
+BASE_JOB_BYTES = 32 * 1024 * 1024
+
+DEFAULT_COLUMNS = 44
+
+
+def workbook_shape(source) -> Tuple[int, int]:
+    """(rows, columns) declared by the first worksheet, without parsing the cells"""
+    from preflight import inspect_workbook
+
+    # The <dimension> element in the sheet XML; openpyxl for .xls files and sheets without one
+    try:
+        sheets = inspect_workbook(source)['sheets']
+        if sheets and sheets[0]['rows'] is not None:
+            return sheets[0]['rows'], sheets[0]['columns']
+    except ValueError:
+        pass
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        return sheet.max_row or 0, sheet.max_column or 0
+    finally:
+        workbook.close()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+
+def estimate_parse_memory(file_size: int, rows: Optional[int] = None, columns: Optional[int] = None) -> int:
+    """Peak bytes needed to turn a workbook into a DataFrame"""
+    by_size = file_size * PARSE_BYTES_PER_FILE_BYTE
+    if not rows:
+        return BASE_JOB_BYTES + by_size
+    by_cells = rows * (columns or DEFAULT_COLUMNS) * PARSE_BYTES_PER_CELL
+    return BASE_JOB_BYTES + max(by_cells, by_size)
+
+
+def estimate_validation_memory(rows: int, columns: Optional[int] = None) -> int:
+    """Peak bytes the checks allocate on top of an already loaded DataFrame"""
+    return BASE_JOB_BYTES + rows * (columns or DEFAULT_COLUMNS) * VALIDATE_BYTES_PER_CELL
+
+
+def default_memory_budget() -> int:
+    """Half of physical memory, leaving room for the sessions' own DataFrames"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
@@ -0,0 +1,404 @@
+"""Write the uploaded workbook back with flagged cells highlighted and commented.
+
+The .xlsx package is copied entry by entry. Only the first worksheet, its
+relationships, styles.xml and [Content_Types].xml are changed, and the worksheet
+XML is streamed row by row: rows without issues pass through untouched, and in
+flagged rows only the flagged cells get a new style index. The reasons go into a
+new comments part.
+
+Headless use:
+    python annotate.py workbook.xlsx annotated.xlsx
+"""
+import argparse
+import codecs
+import posixpath
+import re
+import shutil
+import zipfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
+
+from layout import SheetLayout, column_letter
+
+# Checks whose issues point at specific cells -> layout fields holding those cells
+RULE_FIELDS = {
+    'banner_mismatches': ['client_banner', 'matched_banner'],
+    'address_column_mismatches': ['client_address', 'matched_address'],
+    'trade_errors': ['trade_code'],
+    'z_code_errors': ['z_code'],
+    'non_us_states': ['state_o', 'state_p'],
+    'cross_batch_repeats': ['job_id', 'client_store_id']
+}
+
+# Light red fill, same as Excel's built-in "Bad" cell style
+FLAG_FILL = '<fill><patternFill patternType="solid"><fgColor rgb="FFFFC7CE"/><bgColor indexed="64"/></patternFill></fill>'
+COMMENT_AUTHOR = 'Matching QC'
+
+CHUNK_SIZE = 1 << 20
+
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_COMMENTS_TYPE = _REL_NS + '/comments'
+_VML_TYPE = _REL_NS + '/vmlDrawing'
+_COMMENTS_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.comments+xml'
+_VML_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.vmlDrawing'
+
+_ROW_TAG = re.compile(r'<row\b[^>]*?(/?)>')
+_ROW_NUMBER = re.compile(r'\sr="(\d+)"')
+_CELL_TAG = re.compile(r'<c\b[^>]*?\sr="([A-Z]+)\d+"[^>]*?(/?)>')
+_STYLE_ATTR = re.compile(r'\ss="(\d+)"')
+_XF = re.compile(r'<xf\b[^>]*?/>|<xf\b[^>]*?>.*?</xf>', re.S)
+
+# Elements that must follow <legacyDrawing> in a worksheet
+_AFTER_LEGACY_DRAWING = ['<legacyDrawingHF', '<drawingHF', '<picture', '<oleObjects', '<controls',
+                         '<webPublishItems', '<tableParts', '<extLst', '</worksheet>']
+
+
+def flagged_cells(results, layout: Optional[SheetLayout] = None) -> Dict[int, Dict[int, List[str]]]:
+    """Excel row -> {0-based column -> [reasons]} for every issue that points at cells"""
+    layout = layout or getattr(results, 'layout', None) or SheetLayout()
+    cells: Dict[int, Dict[int, List[str]]] = {}
+
+    for rule, fields in RULE_FIELDS.items():
+        for issue in results.get(rule, []):
+            if not isinstance(issue, dict) or issue.get('row') is None:
+                continue
+            fields_hit = fields
+            if rule == 'non_us_states' and issue.get('column'):
+                fields_hit = [field for field in fields if layout.letter(field) == issue['column']]
+            elif rule == 'cross_batch_repeats':
+                fields_hit = ['job_id'] if issue.get('id_type') == 'Job ID' else ['client_store_id']
+
+            # Issue rows count from the first DataFrame row; Excel row 1 holds the column names
+            excel_row = int(issue['row']) + 1
+            reason = issue.get('reason') or rule.replace('_', ' ')
+            for field in fields_hit:
+                column = layout.columns.get(field)
+                if column is not None:
+                    cells.setdefault(excel_row, {}).setdefault(column, []).append(reason)
+    return cells
+
+
+def annotate_workbook(source: Union[str, BinaryIO], results, destination: Union[str, BinaryIO],
+                      layout: Optional[SheetLayout] = None, add_comments: bool = True) -> Dict[str, Any]:
+    """Copy source to destination with the flagged cells of the first sheet filled and commented"""
+    cells = flagged_cells(results, layout)
+    notes = []
+
+    with zipfile.ZipFile(source) as zin, \
+            zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED, compresslevel=3) as zout:
+        names = set(zin.namelist())
+        sheet_path = _first_sheet_path(zin)
+        rels_path = posixpath.join(posixpath.dirname(sheet_path), '_rels', posixpath.basename(sheet_path) + '.rels')
+
+        style_offset, styles_xml = _add_flag_styles(zin.read('xl/styles.xml').decode('utf-8'))
+
+        # An existing comments part would have to be merged; fill the cells only in that case
+        sheet_rels = zin.read(rels_path).decode('utf-8') if rels_path in names else None
+        if add_comments and sheet_rels and _COMMENTS_TYPE in sheet_rels:
+            notes.append("The sheet already has comments; flagged cells are highlighted without new comments.")
+            add_comments = False
+        add_comments = add_comments and bool(cells)
+
+        number = 1
+        while f'xl/comments{number}.xml' in names or f'xl/drawings/vmlDrawing{number}.vml' in names:
+            number += 1
+        comments_path = f'xl/comments{number}.xml'
+        vml_path = f'xl/drawings/vmlDrawing{number}.vml'
+        vml_rel_id = None
+
+        for info in zin.infolist():
+            name = info.filename
+            if name == sheet_path:
+                continue
+            if name == 'xl/styles.xml':
+                zout.writestr(info, styles_xml)
+            elif name == '[Content_Types].xml' and add_comments:
+                zout.writestr(info, _add_content_types(zin.read(name).decode('utf-8'), comments_path))
+            elif name == rels_path and add_comments:
+                sheet_rels, vml_rel_id = _add_sheet_relationships(sheet_rels, comments_path, vml_path, sheet_path)
+                zout.writestr(info, sheet_rels)
+            else:
+                with zin.open(info) as src, zout.open(_copy_info(info), 'w') as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+        if add_comments and sheet_rels is None:
+            sheet_rels, vml_rel_id = _add_sheet_relationships(None, comments_path, vml_path, sheet_path)
+            zout.writestr(rels_path, sheet_rels)
+
+        sheet_info = zin.getinfo(sheet_path)
+        with zin.open(sheet_info) as src, \
+                zout.open(_copy_info(sheet_info), 'w', force_zip64=sheet_info.file_size > 1 << 30) as dst:
+            touched = _rewrite_sheet(src, dst, cells, style_offset, vml_rel_id)
+
+        comments = 0
+        if add_comments:
+            with zout.open(comments_path, 'w') as dst:
+                comments = _write_comments(dst, cells)
+            with zout.open(vml_path, 'w') as dst:
+                _write_vml(dst, cells)
+
+    return {'cells': touched, 'rows': len(cells), 'comments': comments, 'notes': notes}
+
+
+def _copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.compress_type = zipfile.ZIP_DEFLATED
+    copy.external_attr = info.external_attr
+    return copy
+
+
+def _first_sheet_path(zin: zipfile.ZipFile) -> str:
+    """Package path of the first sheet in workbook order (the one pandas reads)"""
+    workbook = zin.read('xl/workbook.xml').decode('utf-8')
+    sheet = re.search(r'<(?:\w+:)?sheet\b[^>]*>', workbook).group(0)
+    rel_id = re.search(r'\b\w+:id="([^"]+)"', sheet).group(1)
+
+    rels = zin.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    for relationship in re.findall(r'<Relationship\b[^>]*>', rels):
+        if re.search(r'\sId="%s"' % re.escape(rel_id), relationship):
+            target = re.search(r'\sTarget="([^"]+)"', relationship).group(1)
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError("Workbook does not list a worksheet")
+
+
+def _add_flag_styles(styles: str) -> Tuple[int, str]:
+    """Append the flag fill and a filled clone of every cell format; returns (clone offset, new XML)"""
+    fills_start = re.search(r'<fills\b[^>]*>', styles)
+    fills_end = styles.index('</fills>', fills_start.end())
+    fill_id = len(re.findall(r'<fill\b', styles[fills_start.end():fills_end]))
+    opening = re.sub(r'count="\d+"', f'count="{fill_id + 1}"', fills_start.group(0))
+    styles = styles[:fills_start.start()] + opening + styles[fills_start.end():fills_end] + FLAG_FILL + styles[fills_end:]
+
+    xfs_start = re.search(r'<cellXfs\b[^>]*>', styles)
+    xfs_end = styles.index('</cellXfs>', xfs_start.end())
+    originals = _XF.findall(styles, xfs_start.end(), xfs_end)
+
+    clones = []
+    for xf in originals:
+        opening = re.match(r'<xf\b[^>]*?(?=/?>)', xf).group(0)
+        rest = xf[len(opening):]
+        opening = re.sub(r'\s(?:fillId|applyFill)="[^"]*"', '', opening)
+        clones.append(f'{opening} fillId="{fill_id}" applyFill="1"{rest}')
+
+    offset = len(originals)
+    opening = re.sub(r'count="\d+"', f'count="{offset * 2}"', xfs_start.group(0))
+    styles = styles[:xfs_start.start()] + opening + styles[xfs_start.end():xfs_end] + ''.join(clones) + styles[xfs_end:]
+    return offset, styles
+
+
+def _add_content_types(content_types: str, comments_path: str) -> str:
+    additions = f'<Override PartName="/{comments_path}" ContentType="{_COMMENTS_CONTENT_TYPE}"/>'
+    if not re.search(r'<Default\b[^>]*Extension="vml"', content_types):
+        additions = f'<Default Extension="vml" ContentType="{_VML_CONTENT_TYPE}"/>' + additions
+    return content_types.replace('</Types>', additions + '</Types>')
+
+
+def _add_sheet_relationships(rels: Optional[str], comments_path: str, vml_path: str, sheet_path: str) -> Tuple[str, str]:
+    """Sheet relationships with the comments and VML parts added; returns (XML, VML relationship id)"""
+    if rels is None:
+        rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"></Relationships>')
+    taken = set(re.findall(r'\sId="([^"]+)"', rels))
+    number = len(taken) + 1
+    while f'rId{number}' in taken or f'rId{number + 1}' in taken:
+        number += 1
+
+    base = posixpath.dirname(sheet_path)
+    comments_id, vml_id = f'rId{number}', f'rId{number + 1}'
+    additions = (
+        f'<Relationship Id="{comments_id}" Type="{_COMMENTS_TYPE}" Target="{posixpath.relpath(comments_path, base)}"/>'
+        f'<Relationship Id="{vml_id}" Type="{_VML_TYPE}" Target="{posixpath.relpath(vml_path, base)}"/>'
+    )
+    return rels.replace('</Relationships>', additions + '</Relationships>'), vml_id
+
+
+def _rewrite_sheet(src: BinaryIO, dst: BinaryIO, cells: Dict[int, Dict[int, List[str]]],
+                   style_offset: int, vml_rel_id: Optional[str]) -> int:
+    """Stream the worksheet XML, restyling flagged cells; returns the number of cells touched"""
+    touched = 0
+    buffer = ''
+    in_tail = False
+    next_row = 1
+
+    for text in _decoded_chunks(src):
+        buffer += text
+        if in_tail:
+            continue
+
+        end = buffer.find('</sheetData>')
+        if end != -1:
+            limit = end
+        else:
+            last_row_end = buffer.rfind('</row>')
+            if last_row_end == -1:
+                continue
+            limit = last_row_end + len('</row>')
+
+        # Rewrite the complete rows in buffer[:limit]
+        out = []
+        position = 0
+        for match in _ROW_TAG.finditer(buffer, 0, limit):
+            number = _ROW_NUMBER.search(match.group(0))
+            row = int(number.group(1)) if number else next_row
+            next_row = row + 1
+            if row not in cells:
+                continue
+            row_end = match.end() if match.group(1) else buffer.index('</row>', match.end()) + len('</row>')
+            out.append(buffer[position:match.start()])
+            row_xml, count = _restyle_row(buffer[match.start():row_end], match, row, cells[row], style_offset)
+            out.append(row_xml)
+            touched += count
+            position = row_end
+        out.append(buffer[position:limit])
+        dst.write(''.join(out).encode('utf-8'))
+        buffer = buffer[limit:]
+        in_tail = end != -1
+
+    if vml_rel_id is not None:
+        # <legacyDrawing> has a fixed place among the elements after the sheet data
+        insert_at = min((index for index in (buffer.find(tag) for tag in _AFTER_LEGACY_DRAWING) if index != -1),
+                        default=len(buffer))
+        buffer = (buffer[:insert_at] + f'<legacyDrawing xmlns:r="{_REL_NS}" r:id="{vml_rel_id}"/>'
+                  + buffer[insert_at:])
+    dst.write(buffer.encode('utf-8'))
+    return touched
+
+
+def _decoded_chunks(src: BinaryIO) -> Iterator[str]:
+    # The incremental decoder keeps multi-byte characters split across chunks intact
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def _restyle_row(row_xml: str, row_tag: re.Match, row: int, columns: Dict[int, List[str]],
+                 style_offset: int) -> Tuple[str, int]:
+    """Point the flagged cells of one row at the filled style clones, adding blank cells where missing"""
+    if row_tag.group(1):
+        # Self-closing empty row
+        row_xml = row_tag.group(0)[:-2] + '></row>'
+
+    # Fast path: every flagged cell is present and written with r first, as Excel and openpyxl do
+    out = []
+    position = 0
+    for column in sorted(columns):
+        start = row_xml.find(f'<c r="{column_letter(column)}{row}"', position)
+        if start == -1:
+            break
+        end = row_xml.index('>', start) + 1
+        out.append(row_xml[position:start])
+        out.append(_styled_tag(row_xml[start:end], style_offset))
+        position = end
+    else:
+        out.append(row_xml[position:])
+        return ''.join(out), len(columns)
+
+    # Walk every cell, inserting blank styled cells for flagged columns the row does not have
+    wanted = sorted(columns)
+    out = []
+    position = 0
+    for match in _CELL_TAG.finditer(row_xml):
+        column = _column_index(match.group(1))
+        while wanted and wanted[0] < column:
+            out.append(row_xml[position:match.start()])
+            out.append(f'<c r="{column_letter(wanted.pop(0))}{row}" s="{style_offset}"/>')
+            position = match.start()
+        if wanted and wanted[0] == column:
+            out.append(row_xml[position:match.start()])
+            out.append(_styled_tag(match.group(0), style_offset))
+            position = match.end()
+            wanted.pop(0)
+
+    closing = row_xml.rindex('</row>')
+    out.append(row_xml[position:closing])
+    out.extend(f'<c r="{column_letter(missing)}{row}" s="{style_offset}"/>' for missing in wanted)
+    out.append(row_xml[closing:])
+    return ''.join(out), len(columns)
+
+
+def _styled_tag(tag: str, style_offset: int) -> str:
+    """Cell start tag with its style index moved to the filled clone"""
+    style = _STYLE_ATTR.search(tag)
+    if style:
+        return tag.replace(style.group(0), f' s="{int(style.group(1)) + style_offset}"', 1)
+    closing = '/>' if tag.endswith('/>') else '>'
+    return tag[:-len(closing)].rstrip() + f' s="{style_offset}"' + closing
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _comment_items(cells: Dict[int, Dict[int, List[str]]]) -> Iterator[Tuple[int, int, str]]:
+    for row in sorted(cells):
+        for column in sorted(cells[row]):
+            yield row, column, '\n'.join(dict.fromkeys(cells[row][column]))
+
+
+def _write_comments(dst: BinaryIO, cells: Dict[int, Dict[int, List[str]]]) -> int:
+    dst.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               '<comments xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+               f'<authors><author>{escape(COMMENT_AUTHOR)}</author></authors><commentList>').encode('utf-8'))
+    count = 0
+    batch = []
+    for row, column, text in _comment_items(cells):
+        batch.append(f'<comment ref="{column_letter(column)}{row}" authorId="0"><text><r><t xml:space="preserve">'
+                     f'{escape(text)}</t></r></text></comment>')
+        count += 1
+        if len(batch) >= 10000:
+            dst.write(''.join(batch).encode('utf-8'))
+            batch = []
+    dst.write((''.join(batch) + '</commentList></comments>').encode('utf-8'))
+    return count
+
+
+def _write_vml(dst: BinaryIO, cells: Dict[int, Dict[int, List[str]]]):
+    """Legacy VML shapes Excel needs to show the comment boxes"""
+    dst.write(('<xml xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office" '
+               'xmlns:x="urn:schemas-microsoft-com:office:excel">'
+               '<o:shapelayout v:ext="edit"><o:idmap v:ext="edit" data="1"/></o:shapelayout>'
+               '<v:shapetype id="_x0000_t202" coordsize="21600,21600" o:spt="202" path="m,l,21600r21600,l21600,xe">'
+               '<v:stroke joinstyle="miter"/><v:path gradientshapeok="t" o:connecttype="rect"/></v:shapetype>').encode('utf-8'))
+    batch = []
+    for number, (row, column, _) in enumerate(_comment_items(cells), 1025):
+        batch.append(
+            f'<v:shape id={quoteattr(f"_x0000_s{number}")} type="#_x0000_t202" '
+            'style="position:absolute;margin-left:59.25pt;margin-top:1.5pt;width:144pt;height:60pt;z-index:1;visibility:hidden" '
+            'fillcolor="#ffffe1" o:insetmode="auto"><v:fill color2="#ffffe1"/><v:shadow on="t" color="black" obscured="t"/>'
+            '<v:path o:connecttype="none"/><v:textbox style="mso-direction-alt:auto"><div style="text-align:left"></div></v:textbox>'
+            f'<x:ClientData ObjectType="Note"><x:MoveWithCells/><x:SizeWithCells/>'
+            f'<x:Anchor>{column + 1}, 15, {max(row - 2, 0)}, 10, {column + 3}, 15, {row + 2}, 4</x:Anchor>'
+            f'<x:AutoFill>False</x:AutoFill><x:Row>{row - 1}</x:Row><x:Column>{column}</x:Column></x:ClientData></v:shape>'
+        )
+        if len(batch) >= 10000:
+            dst.write(''.join(batch).encode('utf-8'))
+            batch = []
+    dst.write((''.join(batch) + '</xml>').encode('utf-8'))
+
+
+def main():
+    from worker_pool import PRIMARY_CHECKS, validate_workbook
+
+    parser = argparse.ArgumentParser(description="Validate a workbook and write a copy with flagged cells highlighted")
+    parser.add_argument('workbook', help="Excel (.xlsx) file to validate")
+    parser.add_argument('output', help="Annotated copy to write")
+    parser.add_argument('--checks', nargs='+', default=PRIMARY_CHECKS, help="Checks to run (default: primary checks)")
+    parser.add_argument('--no-comments', action='store_true', help="Only highlight cells, do not add comments")
+    args = parser.parse_args()
+
+    outcome = validate_workbook(args.workbook, {check: True for check in args.checks})
+    summary = annotate_workbook(args.workbook, outcome['results'], args.output, add_comments=not args.no_comments)
+    for note in summary['notes']:
+        print(note)
+    print(f"{summary['cells']} cells in {summary['rows']} rows flagged, {summary['comments']} comments written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
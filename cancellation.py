@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Optional
+
+
+class ValidationCancelled(Exception):
+    """Raised inside a validation run whose cancellation token was cancelled"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised inside a validation run that used up its time budget"""
+
+
+class CancellationToken:
+    """Cooperative stop signal checked between chunks and checks of a validation run
+
+    With abandon_after set, the token also counts as cancelled once keep_alive() has not
+    been called for that many seconds (the page that wanted the result has gone away).
+    """
+
+    def __init__(self, abandon_after: Optional[float] = None):
+        self.abandon_after = abandon_after
+        self.reason = ''
+        self._event = threading.Event()
+        self._last_seen = time.monotonic()
+
+    def cancel(self, reason: str = 'Cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def keep_alive(self):
+        self._last_seen = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.abandon_after is not None \
+                and time.monotonic() - self._last_seen > self.abandon_after:
+            self.cancel('Abandoned: nobody is waiting for the result any more')
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ValidationCancelled(self.reason)
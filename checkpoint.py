@@ -0,0 +1,204 @@
+"""Checkpointed validation: run a sheet in row chunks and resume after a crash.
+
+    results = validate_with_checkpoints(validator, df, column_mapping, options, file_hash,
+                                        checkpoint_dir='/var/lib/qc/checkpoints')
+
+The sheet is validated chunk_rows rows at a time (split the same way cluster.py splits
+shards). After each chunk its issues are appended to one JSON Lines file per rule, and
+progress.json records how many chunks are done and how long each rule file was at that
+point. A later run for the same file hash, checks, column mapping, layout and chunk size
+cuts anything written after the last marker and carries on from the next chunk. Row
+numbers are those of the whole sheet, so the results equal an uninterrupted run.
+
+Checks that compare rows across the sheet (duplicate addresses, cross-batch repeats)
+run once over the whole sheet after the last chunk. The checkpoint is removed when the
+run completes. A run that hits its time budget returns the completed chunks marked
+incomplete and keeps the checkpoint, so the next run picks up from there.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from cancellation import CancellationToken
+from cluster import UNSHARDABLE_CHECKS, decode_value, encode_value, merge_shards, plan_shards, shift_rows
+from layout import SheetLayout, detect_layout
+from results import ResultCollector, ValidationResults, layout_warning
+from rollups import RollupCube
+from validators import DataValidator
+
+logger = logging.getLogger('qc.checkpoint')
+
+DEFAULT_CHUNK_ROWS = 100000
+
+MARKER = 'progress.json'
+
+
+def run_key(validation_options: Dict[str, bool], column_mapping: Dict[str, Any], layout: SheetLayout,
+            chunk_rows: int) -> str:
+    """Short hash of everything that has to match for a checkpoint to be reused"""
+    settings = {
+        'checks': sorted(check for check, enabled in validation_options.items() if enabled),
+        'column_mapping': column_mapping,
+        'data_start': layout.data_start,
+        'columns': layout.columns,
+        'chunk_rows': chunk_rows
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+class Checkpoint:
+    """Per-rule partial results and the progress marker of one run"""
+
+    def __init__(self, checkpoint_dir: str, file_hash: str, key: str):
+        self.path = os.path.join(checkpoint_dir, f"{file_hash}-{key}")
+        self.completed = 0
+        self.rules: List[str] = []
+        self.sizes: Dict[str, int] = {}
+
+    def resume(self) -> int:
+        """Load the marker and drop anything written after it; returns the completed chunk count"""
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(os.path.join(self.path, MARKER), encoding='utf-8') as handle:
+                marker = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            marker = {}
+        self.completed = marker.get('completed', 0)
+        self.rules = marker.get('rules', [])
+        self.sizes = marker.get('sizes', {})
+
+        # A crash between appending a chunk and writing the marker leaves a partial chunk behind
+        for name in os.listdir(self.path):
+            rule, extension = os.path.splitext(name)
+            if extension == '.jsonl':
+                with open(os.path.join(self.path, name), 'r+b') as handle:
+                    handle.truncate(self.sizes.get(rule, 0))
+        return self.completed
+
+    def _rule_path(self, rule: str) -> str:
+        return os.path.join(self.path, f"{rule}.jsonl")
+
+    def append(self, results: Dict[str, List[Any]]):
+        """Persist one more completed chunk"""
+        for rule, issues in results.items():
+            if rule not in self.rules:
+                self.rules.append(rule)
+            with open(self._rule_path(rule), 'ab') as handle:
+                handle.write(''.join(json.dumps(issue, default=encode_value) + '\n' for issue in issues).encode('utf-8'))
+                handle.flush()
+                os.fsync(handle.fileno())
+                self.sizes[rule] = handle.tell()
+        self.completed += 1
+
+        marker = {'completed': self.completed, 'rules': self.rules, 'sizes': self.sizes}
+        partial = os.path.join(self.path, MARKER + '.partial')
+        with open(partial, 'w', encoding='utf-8') as handle:
+            json.dump(marker, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(partial, os.path.join(self.path, MARKER))
+
+    def read(self, collector: Optional[ResultCollector] = None) -> Dict[str, Any]:
+        """Saved issues per rule, streamed line by line into the collector's issue stores if given"""
+        results = {}
+        for rule in self.rules:
+            issues = collector.issue_list(rule) if collector is not None else []
+            with open(self._rule_path(rule), encoding='utf-8') as handle:
+                issues.extend(json.loads(line, object_hook=decode_value) for line in handle)
+            results[rule] = issues
+        return results
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def validate_with_checkpoints(validator: DataValidator, df: pd.DataFrame, column_mapping: Dict[str, Any],
+                              validation_options: Dict[str, bool], file_hash: str, checkpoint_dir: str,
+                              chunk_rows: int = DEFAULT_CHUNK_ROWS, layout: Optional[SheetLayout] = None,
+                              progress_callback: Optional[Callable[[float, str, Optional[str]], None]] = None,
+                              collector: Optional[ResultCollector] = None,
+                              file_name: str = '', cancel_token: Optional[CancellationToken] = None,
+                              time_budget: Optional[float] = None) -> ValidationResults:
+    """validate_data in resumable chunks; same results, progress saved after every chunk"""
+    if layout is None:
+        layout = detect_layout(df)
+    chunk_options = {check: enabled for check, enabled in validation_options.items() if check not in UNSHARDABLE_CHECKS}
+    sheet_options = {check: enabled for check, enabled in validation_options.items() if check in UNSHARDABLE_CHECKS}
+
+    checkpoint = Checkpoint(checkpoint_dir, file_hash, run_key(validation_options, column_mapping, layout, chunk_rows))
+    chunks = plan_shards(df, layout, chunk_rows)
+    if checkpoint.resume():
+        logger.info("Resuming %s after chunk %d of %d", file_name or file_hash, checkpoint.completed, len(chunks))
+
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    out_of_time = False
+    for number, start, frame, chunk_layout in chunks[checkpoint.completed:]:
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            out_of_time = True
+            break
+        chunk_results = validator.validate_data(frame, column_mapping, chunk_options, layout=chunk_layout,
+                                                cancel_token=cancel_token, time_budget=remaining, rollups=False)
+        if chunk_results.incomplete:
+            # Only whole chunks are saved; this one is redone by the next run
+            out_of_time = True
+            break
+        checkpoint.append({rule: shift_rows(list(issues), start) for rule, issues in chunk_results.items()})
+        if progress_callback is not None:
+            progress_callback((number + 1) / (len(chunks) + 1), f"chunk {number + 1} of {len(chunks)}", None)
+
+    # Straight from the rule files into the retention policy, never all of a rule in one list
+    data_rows = max(len(df) - layout.data_start, 0)
+    results = merge_shards({}, layout, data_rows)
+    for rule, issues in checkpoint.read(collector).items():
+        results[rule] = issues
+        warning = layout_warning(rule, len(issues), data_rows)
+        if warning:
+            results.warnings.append(warning)
+
+    if out_of_time:
+        last_row = chunks[checkpoint.completed][1] if checkpoint.completed < len(chunks) else len(df)
+        results.incomplete = True
+        results.skipped_checks = [check for check, enabled in sheet_options.items() if enabled]
+        results.warnings.append(f"Incomplete: stopped at the {time_budget:g}s time budget after {checkpoint.completed} "
+                                f"of {len(chunks)} chunks; only rows up to {last_row} were checked. "
+                                f"Running the validation again resumes from there.")
+    # Whole-sheet checks, and recording the file in the cross-batch index, happen once at the end
+    elif any(sheet_options.values()) or (validator.cross_batch_index is not None and file_hash):
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        sheet_results = validator.validate_data(df, column_mapping, sheet_options, collector=collector,
+                                                file_hash=file_hash, file_name=file_name, layout=layout,
+                                                cancel_token=cancel_token, time_budget=remaining, rollups=False)
+        results.update(sheet_results)
+        results.warnings.extend(warning for warning in sheet_results.warnings
+                                if warning not in results.warnings and not warning.startswith('Incomplete:'))
+        if sheet_results.incomplete:
+            # Every chunk is saved; the next run only redoes the whole-sheet checks
+            results.incomplete = True
+            results.skipped_checks = sheet_results.skipped_checks
+            skipped = ', '.join(check.replace('_', ' ') for check in results.skipped_checks)
+            results.warnings.append(f"Incomplete: stopped at the {time_budget:g}s time budget after all {len(chunks)} "
+                                    f"chunks, before {skipped or 'recording the file in the cross-batch index'}. "
+                                    f"Running the validation again resumes from there.")
+
+    # The chunk files and the whole-sheet pass fill results out of order; list the rules as validate_data does
+    results.order_by(validation_options)
+
+    results.rollups = RollupCube.from_results(df, layout, results)
+
+    if collector is not None:
+        collector.finish()
+        results.collector = collector
+
+    if results.incomplete:
+        return results
+    checkpoint.remove()
+    if progress_callback is not None:
+        progress_callback(1.0, 'checkpointed run', None)
+    return results
@@ -0,0 +1,459 @@
+"""Coordinator/worker mode: spread the validation of one large workbook over several hosts.
+
+    python cluster.py worker --host 0.0.0.0 --port 9500            (on every worker host)
+    python cluster.py validate big.xlsx --workers hostA:9500 hostB:9500 --output issues.parquet
+
+The coordinator parses the workbook, detects its layout once and splits the data rows
+into shards. Each shard carries only the values of the columns the layout and the
+column mapping refer to (other columns keep their place but travel as null), and goes
+to a worker over a plain TCP connection. The first shard also carries the header rows;
+the others are validated with data_start=0, and the coordinator shifts the returned
+row numbers by each shard's position in the sheet, so merged results look exactly
+like a local run.
+
+Messages are length-prefixed JSON frames: a 4-byte big-endian length, then UTF-8 JSON.
+If a worker dies or stops answering, its shard goes back in the queue for the
+remaining workers, up to max_attempts times.
+
+Checks that compare rows with each other (duplicate addresses, cross-batch repeats)
+cannot be sharded and are rejected.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from layout import SheetLayout, detect_layout
+from results import ValidationResults, layout_warning
+from rollups import RollupCube
+from reference_data import load_reference_data
+from validators import DataValidator
+
+logger = logging.getLogger('qc.cluster')
+
+DEFAULT_PORT = 9500
+DEFAULT_SHARD_ROWS = 50000
+
+# Checks whose verdict for a row depends on other rows
+UNSHARDABLE_CHECKS = {'duplicate_addresses', 'cross_batch_repeats'}
+
+# Refuse frames beyond this size instead of allocating whatever a bad peer announces
+MAX_FRAME_BYTES = 1024 ** 3
+
+_LENGTH = struct.Struct('>I')
+
+SHARDS = metrics.REGISTRY.counter('qc_cluster_shards_total', 'Shards sent to remote workers, by outcome', ['outcome'])
+SHARD_SECONDS = metrics.REGISTRY.histogram('qc_cluster_shard_seconds', 'Round trip of one shard to a remote worker')
+
+
+class WorkerLost(Exception):
+    """The connection to a worker failed; its shard can be retried elsewhere"""
+
+
+class ShardFailed(Exception):
+    """A worker reported an error validating a shard (retrying elsewhere would fail the same way)"""
+
+
+def write_frame(stream: BinaryIO, message: Dict[str, Any]):
+    body = json.dumps(message, default=encode_value, separators=(',', ':')).encode('utf-8')
+    stream.write(_LENGTH.pack(len(body)) + body)
+    stream.flush()
+
+
+def read_frame(stream: BinaryIO) -> Dict[str, Any]:
+    """Next message from stream; EOFError when the peer closed the connection"""
+    header = _read_exactly(stream, _LENGTH.size)
+    length, = _LENGTH.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return json.loads(_read_exactly(stream, length), object_hook=decode_value)
+
+
+def _read_exactly(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("connection closed")
+    return data
+
+
+def encode_value(value: Any) -> Any:
+    """JSON for cell and issue values the json module does not know"""
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.datetime, pd.Timestamp)):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, (datetime.date, datetime.time)):
+        return {'__' + type(value).__name__ + '__': value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def decode_value(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if '__datetime__' in obj:
+            return pd.Timestamp(obj['__datetime__'])
+        if '__date__' in obj:
+            return datetime.date.fromisoformat(obj['__date__'])
+        if '__time__' in obj:
+            return datetime.time.fromisoformat(obj['__time__'])
+    return obj
+
+
+def encode_frame(frame: pd.DataFrame, positions: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Column-major payload of a DataFrame; dtypes are sent so numbers come back as they were parsed
+
+    Only the columns at positions (all by default) carry values; the others are sent as null.
+    """
+    keep = set(range(len(frame.columns)) if positions is None else positions)
+    return {
+        'rows': len(frame),
+        'columns': list(frame.columns),
+        'dtypes': [str(dtype) for dtype in frame.dtypes],
+        'data': [frame.iloc[:, position].tolist() if position in keep else None
+                 for position in range(len(frame.columns))]
+    }
+
+
+def decode_frame(payload: Dict[str, Any]) -> pd.DataFrame:
+    columns = {}
+    for position, (values, dtype) in enumerate(zip(payload['data'], payload['dtypes'])):
+        if values is None:
+            columns[position] = pd.Series([None] * payload['rows'], dtype=object)
+        else:
+            # Object columns keep their Python values; letting pandas infer would turn ints with gaps into floats
+            columns[position] = pd.Series(values, dtype=object if dtype == 'object' else dtype)
+    frame = pd.DataFrame(columns, index=range(payload['rows']))
+    frame.columns = pd.Index(payload['columns'], dtype=object)
+    return frame
+
+
+def shard_columns(df: pd.DataFrame, layout: SheetLayout, column_mapping: Dict[str, Any]) -> List[int]:
+    """Positions of the columns whose values the checks read"""
+    positions = {position for position in layout.columns.values() if position is not None and position < len(df.columns)}
+    for name in column_mapping.values():
+        if name in df.columns:
+            location = df.columns.get_loc(name)
+            if isinstance(location, int):
+                positions.add(location)
+    return sorted(positions)
+
+
+def plan_shards(df: pd.DataFrame, layout: SheetLayout, shard_rows: int) -> List[Tuple[int, int, pd.DataFrame, SheetLayout]]:
+    """(shard number, first df position, frame, layout) for consecutive slices of df
+
+    The header rows ride along with the first shard, which keeps the sheet's data_start;
+    every other shard starts directly with data rows (data_start=0).
+    """
+    bounds = [0] + list(range(layout.data_start + shard_rows, len(df), shard_rows)) + [len(df)]
+    return [(number, start, df.iloc[start:stop], SheetLayout(layout.data_start if number == 0 else 0, layout.columns))
+            for number, (start, stop) in enumerate(zip(bounds, bounds[1:]))]
+
+
+def shift_rows(issues: List[Any], offset: int) -> List[Any]:
+    """Turn a shard's row numbers into sheet row numbers, in place"""
+    for issue in issues:
+        if not isinstance(issue, dict):
+            continue
+        if isinstance(issue.get('row'), int):
+            issue['row'] += offset
+        if 'rows' in issue:
+            issue['rows'] = [row + offset for row in issue['rows']]
+    return issues
+
+
+def merge_shards(shard_results: Dict[int, Dict[str, List[Any]]], layout: SheetLayout, data_rows: int) -> ValidationResults:
+    """Concatenate shard results (already shifted to sheet rows) and redo the layout warnings on the totals"""
+    results = ValidationResults()
+    results.layout = layout
+    results.warnings.extend(layout.notes)
+    # Shards cover consecutive rows, so concatenating in shard order keeps each rule in row order
+    for number in sorted(shard_results):
+        for rule, issues in shard_results[number].items():
+            results.setdefault(rule, []).extend(issues)
+    for rule, issues in results.items():
+        warning = layout_warning(rule, len(issues), data_rows)
+        if warning:
+            results.warnings.append(warning)
+    return results
+
+
+def handle_message(validator: DataValidator, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker side of the protocol"""
+    kind = message.get('type')
+    if kind == 'ping':
+        return {'type': 'pong', 'pid': os.getpid()}
+    if kind != 'validate':
+        return {'type': 'error', 'error': f"Unknown message type {kind!r}"}
+
+    started = time.perf_counter()
+    try:
+        frame = decode_frame(message['frame'])
+        results = validator.validate_data(frame, message.get('column_mapping') or {}, message['options'],
+                                          layout=SheetLayout.from_dict(message['layout']), rollups=False)
+    except Exception as e:
+        logger.exception("Shard %s failed", message.get('shard'))
+        return {'type': 'error', 'shard': message.get('shard'), 'error': f"{type(e).__name__}: {e}"}
+    return {
+        'type': 'result',
+        'shard': message.get('shard'),
+        'rows': len(frame),
+        'results': {rule: list(issues) for rule, issues in results.items()},
+        'seconds': time.perf_counter() - started
+    }
+
+
+class _ShardHandler(socketserver.StreamRequestHandler):
+    """One coordinator connection; shards on it are validated one after another"""
+
+    def handle(self):
+        validator = DataValidator(reference_data=load_reference_data())
+        while True:
+            try:
+                message = read_frame(self.rfile)
+            except (EOFError, ConnectionError):
+                return
+            write_frame(self.wfile, handle_message(validator, message))
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start_worker(host: str = '127.0.0.1', port: int = 0) -> WorkerServer:
+    """Serve shards from a daemon thread (port 0 picks a free port, see server_address)"""
+    server = WorkerServer((host, port), _ShardHandler)
+    threading.Thread(target=server.serve_forever, name='qc-cluster-worker', daemon=True).start()
+    return server
+
+
+class Coordinator:
+    """Splits a sheet into shards, farms them out to workers and merges the results"""
+
+    def __init__(self, workers: List[Tuple[str, int]], shard_rows: int = DEFAULT_SHARD_ROWS,
+                 max_attempts: int = 3, connect_timeout: float = 10.0, shard_timeout: float = 600.0):
+        if not workers:
+            raise ValueError("At least one worker address is required")
+        self.workers = [(host, int(port)) for host, port in workers]
+        self.shard_rows = shard_rows
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+        self.shard_timeout = shard_timeout
+
+    def validate(self, df: pd.DataFrame, validation_options: Dict[str, bool],
+                 column_mapping: Optional[Dict[str, Any]] = None, layout: Optional[SheetLayout] = None,
+                 progress_callback: Optional[Callable[[float, str], None]] = None) -> ValidationResults:
+        """Validate df on the workers; issues carry the same row numbers as a local validate_data run"""
+        column_mapping = column_mapping or {}
+        unshardable = sorted(check for check, enabled in validation_options.items() if enabled and check in UNSHARDABLE_CHECKS)
+        if unshardable:
+            raise ValueError(f"These checks compare rows across the whole sheet and cannot be sharded: {', '.join(unshardable)}")
+
+        if layout is None:
+            layout = detect_layout(df)
+        positions = shard_columns(df, layout, column_mapping)
+        # Columns keep their positions so column letters in the issues stay right
+        sheet = df.iloc[:, :positions[-1] + 1 if positions else 0]
+        shards = plan_shards(sheet, layout, self.shard_rows)
+        run = _ShardRun(shards, len(self.workers), self.max_attempts, progress_callback)
+        common = {'type': 'validate', 'column_mapping': column_mapping, 'options': validation_options}
+
+        threads = [threading.Thread(target=self._drive, args=(address, run, common, positions), daemon=True)
+                   for address in self.workers]
+        for thread in threads:
+            thread.start()
+        run.wait()
+        for thread in threads:
+            thread.join()
+        if run.error is not None:
+            raise run.error
+
+        results = merge_shards(run.results, layout, max(len(df) - layout.data_start, 0))
+        results.rollups = RollupCube.from_results(df, layout, results)
+        return results
+
+    def _drive(self, address: Tuple[str, int], run: '_ShardRun', common: Dict[str, Any], positions: List[int]):
+        """Feed shards to one worker until the queue is drained or the worker is lost"""
+        try:
+            connection = socket.create_connection(address, timeout=self.connect_timeout)
+        except OSError as e:
+            logger.warning("Worker %s:%d unreachable: %s", *address, e)
+            run.worker_gone()
+            return
+
+        connection.settimeout(self.shard_timeout)
+        stream = connection.makefile('rwb')
+        shard = None
+        try:
+            while True:
+                shard = run.take()
+                if shard is None:
+                    return
+                number, offset, frame, shard_layout = shard
+                started = time.perf_counter()
+                try:
+                    write_frame(stream, dict(common, shard=number, layout=shard_layout.to_dict(),
+                                             frame=encode_frame(frame, positions)))
+                    reply = read_frame(stream)
+                except (OSError, EOFError, ValueError) as e:
+                    raise WorkerLost(f"{address[0]}:{address[1]}: {e}") from e
+                SHARD_SECONDS.observe(time.perf_counter() - started)
+
+                if reply.get('type') != 'result' or reply.get('shard') != number:
+                    SHARDS.inc(outcome='failed')
+                    run.fail(ShardFailed(f"Worker {address[0]}:{address[1]} could not validate shard {number}: "
+                                         f"{reply.get('error', reply.get('type'))}"))
+                    return
+                SHARDS.inc(outcome='ok')
+                run.done(number, {rule: shift_rows(issues, offset) for rule, issues in reply['results'].items()})
+                shard = None
+        except WorkerLost as e:
+            SHARDS.inc(outcome='retried')
+            logger.warning("Lost worker %s; shard %d goes back in the queue", e, shard[0])
+            run.retry(shard)
+        finally:
+            stream.close()
+            connection.close()
+            run.worker_gone()
+
+
+class _ShardRun:
+    """Shared queue and bookkeeping of one Coordinator.validate call"""
+
+    def __init__(self, shards: List[Tuple[int, int, pd.DataFrame, SheetLayout]], workers: int, max_attempts: int,
+                 progress_callback: Optional[Callable[[float, str], None]]):
+        self.pending = deque(shards)
+        self.total = len(shards)
+        self.max_attempts = max_attempts
+        self.progress_callback = progress_callback
+        self.attempts: Dict[int, int] = {}
+        self.results: Dict[int, Dict[str, List[Any]]] = {}
+        self.in_flight = 0
+        self.live_workers = workers
+        self.error: Optional[Exception] = None
+        self._condition = threading.Condition()
+
+    def take(self) -> Optional[Tuple[int, int, pd.DataFrame, SheetLayout]]:
+        """Next shard for a worker; waits while other workers' shards might still come back"""
+        with self._condition:
+            while not self.pending and self.in_flight and self.error is None:
+                self._condition.wait()
+            if self.error is not None or not self.pending:
+                return None
+            self.in_flight += 1
+            return self.pending.popleft()
+
+    def done(self, number: int, results: Dict[str, List[Any]]):
+        with self._condition:
+            self.in_flight -= 1
+            self.results[number] = results
+            completed = len(self.results)
+            self._condition.notify_all()
+        if self.progress_callback is not None:
+            self.progress_callback(completed / self.total, f"{completed} of {self.total} shards")
+
+    def retry(self, shard: Tuple[int, int, pd.DataFrame, SheetLayout]):
+        with self._condition:
+            self.in_flight -= 1
+            number = shard[0]
+            self.attempts[number] = self.attempts.get(number, 1) + 1
+            if self.attempts[number] > self.max_attempts:
+                self.error = self.error or WorkerLost(f"Shard {number} failed on {self.max_attempts} workers")
+            else:
+                self.pending.appendleft(shard)
+            self._condition.notify_all()
+
+    def fail(self, error: Exception):
+        with self._condition:
+            self.in_flight -= 1
+            self.error = self.error or error
+            self._condition.notify_all()
+
+    def worker_gone(self):
+        with self._condition:
+            self.live_workers -= 1
+            self._condition.notify_all()
+
+    def wait(self):
+        """Block until every shard is done, a shard failed, or no worker is left to run the rest"""
+        with self._condition:
+            while self.error is None and len(self.results) < self.total and self.live_workers:
+                self._condition.wait()
+            if self.error is None and len(self.results) < self.total:
+                self.error = WorkerLost(f"No workers left with {self.total - len(self.results)} of {self.total} shards unfinished")
+            self._condition.notify_all()
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(':')
+    return (host or '127.0.0.1'), int(port or DEFAULT_PORT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate large workbooks across several machines")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker = commands.add_parser('worker', help="serve shards to coordinators")
+    worker.add_argument('--host', default='127.0.0.1', help="address to listen on (0.0.0.0 for all interfaces)")
+    worker.add_argument('--port', type=int, default=DEFAULT_PORT)
+    worker.add_argument('--metrics-port', type=int, default=None, help="serve Prometheus metrics on this local port")
+
+    validate = commands.add_parser('validate', help="validate a workbook on a set of workers")
+    validate.add_argument('workbook')
+    validate.add_argument('--workers', nargs='+', required=True, help="worker addresses as host:port")
+    validate.add_argument('--checks', nargs='+', default=None, help="checks to run (default: primary checks)")
+    validate.add_argument('--shard-rows', type=int, default=DEFAULT_SHARD_ROWS)
+    validate.add_argument('--output', default=None, help="export every issue to .parquet, .csv.gz or .jsonl")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.command == 'worker':
+        if args.metrics_port:
+            metrics.start_http_server(args.metrics_port)
+        server = WorkerServer((args.host, args.port), _ShardHandler)
+        logger.info("Worker %d listening on %s:%d", os.getpid(), *server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    from exporters import export_issues
+    from worker_pool import PRIMARY_CHECKS
+    from xlsx_reader import read_xlsx
+
+    started = time.perf_counter()
+    df = read_xlsx(args.workbook)
+    parsed = time.perf_counter()
+    coordinator = Coordinator([parse_address(address) for address in args.workers], shard_rows=args.shard_rows)
+    results = coordinator.validate(df, {check: True for check in (args.checks or PRIMARY_CHECKS)})
+    finished = time.perf_counter()
+
+    for warning in results.warnings:
+        logger.warning(warning)
+    for rule, issues in results.items():
+        print(f"{rule}: {len(issues)} issues")
+    print(f"{len(df)} rows; parse {parsed - started:.2f}s, distributed validation {finished - parsed:.2f}s")
+    if args.output:
+        written = export_issues(results, args.output)
+        print(f"{written} issues written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
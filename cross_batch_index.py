@@ -0,0 +1,174 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.matching_qc', 'id_index.sqlite')
+
+# Which ID columns are indexed (0-based column positions)
+ID_KINDS = {
+    'job': 40,    # AO column (Job ID)
+    'store': 41   # AP column (Client Store ID)
+}
+
+# Matched banner (G), matched address (K) and state (P) make up an ID's fingerprint
+FINGERPRINT_COLUMNS = {
+    'banner': 6,
+    'address': 10,
+    'state': 15
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_matches (
+    id_kind TEXT NOT NULL,
+    id_value TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    banner_fp INTEGER NOT NULL,
+    address_fp INTEGER NOT NULL,
+    state_fp INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (id_kind, id_value, file_hash)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS files (
+    file_hash TEXT PRIMARY KEY,
+    file_name TEXT,
+    rows INTEGER,
+    recorded_at REAL
+);
+"""
+
+
+class CrossBatchIndex:
+    """Persistent SQLite index of job IDs (AO) and client store IDs (AP) across validated files.
+
+    Each ID is stored once per file with hashed fingerprints of the matched banner,
+    address and state, keyed on (kind, id, file) so lookups stay index seeks even with
+    tens of millions of entries.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA temp_store=MEMORY')
+        connection.execute('PRAGMA cache_size=-65536')  # 64 MB page cache
+        return connection
+
+    def has_file(self, file_hash: str) -> bool:
+        with closing(self._connect()) as connection:
+            return connection.execute('SELECT 1 FROM files WHERE file_hash = ?', (file_hash,)).fetchone() is not None
+
+    def record_file(self, df: pd.DataFrame, file_hash: str, file_name: str = '', data_start: int = 3,
+                    columns: Optional[Dict[str, int]] = None) -> int:
+        """Add every ID in the file's data rows to the index; returns the number of new entries"""
+        entries = []
+        for kind, positions, ids, fingerprints in self.file_ids(df, data_start, columns):
+            # Keep the first row an ID appears on within this file
+            _, first = np.unique(ids, return_index=True)
+            for i in first:
+                entries.append((kind, ids[i], file_hash,
+                                int(fingerprints[0][i]), int(fingerprints[1][i]), int(fingerprints[2][i]),
+                                int(positions[i]) + 1))
+
+        with closing(self._connect()) as connection:
+            with connection:
+                before = connection.total_changes
+                connection.executemany('INSERT OR IGNORE INTO id_matches VALUES (?, ?, ?, ?, ?, ?, ?)', entries)
+                added = connection.total_changes - before
+                connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                   (file_hash, file_name, len(df), time.time()))
+        return added
+
+    def lookup(self, kind: str, id_values: List[str], exclude_file: str = '') -> Dict[str, List[Tuple]]:
+        """Earlier entries for many IDs at once: id -> [(file_name, banner_fp, address_fp, state_fp, recorded_at)]"""
+        found: Dict[str, List[Tuple]] = {}
+        if not id_values:
+            return found
+
+        with closing(self._connect()) as connection:
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (id_value TEXT PRIMARY KEY) WITHOUT ROWID')
+            connection.execute('DELETE FROM wanted')
+            connection.executemany('INSERT OR IGNORE INTO wanted VALUES (?)', ((value,) for value in id_values))
+            rows = connection.execute(
+                """
+                SELECT m.id_value, COALESCE(f.file_name, ''), m.banner_fp, m.address_fp, m.state_fp, COALESCE(f.recorded_at, 0)
+                FROM wanted w
+                JOIN id_matches m ON m.id_kind = ? AND m.id_value = w.id_value
+                LEFT JOIN files f ON f.file_hash = m.file_hash
+                WHERE m.file_hash != ?
+                ORDER BY m.id_value, f.recorded_at
+                """,
+                (kind, exclude_file)
+            )
+            for id_value, *entry in rows:
+                found.setdefault(id_value, []).append(tuple(entry))
+        return found
+
+    def file_ids(self, df: pd.DataFrame, data_start: int, columns: Optional[Dict[str, int]] = None):
+        """(kind, row positions, ID strings, fingerprint arrays) for each ID column present in the sheet
+
+        columns maps 'job', 'store', 'banner', 'address' and 'state' to physical column
+        positions when the sheet layout differs from the defaults.
+        """
+        positions_by_name = dict(ID_KINDS, **FINGERPRINT_COLUMNS)
+        positions_by_name.update(columns or {})
+
+        data = df.iloc[data_start:]
+        fingerprints = []
+        for name in FINGERPRINT_COLUMNS:
+            position = positions_by_name[name]
+            if len(df.columns) > position:
+                fingerprints.append(_hash_column(data.iloc[:, position]))
+            else:
+                fingerprints.append(np.zeros(len(data), dtype=np.int64))
+
+        for kind in ID_KINDS:
+            position = positions_by_name[kind]
+            if len(df.columns) <= position:
+                continue
+            ids = _normalized_strings(data.iloc[:, position])
+            present = np.flatnonzero(ids != '')
+            yield (kind, present + data_start, ids[present], [fp[present] for fp in fingerprints])
+
+
+def _normalized_strings(column: pd.Series) -> np.ndarray:
+    """Cell values as stripped strings ('' for blanks); whole-number floats lose their '.0'"""
+    def to_text(value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value).strip()
+
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    texts = np.array([to_text(value) for value in uniques] + [''], dtype=object)
+    return texts[codes]  # code -1 picks the trailing ''
+
+
+def _hash_column(column: pd.Series) -> np.ndarray:
+    """Stable 63-bit fingerprint of each cell's case- and whitespace-folded text"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    hashes = [_fingerprint(' '.join(str(value).upper().split())) for value in uniques] + [0]
+    return np.array(hashes, dtype=np.int64)[codes]
+
+
+def _fingerprint(text: str) -> int:
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1  # fits SQLite's signed INTEGER
+
+
+def file_hash_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
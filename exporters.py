@@ -0,0 +1,144 @@
+"""Streaming exports of every rule's issues as Parquet, gzipped CSV or JSON Lines.
+
+Issues are flattened to rule, row, reason, job_id, client_store_id and details and
+written one chunk at a time, so issues spilled to disk by the ResultCollector are
+never all in memory at once.
+
+Headless use:
+    python exporters.py workbook.xlsx issues.parquet
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Union
+
+from utils import ISSUE_FIELDS, flatten_issues
+
+EXPORT_COLUMNS = ISSUE_FIELDS + ['details']
+
+# Format -> (file suffix, MIME type)
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'jsonl': ('.jsonl', 'application/x-ndjson')
+}
+
+CHUNK_ROWS = 10000
+
+
+def issue_schema():
+    """Arrow schema of a flattened issue row"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('rule', pa.string()),
+        ('row', pa.int64()),
+        ('reason', pa.string()),
+        ('job_id', pa.string()),
+        ('client_store_id', pa.string()),
+        ('details', pa.string())
+    ])
+
+
+def issue_chunks(results, chunk_rows: int = CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    """Flattened issues in lists of at most chunk_rows records"""
+    chunk = []
+    for record in flatten_issues(results):
+        # IDs can come back from Excel as numbers; exports keep them as text
+        record['job_id'] = _text(record['job_id'])
+        record['client_store_id'] = _text(record['client_store_id'])
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_for_path(path: str) -> str:
+    """Export format implied by a file name"""
+    for fmt, (suffix, _) in EXPORT_FORMATS.items():
+        if path.endswith(suffix):
+            return fmt
+    raise ValueError(f"Cannot tell the export format of {path!r}; use one of {', '.join(EXPORT_FORMATS)}")
+
+
+def export_issues(results, destination: Union[str, BinaryIO], fmt: str = None, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Write all issues to a path or binary file object; returns the number of rows written"""
+    if fmt is None:
+        if not isinstance(destination, str):
+            raise ValueError("fmt is required when exporting to a file object")
+        fmt = format_for_path(destination)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}")
+
+    writer = {'parquet': _write_parquet, 'csv.gz': _write_csv_gz, 'jsonl': _write_jsonl}[fmt]
+    if isinstance(destination, str):
+        with open(destination, 'wb') as out:
+            return writer(issue_chunks(results, chunk_rows), out)
+    return writer(issue_chunks(results, chunk_rows), destination)
+
+
+def _write_parquet(chunks: Iterator[List[Dict[str, Any]]], out: BinaryIO) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = issue_schema()
+    written = 0
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def _write_csv_gz(chunks: Iterator[List[Dict[str, Any]]], out: BinaryIO) -> int:
+    written = 0
+    # Closing the wrappers finishes the gzip stream but leaves out open
+    with gzip.GzipFile(fileobj=out, mode='wb') as compressed:
+        with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text:
+            writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for chunk in chunks:
+                writer.writerows(chunk)
+                written += len(chunk)
+    return written
+
+
+def _write_jsonl(chunks: Iterator[List[Dict[str, Any]]], out: BinaryIO) -> int:
+    written = 0
+    for chunk in chunks:
+        out.write(''.join(json.dumps(record, default=str) + '\n' for record in chunk).encode('utf-8'))
+        written += len(chunk)
+    return written
+
+
+def _text(value: Any) -> str:
+    if value is None or value == '':
+        return ''
+    if isinstance(value, float):
+        return '' if value != value else (str(int(value)) if value.is_integer() else str(value))
+    return str(value)
+
+
+def main():
+    from worker_pool import PRIMARY_CHECKS, validate_workbook
+
+    parser = argparse.ArgumentParser(description="Validate a workbook and export every issue")
+    parser.add_argument('workbook', help="Excel file to validate")
+    parser.add_argument('output', help="Export file ending in .parquet, .csv.gz or .jsonl")
+    parser.add_argument('--checks', nargs='+', default=PRIMARY_CHECKS, help="Checks to run (default: primary checks)")
+    args = parser.parse_args()
+
+    fmt = format_for_path(args.output)
+    outcome = validate_workbook(args.workbook, {check: True for check in args.checks})
+    written = export_issues(outcome['results'], args.output, fmt)
+    print(f"{written} issues from {outcome['rows']} rows written to {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.1f} KB)")
+
+
+if __name__ == '__main__':
+    main()
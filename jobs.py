@@ -0,0 +1,223 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Callable
+
+from cancellation import ValidationCancelled
+
+
+class ValidationJob:
+    """A single validation request tracked by the job manager"""
+
+    def __init__(self, job_id: str, owner: str, target: Callable, args: tuple, kwargs: Dict[str, Any],
+                 label: str = '', memory: int = 0):
+        self.job_id = job_id
+        self.owner = owner
+        self.label = label
+        self.memory = memory  # estimated peak bytes, reserved while the job runs
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        # Jobs submitted with a cancel_token keyword can be stopped while they run
+        self.cancel_token = kwargs.get('cancel_token')
+
+        self.status = 'queued'  # queued -> running -> done / failed / cancelled
+        self.progress = 0.0
+        self.message = 'Waiting for a free worker...'
+        self.result = None
+        self.error = None
+        self.warnings = []
+
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def update_progress(self, fraction: float, check_name: str = '', warning: Optional[str] = None):
+        """Progress callback handed to DataValidator.validate_data"""
+        self.progress = max(0.0, min(float(fraction), 1.0))
+        if check_name:
+            self.message = f"Finished {check_name.replace('_', ' ')}"
+        if warning:
+            self.warnings.append(warning)
+
+
+class JobManager:
+    """Runs validations on a small pool of background threads.
+
+    Jobs are queued per owner (one owner per Streamlit session) and workers pick
+    owners round-robin, so one analyst queueing several large files cannot starve
+    the others. At most max_workers jobs run at once, and a job only starts when its
+    estimated memory fits in what is left of memory_budget (a job larger than the
+    whole budget runs alone). The next job in round-robin order waits for memory
+    rather than being overtaken, so big files are not starved by small ones.
+    """
+
+    def __init__(self, max_workers: int = 2, keep_finished: int = 200, memory_budget: Optional[int] = None):
+        self.max_workers = max_workers
+        self.keep_finished = keep_finished
+        self.memory_budget = memory_budget
+        self._committed_memory = 0
+        self._running = 0
+
+        self._jobs: Dict[str, ValidationJob] = {}
+        self._finished_order = deque()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._condition = threading.Condition()
+
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"validation-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, owner: str, target: Callable, *args, label: str = '', memory: int = 0, **kwargs) -> str:
+        """Queue target(*args, progress_callback=..., **kwargs) and return the new job ID
+
+        memory is the job's estimated peak working memory in bytes.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = ValidationJob(job_id, owner, target, args, kwargs, label=label, memory=memory)
+
+        with self._condition:
+            self._jobs[job_id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._condition.notify()
+
+        return job_id
+
+    def get(self, job_id: Optional[str]) -> Optional[ValidationJob]:
+        if not job_id:
+            return None
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: Optional[str], reason: str = 'Cancelled') -> bool:
+        """Drop a queued job, or ask a running one to stop at its next check; False if it already finished"""
+        with self._condition:
+            job = self._jobs.get(job_id) if job_id else None
+            if job is None or job.finished:
+                return False
+            if job.status == 'queued':
+                queue = self._queues.get(job.owner)
+                if queue is not None and job in queue:
+                    queue.remove(job)
+                    if not queue:
+                        del self._queues[job.owner]
+                job.status = 'cancelled'
+                job.message = reason
+                job.finished_at = time.time()
+                job.args = ()
+                job.kwargs = {}
+                self._remember_finished(job)
+                self._condition.notify_all()
+                return True
+        if job.cancel_token is not None:
+            job.cancel_token.cancel(reason)
+        return True
+
+    def queue_position(self, job_id: str) -> int:
+        """1-based position of a queued job in dispatch order, 0 if it is not queued"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return 0
+
+            # Simulate the round-robin dispatch over a snapshot of the queues
+            snapshot = [list(queue) for queue in self._queues.values()]
+            position = 0
+            depth = 0
+            while any(depth < len(queue) for queue in snapshot):
+                for queue in snapshot:
+                    if depth < len(queue):
+                        position += 1
+                        if queue[depth] is job:
+                            return position
+                depth += 1
+            return 0
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def load(self) -> Dict[str, Any]:
+        """Running/queued job counts and committed memory, for status displays"""
+        with self._condition:
+            return {
+                'running': self._running,
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'committed_memory': self._committed_memory,
+                'memory_budget': self.memory_budget
+            }
+
+    def _fits(self, job: ValidationJob) -> bool:
+        if self.memory_budget is None or self._running == 0:
+            return True
+        return self._committed_memory + job.memory <= self.memory_budget
+
+    def _next_job(self) -> ValidationJob:
+        with self._condition:
+            while True:
+                if self._queues:
+                    # The oldest job of the first owner is next; it waits until its memory fits
+                    owner, queue = next(iter(self._queues.items()))
+                    if self._fits(queue[0]):
+                        break
+                    queue[0].message = 'Waiting for memory to free up...'
+                self._condition.wait()
+
+            # Take the job, then move that owner to the back
+            job = queue.popleft()
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+
+            self._running += 1
+            self._committed_memory += job.memory
+            job.status = 'running'
+            job.message = 'Running validation checks...'
+            job.started_at = time.time()
+            return job
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            try:
+                if job.cancel_token is not None:
+                    # Nobody may be waiting any more by the time a queued job gets a worker
+                    job.cancel_token.raise_if_cancelled()
+                job.result = job.target(*job.args, progress_callback=job.update_progress, **job.kwargs)
+                job.progress = 1.0
+                job.message = 'Validation completed'
+                job.status = 'done'
+            except ValidationCancelled as e:
+                job.message = str(e) or 'Cancelled'
+                job.status = 'cancelled'
+            except Exception as e:
+                job.error = str(e)
+                job.message = f"Validation failed: {e}"
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                # Drop references to the input data as soon as the job is finished
+                job.args = ()
+                job.kwargs = {}
+                self._forget_old_jobs(job)
+
+    def _forget_old_jobs(self, job: ValidationJob):
+        with self._condition:
+            # Hand the job's memory back and let waiting workers re-check the queue
+            self._running -= 1
+            self._committed_memory -= job.memory
+            self._condition.notify_all()
+            self._remember_finished(job)
+
+    def _remember_finished(self, job: ValidationJob):
+        # Caller holds the lock
+        self._finished_order.append(job.job_id)
+        while len(self._finished_order) > self.keep_finished:
+            self._jobs.pop(self._finished_order.popleft(), None)
@@ -0,0 +1,147 @@
+import re
+from typing import Dict, List, Any, Optional
+
+import pandas as pd
+
+# First data row when no header rows are detected (rows 1-3 hold headers/structural info)
+DEFAULT_DATA_START = 3
+
+# Rows scanned for header text at the top of the sheet
+HEADER_SCAN_ROWS = 15
+
+# Logical field -> (default 0-based column, header texts that name it). Bare words like
+# "State" or "Address" also head other columns (the state of a City/State/Zip block), so
+# they do not move a field away from its default column.
+FIELDS = {
+    'trade_code': (2, ['trade class', 'trade code']),
+    'client_banner': (5, ['client banner']),
+    'matched_banner': (6, ['matched banner', 'match banner', 'matched info']),
+    'client_address': (9, ['client address']),
+    'matched_address': (10, ['matched address', 'match address', 'reference address', 'reference info']),
+    'state_o': (14, ['client state', 'state o']),
+    'state_p': (15, ['matched state', 'match state', 'state p']),
+    'z_code': (37, ['z code', 'z-code']),
+    'job_id': (40, ['job id']),
+    'client_store_id': (41, ['client store id', 'store id'])
+}
+
+# Other header-like cell text seen in the header block of matching files
+EXTRA_HEADER_TEXTS = ['client', 'class', 'code', 'states', 'banned', 'clientbanned', 'clientaddress',
+                      'clientstate', 'tradeclass', 'zcode', 'trade', 'banner', 'address', 'state', 'job']
+
+
+def column_letter(index: int) -> str:
+    """Excel column letter for a 0-based column index (5 -> 'F')"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _header_key(value: Any) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+
+_ALIASES = {alias: field for field, (_, aliases) in FIELDS.items() for alias in aliases}
+_HEADER_TEXTS = set(_ALIASES) | {alias.replace(' ', '') for alias in _ALIASES} | set(EXTRA_HEADER_TEXTS)
+
+
+class SheetLayout:
+    """Where the data starts and which physical column holds each logical field"""
+
+    def __init__(self, data_start: int = DEFAULT_DATA_START, columns: Optional[Dict[str, int]] = None,
+                 header_rows: Optional[List[int]] = None, notes: Optional[List[str]] = None):
+        self.data_start = data_start
+        self.columns = dict(columns) if columns is not None else {field: default for field, (default, _) in FIELDS.items()}
+        self.header_rows = list(header_rows or [])
+        self.notes = list(notes or [])
+
+    def has(self, df: pd.DataFrame, *fields: str) -> bool:
+        return all(self.columns.get(field) is not None and self.columns[field] < len(df.columns) for field in fields)
+
+    def data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Header-free data rows"""
+        return df.iloc[self.data_start:]
+
+    def column(self, df: pd.DataFrame, field: str) -> Optional[pd.Series]:
+        """Data rows of one logical field, None when the sheet does not have that column"""
+        if not self.has(df, field):
+            return None
+        return df.iloc[self.data_start:, self.columns[field]]
+
+    def full_column(self, df: pd.DataFrame, field: str) -> Optional[pd.Series]:
+        """Every row of one logical field (positions line up with the whole sheet)"""
+        if not self.has(df, field):
+            return None
+        return df.iloc[:, self.columns[field]]
+
+    def letter(self, field: str) -> str:
+        return column_letter(self.columns[field])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'data_start': self.data_start, 'columns': self.columns,
+                'header_rows': self.header_rows, 'notes': self.notes}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SheetLayout':
+        return cls(data['data_start'], data['columns'], data.get('header_rows'), data.get('notes'))
+
+
+def detect_layout(df: pd.DataFrame, scan_rows: int = HEADER_SCAN_ROWS) -> SheetLayout:
+    """Find the data start row and map logical fields to columns by reading the header text once"""
+    scan = df.iloc[:scan_rows]
+
+    # Header text of every cell in the scanned block, including the parsed column names (row -1)
+    cells = []
+    for col_pos, name in enumerate(df.columns):
+        cells.append((-1, col_pos, _header_key(name)))
+    for row_pos, row in enumerate(scan.itertuples(index=False, name=None)):
+        for col_pos, value in enumerate(row):
+            if isinstance(value, str):
+                cells.append((row_pos, col_pos, _header_key(value)))
+
+    # Fields named by the header text of each column
+    column_fields: Dict[int, set] = {}
+    for _, col_pos, key in cells:
+        field = _ALIASES.get(key) or _ALIASES.get(key.replace(' ', ''))
+        if field is not None:
+            column_fields.setdefault(col_pos, set()).add(field)
+
+    # A column naming several fields is a label column (like column D), not a field header
+    found: Dict[str, List[int]] = {}
+    for col_pos, fields in column_fields.items():
+        if len(fields) == 1:
+            found.setdefault(next(iter(fields)), []).append(col_pos)
+
+    columns = {}
+    notes = []
+    for field, (default, _) in FIELDS.items():
+        candidates = sorted(set(found.get(field, [])))
+        if default in candidates or not candidates:
+            columns[field] = default
+        elif len(candidates) == 1:
+            columns[field] = candidates[0]
+            notes.append(f"{field.replace('_', ' ').title()} header found in column "
+                         f"{column_letter(candidates[0])} instead of {column_letter(default)}; using column {column_letter(candidates[0])}.")
+        else:
+            columns[field] = default
+
+    missing = [field for field, position in columns.items() if position >= len(df.columns)]
+    if missing:
+        notes.append(f"Sheet has only {len(df.columns)} columns; checks needing "
+                     f"{', '.join(field.replace('_', ' ') for field in missing)} will be skipped.")
+
+    # Rows holding header text in any mapped column; the header block continues past the
+    # default start row for as long as consecutive rows still look like headers
+    field_columns = set(columns.values())
+    header_rows = sorted({row_pos for row_pos, col_pos, key in cells
+                          if row_pos >= 0 and col_pos in field_columns and key in _HEADER_TEXTS})
+    data_start = DEFAULT_DATA_START
+    while data_start in header_rows:
+        data_start += 1
+
+    return SheetLayout(data_start, columns, header_rows, notes)
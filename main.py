@@ -1,10 +1,30 @@
 import streamlit as st
 import pandas as pd
-import io
 from validators import DataValidator
-from utils import format_validation_results, export_report
+from utils import format_validation_results, export_report, format_issue_estimate
+from exporters import EXPORT_FORMATS, export_issues
+from annotate import annotate_workbook
+from jobs import JobManager
+from admission import estimate_parse_memory, estimate_validation_memory, default_memory_budget
+from results import ResultCollector
+from cross_batch_index import CrossBatchIndex, DEFAULT_INDEX_PATH
+from layout import detect_layout
+from cancellation import CancellationToken
+from checkpoint import DEFAULT_CHUNK_ROWS, validate_with_checkpoints
+from uploads import DEFAULT_SPOOL_DIR, MappedFile, SharedFrames, spool_upload
+from rollups import DIMENSIONS
+from worker_pool import PRIMARY_CHECKS, prewarm
+from reference_data import load_reference_data
+from preflight import ROUTES, inspect_workbook, load_cost_model
+from sampling import read_excel_sample
+from xlsx_reader import read_xlsx
+import functools
+import metrics
 import os
+import tempfile
+import threading
 import time
+import uuid
 
 # Set page configuration
 st.set_page_config(
@@ -13,6 +33,58 @@ st.set_page_config(
     layout="wide"
 )
 
+# Detailed issues kept in memory per check; the rest spill to disk
+MAX_ISSUES_IN_MEMORY = int(os.environ.get('QC_MAX_ISSUES_IN_MEMORY', 5000))
+ISSUES_PAGE_SIZE = 500
+
+# Data rows Quick Estimate validates, read straight from the spooled upload
+ESTIMATE_SAMPLE_ROWS = 2000
+
+# A run whose page stopped polling for this long (tab closed) is cancelled
+ABANDON_AFTER_SECONDS = 30.0
+
+@st.cache_resource
+def get_job_manager():
+    """One background worker pool shared by every session on this server
+
+    Workbook parsing and validation both run here, so QC_VALIDATION_WORKERS caps the
+    number of heavy jobs and QC_MEMORY_BUDGET_MB caps the memory committed to them.
+    """
+    budget_mb = os.environ.get('QC_MEMORY_BUDGET_MB')
+    memory_budget = int(budget_mb) * 1024 * 1024 if budget_mb else default_memory_budget()
+    manager = JobManager(max_workers=int(os.environ.get('QC_VALIDATION_WORKERS', 2)), memory_budget=memory_budget)
+    metrics.QUEUE_DEPTH.set_function(manager.queue_depth, queue='streamlit')
+    metrics.IN_FLIGHT.set_function(lambda: manager.load()['running'], queue='streamlit')
+    # Load the Excel reader and ZIP table now rather than in the first upload (QC_PREWARM=0 to skip)
+    if os.environ.get('QC_PREWARM', '1') != '0':
+        threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
+    return manager
+
+@st.cache_resource
+def get_metrics_exporters():
+    """Prometheus endpoint / textfile writer configured by QC_METRICS_PORT and QC_METRICS_FILE"""
+    return metrics.start_exporters_from_env()
+
+@st.cache_resource
+def get_shared_frames():
+    """Parsed workbooks by content hash, shared read-only by every session that uploads them"""
+    return SharedFrames()
+
+@st.cache_resource
+def get_reference_data():
+    """Banner and store address master lists named by QC_BANNER_MASTER / QC_ADDRESS_MASTER (None without them)"""
+    return load_reference_data()
+
+@st.cache_resource
+def get_cost_model():
+    """Parse and validation time model fitted from the runs recorded in QC_COST_MODEL_PATH"""
+    return load_cost_model()
+
+@st.cache_resource
+def get_cross_batch_index():
+    """Persistent index of job and client store IDs from every validated file"""
+    return CrossBatchIndex(os.environ.get('QC_INDEX_PATH', DEFAULT_INDEX_PATH))
+
 # Add custom CSS for animations and styling
 st.markdown("""
 <style>
@@ -219,6 +291,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def main():
+    get_metrics_exporters()
+    
     # Professional animated title with enhanced styling
     st.markdown('''
     <div class="tool-name main-title">
@@ -245,6 +319,40 @@ def main():
         st.session_state.validation_results = None
     if 'uploaded_data' not in st.session_state:
         st.session_state.uploaded_data = None
+    if 'session_owner' not in st.session_state:
+        st.session_state.session_owner = uuid.uuid4().hex
+    if 'validation_job_id' not in st.session_state:
+        st.session_state.validation_job_id = None
+    if 'show_celebration' not in st.session_state:
+        st.session_state.show_celebration = False
+    if 'validation_error' not in st.session_state:
+        st.session_state.validation_error = None
+    if 'issue_estimate' not in st.session_state:
+        st.session_state.issue_estimate = None
+    if 'estimate_job_id' not in st.session_state:
+        st.session_state.estimate_job_id = None
+    if 'estimate_file_id' not in st.session_state:
+        st.session_state.estimate_file_id = None
+    if 'estimate_error' not in st.session_state:
+        st.session_state.estimate_error = None
+    if 'loaded_file_id' not in st.session_state:
+        st.session_state.loaded_file_id = None
+    if 'load_job_id' not in st.session_state:
+        st.session_state.load_job_id = None
+    if 'load_file_id' not in st.session_state:
+        st.session_state.load_file_id = None
+    if 'load_error' not in st.session_state:
+        st.session_state.load_error = None
+    if 'upload_hash' not in st.session_state:
+        st.session_state.upload_hash = None
+    if 'upload_path' not in st.session_state:
+        st.session_state.upload_path = None
+    if 'upload_name' not in st.session_state:
+        st.session_state.upload_name = None
+    if 'upload_profile' not in st.session_state:
+        st.session_state.upload_profile = None
+    if 'upload_estimate' not in st.session_state:
+        st.session_state.upload_estimate = None
     
     # File upload section without box
     st.header("📁 File Upload")
@@ -255,11 +363,25 @@ def main():
     )
     
     if uploaded_file is not None:
+        # Parse in the shared job queue so concurrent big uploads wait instead of exhausting memory
+        if st.session_state.loaded_file_id != uploaded_file.file_id:
+            if st.session_state.load_file_id != uploaded_file.file_id:
+                start_workbook_load(uploaded_file)
+            if st.session_state.loaded_file_id != uploaded_file.file_id:
+                show_workbook_load_status()
+                # The sample is read from the spooled file, so the estimate need not wait for the parse
+                if st.session_state.upload_profile is not None and not st.session_state.load_error:
+                    st.caption("Quick Estimate covers the primary checks until the file has loaded and a ZIP column can be picked.")
+                    show_quick_estimate(uploaded_file.file_id, {name: True for name in PRIMARY_CHECKS}, {})
+                return
+        
         try:
-            # Read the Excel file
-            with st.spinner("Loading Excel file..."):
-                df = pd.read_excel(uploaded_file)
-                st.session_state.uploaded_data = df
+            df = st.session_state.uploaded_data
+            
+            # Find the data start row and field columns once from the header text
+            layout = detect_layout(df)
+            for note in layout.notes:
+                st.warning(f"⚠️ {note}")
             
             # Animated success message
             st.markdown('<div class="success-animation">', unsafe_allow_html=True)
@@ -272,20 +394,21 @@ def main():
             with col1:
                 st.metric("Total Rows", len(df), delta=None)
             with col2:
-                st.metric("Data Rows", len(df) - 3 if len(df) > 3 else 0, delta=None)
+                st.metric("Data Rows", max(len(df) - layout.data_start, 0), delta=None)
             with col3:
                 st.metric("Total Columns", len(df.columns), delta=None)
             with col4:
                 st.metric("File Size", f"{uploaded_file.size / 1024:.1f} KB", delta=None)
             st.markdown('</div>', unsafe_allow_html=True)
+            show_upload_estimate()
             
             # Show data preview with animation
             st.markdown('<div class="data-preview">', unsafe_allow_html=True)
             st.subheader("📊 Data Preview")
             
-            # Create a styled dataframe starting from row 4 (actual data rows)
-            # Skip first 3 rows as they contain headers/structural info
-            preview_df = df.iloc[3:13].copy()  # Show 10 rows of actual data starting from row 4
+            # Create a styled dataframe starting from the first data row
+            # Skip the header/structural rows found by the layout detection
+            preview_df = layout.data(df).iloc[:10].copy()  # Show 10 rows of actual data
             
             # Style the dataframe to highlight 4th column (D column) headers
             def highlight_4th_column(df):
@@ -309,6 +432,10 @@ def main():
             
             # Primary validations
             st.subheader("🎯 Primary Validations")
+            reference_data = get_reference_data()
+            if reference_data is not None:
+                st.caption("Banner and address pairs are resolved against " + " and ".join(reference_data.summary()) +
+                           "; pairs not in the master lists use the LEFT-4 comparison.")
             col1, col2 = st.columns(2)
             
             with col1:
@@ -325,78 +452,407 @@ def main():
                 st.markdown('</div>', unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
             
+            # ZIP code validations (need the ZIP column to be picked)
+            st.subheader("📮 ZIP Code Validations")
+            zip_column = st.selectbox(
+                "ZIP code column",
+                options=[None] + list(df.columns),
+                format_func=lambda column: "— none —" if column is None else str(column),
+                help="Column holding ZIP codes; ZIP checks are skipped when no column is selected"
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                check_invalid_zips = st.checkbox("Check ZIP Code Format", value=zip_column is not None, disabled=zip_column is None, help="Validates 5 digit or ZIP+4 format")
+            with col2:
+                check_zip_states = st.checkbox("Check ZIP vs State (O & P columns)", value=zip_column is not None, disabled=zip_column is None, help="Flags ZIP codes that lie outside the states given in columns O and P")
+            
 
             
 
+            # Checks against previously validated files
+            st.subheader("🗂️ Cross-File Validations")
+            check_cross_batch = st.checkbox("Check Repeated IDs Across Previous Files (AO & AP columns)", value=True, help="Flags job IDs and client store IDs already matched in earlier files, and re-matches to a different banner, address or state")
+            
+            validation_options = {
+                'banner_mismatches': check_banner_mismatches,
+                'trade_errors': check_trade_errors,
+                'address_column_mismatches': check_address_column_mismatches,
+                'z_code_errors': check_z_code_errors,
+                'non_us_states': check_non_us_states,
+                'invalid_zip_codes': check_invalid_zips,
+                'zip_state_mismatches': check_zip_states
+            }
+            
+            # Quick sampled pre-check before committing to a full run
+            show_quick_estimate(uploaded_file.file_id, validation_options,
+                                {'zip': zip_column} if zip_column is not None else {}, df=df)
+            
             # Run validation button
-            if st.button("🚀 Run Validation", type="primary", use_container_width=True):
+            run_label = "🚀 Run Full Validation" if st.session_state.issue_estimate is not None else "🚀 Run Validation"
+            if st.button(run_label, type="primary", use_container_width=True):
                 run_validation(
                     df,
                     check_banner_mismatches,
                     check_trade_errors,
                     check_address_column_mismatches,
                     check_z_code_errors,
-                    check_non_us_states
+                    check_non_us_states,
+                    zip_column=zip_column,
+                    check_invalid_zips=check_invalid_zips,
+                    check_zip_states=check_zip_states,
+                    check_cross_batch=check_cross_batch,
+                    file_hash=st.session_state.upload_hash,
+                    file_name=uploaded_file.name,
+                    layout=layout
                 )
             
         except Exception as e:
             st.error(f"❌ Error reading Excel file: {str(e)}")
             st.markdown("Please ensure the file is a valid Excel format (.xlsx or .xls).")
     
+    # Poll the background validation job while it is queued or running
+    if st.session_state.validation_job_id is not None:
+        show_validation_job_status()
+    
+    if st.session_state.validation_error:
+        st.error(f"❌ {st.session_state.validation_error}")
+    
     # Display validation results if available
     if st.session_state.validation_results is not None:
-        display_validation_results()
+        if st.session_state.show_celebration:
+            show_completion_celebration()
+            st.session_state.show_celebration = False
+        display_validation_results(uploaded_file)
 
-def run_validation(df, check_banner, check_trade, check_address_cols, check_z_code, check_non_us):
-    """Run the data validation process"""
+def run_validation(df, check_banner, check_trade, check_address_cols, check_z_code, check_non_us,
+                   zip_column=None, check_invalid_zips=False, check_zip_states=False,
+                   check_cross_batch=False, file_hash=None, file_name='', layout=None):
+    """Queue the data validation as a background job"""
     
-    # Animated progress bar
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # A new run replaces the one still in progress for this session
+    get_job_manager().cancel(st.session_state.validation_job_id, 'Replaced by a newer validation run')
     
-    # Step 1: Initialize
-    status_text.text("🔧 Initializing validation engine...")
-    progress_bar.progress(20)
-    time.sleep(0.5)
+    # Initialize validator
+    validator = DataValidator(cross_batch_index=get_cross_batch_index(), reference_data=get_reference_data())
     
-    # Step 2: Load data
-    status_text.text("📊 Loading and analyzing data...")
-    progress_bar.progress(40)
-    time.sleep(0.5)
+    # Primary validations use fixed column positions; only ZIP checks need a mapping
+    column_mapping = {'zip': zip_column} if zip_column is not None else {}
     
-    # Step 3: Run validations
-    status_text.text("🔍 Running validation checks...")
-    progress_bar.progress(60)
-    time.sleep(0.5)
+    # With QC_CHECKPOINT_DIR set, runs save progress per chunk and resume after a restart
+    target = validator.validate_data
+    checkpoint_dir = os.environ.get('QC_CHECKPOINT_DIR')
+    if checkpoint_dir and file_hash:
+        target = functools.partial(validate_with_checkpoints, validator, checkpoint_dir=checkpoint_dir,
+                                   chunk_rows=int(os.environ.get('QC_CHECKPOINT_CHUNK_ROWS', DEFAULT_CHUNK_ROWS)))
     
-    with st.spinner("Processing validation results..."):
-        # Initialize validator
-        validator = DataValidator()
-        
-        # Run validations
-        results = validator.validate_data(
-            df, 
-            {},  # No column mapping needed for primary validations
-            {
-                'banner_mismatches': check_banner,
-                'trade_errors': check_trade,
-                'address_column_mismatches': check_address_cols,
-                'z_code_errors': check_z_code,
-                'non_us_states': check_non_us
-            }
+    job_id = get_job_manager().submit(
+        st.session_state.session_owner,
+        target,
+        df, 
+        column_mapping,
+        {
+            'banner_mismatches': check_banner,
+            'trade_errors': check_trade,
+            'address_column_mismatches': check_address_cols,
+            'z_code_errors': check_z_code,
+            'non_us_states': check_non_us,
+            'invalid_zip_codes': check_invalid_zips,
+            'zip_state_mismatches': check_zip_states,
+            'cross_batch_repeats': check_cross_batch
+        },
+        collector=ResultCollector(max_issues_per_rule=MAX_ISSUES_IN_MEMORY),
+        file_hash=file_hash,
+        file_name=file_name,
+        layout=layout,
+        label=f"{len(df)} rows",
+        memory=estimate_validation_memory(len(df), len(df.columns)),
+        cancel_token=CancellationToken(abandon_after=ABANDON_AFTER_SECONDS),
+        time_budget=float(os.environ['QC_VALIDATION_TIME_BUDGET']) if os.environ.get('QC_VALIDATION_TIME_BUDGET') else None
+    )
+    
+    st.session_state.validation_job_id = job_id
+    st.session_state.validation_results = None
+    st.session_state.validation_error = None
+
+@st.fragment(run_every=1.0)
+def show_validation_job_status():
+    """Show progress of the background validation job and attach its results when ready"""
+    if st.session_state.validation_job_id is None:
+        return
+    
+    job = get_job_manager().get(st.session_state.validation_job_id)
+    if job is None:
+        st.session_state.validation_job_id = None
+        st.warning("⚠️ The validation job is no longer available. Please run the validation again.")
+        return
+    
+    # Polling proves the page is still open; without it the run is abandoned after a while
+    if job.cancel_token is not None:
+        job.cancel_token.keep_alive()
+    
+    if job.status == 'queued':
+        st.info(f"⏳ Validation job {job.job_id} is {describe_queued_job(job)}")
+        st.progress(0)
+        return
+    
+    if job.status == 'running':
+        st.progress(job.progress, text=f"🔍 {job.message} ({job.progress * 100:.0f}%)")
+        for warning in job.warnings:
+            st.warning(f"⚠️ {warning}")
+        return
+    
+    st.session_state.validation_job_id = None
+    if job.status == 'failed':
+        st.session_state.validation_error = job.message
+    elif job.status == 'cancelled':
+        st.session_state.validation_error = f"Validation cancelled: {job.message}"
+    else:
+        st.session_state.validation_results = job.result
+        st.session_state.show_celebration = True
+        if not job.result.incomplete:
+            record_run_cost(validate_seconds=job.finished_at - job.started_at)
+    st.rerun()
+
+def estimate_sample(validator, source, column_mapping, validation_options, progress_callback=None):
+    """Job target for Quick Estimate: validate a stratified sample of the upload
+
+    source is the spooled .xlsx path, read for the sampled rows alone, or the loaded DataFrame
+    for workbooks that cannot be sampled in place (.xls).
+    """
+    if isinstance(source, pd.DataFrame):
+        return validator.estimate_issue_rates(source, column_mapping, validation_options, sample_size=ESTIMATE_SAMPLE_ROWS)
+    sample, population_rows = read_excel_sample(source, ESTIMATE_SAMPLE_ROWS)
+    return validator.estimate_issue_rates(sample, column_mapping, validation_options, population_rows=population_rows)
+
+def show_quick_estimate(file_id, validation_options, column_mapping, df=None):
+    """Quick Estimate button, its background job and the estimated issue rates of the current upload"""
+    profile = st.session_state.upload_profile
+    if st.button("⚡ Quick Estimate (sampled rows)", use_container_width=True):
+        get_job_manager().cancel(st.session_state.estimate_job_id, 'Replaced by a newer estimate')
+        columns = profile['sheets'][0]['columns'] if profile and profile['sheets'] else None
+        st.session_state.estimate_job_id = get_job_manager().submit(
+            st.session_state.session_owner,
+            estimate_sample,
+            DataValidator(reference_data=get_reference_data()),
+            st.session_state.upload_path if profile is not None else df,
+            column_mapping,
+            validation_options,
+            label=f"Estimate for {st.session_state.upload_name}",
+            memory=estimate_validation_memory(ESTIMATE_SAMPLE_ROWS, columns)
         )
-        
-        # Complete progress
-        status_text.text("✅ Validation completed successfully!")
-        progress_bar.progress(100)
-        time.sleep(0.5)
-        
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
-        
-        st.session_state.validation_results = results
+        st.session_state.estimate_file_id = file_id
+        st.session_state.issue_estimate = None
+        st.session_state.estimate_error = None
+    
+    if st.session_state.estimate_job_id is not None:
+        show_estimate_job_status()
+    if st.session_state.estimate_error:
+        st.error(f"❌ {st.session_state.estimate_error}")
+    
+    # Drop an estimate that belongs to a previously uploaded file
+    if st.session_state.issue_estimate is not None and st.session_state.issue_estimate.get('file_id') != file_id:
+        st.session_state.issue_estimate = None
+    
+    if st.session_state.issue_estimate is not None:
+        estimate = st.session_state.issue_estimate
+        st.subheader("⚡ Estimated Issue Rates")
+        st.caption(f"Based on {estimate['sampled_rows']:,} of {estimate['population_rows']:,} data rows sampled across the whole sheet.")
+        st.dataframe(format_issue_estimate(estimate), use_container_width=True)
+
+@st.fragment(run_every=1.0)
+def show_estimate_job_status():
+    """Show the queued or running Quick Estimate job and keep its estimate when it finishes"""
+    if st.session_state.estimate_job_id is None:
+        return
+    
+    job = get_job_manager().get(st.session_state.estimate_job_id)
+    if job is None:
+        st.session_state.estimate_job_id = None
+        return
+    
+    if job.status == 'queued':
+        st.info(f"⏳ Quick Estimate is {describe_queued_job(job)}")
+        return
     
+    if job.status == 'running':
+        st.info("⚡ Validating a sample of rows...")
+        return
+    
+    st.session_state.estimate_job_id = None
+    if job.status == 'failed':
+        st.session_state.estimate_error = f"Quick Estimate failed: {job.message}"
+    elif job.status == 'done':
+        st.session_state.issue_estimate = dict(job.result, file_id=st.session_state.estimate_file_id)
+    st.rerun()
+
+def read_workbook(path: str, progress_callback=None):
+    """Job target that parses a spooled workbook into a DataFrame through a memory map, across processes"""
+    with metrics.PARSE_SECONDS.time():
+        with MappedFile(path) as mapped:
+            return read_xlsx(mapped)
+
+def start_workbook_load(uploaded_file):
+    """Spool the upload, estimate its cost from the container alone and parse it by that estimate
+
+    Small workbooks parse right away in the session, larger ones on the shared job queue;
+    ones too big for the page wait for the user to confirm. Another session's parse of
+    the same bytes is reused as is.
+    """
+    file_hash, path = spool_upload(uploaded_file, os.environ.get('QC_SPOOL_DIR', DEFAULT_SPOOL_DIR),
+                                   suffix=os.path.splitext(uploaded_file.name)[1].lower())
+    st.session_state.upload_hash = file_hash
+    st.session_state.upload_path = path
+    st.session_state.upload_name = uploaded_file.name
+    get_job_manager().cancel(st.session_state.load_job_id, 'A different file was uploaded')
+    get_job_manager().cancel(st.session_state.estimate_job_id, 'A different file was uploaded')
+    st.session_state.load_job_id = None
+    st.session_state.estimate_job_id = None
+    st.session_state.estimate_error = None
+    st.session_state.load_file_id = uploaded_file.file_id
+    st.session_state.load_error = None
+    
+    try:
+        st.session_state.upload_profile = inspect_workbook(path)
+        st.session_state.upload_estimate = get_cost_model().estimate(st.session_state.upload_profile,
+                                                                     get_job_manager().memory_budget)
+    except ValueError:
+        # .xls files have no container to inspect; the parse job reports unreadable files
+        st.session_state.upload_profile = None
+        st.session_state.upload_estimate = None
+    
+    shared = get_shared_frames().get(file_hash)
+    if shared is not None:
+        attach_workbook(shared)
+        return
+    
+    route = st.session_state.upload_estimate['route'] if st.session_state.upload_estimate else 'queue'
+    if route == 'interactive':
+        started = time.perf_counter()
+        try:
+            with st.spinner(f"📥 Loading {uploaded_file.name}..."):
+                df = read_workbook(path)
+        except Exception as e:
+            st.session_state.load_error = str(e)
+            return
+        record_run_cost(parse_seconds=time.perf_counter() - started)
+        attach_workbook(get_shared_frames().put(file_hash, df))
+    elif route == 'queue':
+        submit_workbook_load()
+
+def submit_workbook_load():
+    """Queue the parse of the spooled upload on the shared job manager"""
+    estimate = st.session_state.upload_estimate
+    if estimate is not None:
+        memory = estimate['parse_memory']
+    else:
+        memory = estimate_parse_memory(os.path.getsize(st.session_state.upload_path))
+    st.session_state.load_job_id = get_job_manager().submit(
+        st.session_state.session_owner,
+        read_workbook,
+        st.session_state.upload_path,
+        label=st.session_state.upload_name,
+        memory=memory
+    )
+
+def record_run_cost(parse_seconds=None, validate_seconds=None):
+    """Feed the measured times of the current upload back into the pre-flight cost model"""
+    if st.session_state.upload_profile is not None:
+        get_cost_model().observe(st.session_state.upload_profile, parse_seconds, validate_seconds)
+
+def format_seconds(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+def show_upload_estimate():
+    """Declared size and predicted cost of the upload, read from the file before parsing it"""
+    estimate = st.session_state.upload_estimate
+    if estimate is None:
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Declared Rows", f"{estimate['rows']:,}" if estimate['rows_declared'] else f"~{estimate['rows']:,}")
+    with col2:
+        st.metric("Est. Load Time", format_seconds(estimate['parse_seconds']))
+    with col3:
+        st.metric("Est. Validation Time", format_seconds(estimate['validate_seconds']))
+    with col4:
+        st.metric("Est. Peak Memory", f"{max(estimate['parse_memory'], estimate['validate_memory']) / 1024 ** 2:,.0f} MB")
+    basis = (f"fitted from {estimate['calibrated_from']} recorded runs" if estimate['calibrated_from']
+             else "default rates until more runs are recorded")
+    st.caption(f"Pre-flight estimate ({basis}): {ROUTES[estimate['route']]}.")
+
+def attach_workbook(df):
+    """Make a loaded workbook the session's current one"""
+    # A new file replaces the previous one and anything computed from it
+    get_job_manager().cancel(st.session_state.validation_job_id, 'A different file was uploaded')
+    st.session_state.validation_job_id = None
+    st.session_state.uploaded_data = df
+    st.session_state.loaded_file_id = st.session_state.load_file_id
+    st.session_state.validation_results = None
+    st.session_state.validation_error = None
+    # A Quick Estimate taken while this file was loading still applies to it
+    if st.session_state.issue_estimate is not None and st.session_state.issue_estimate.get('file_id') != st.session_state.loaded_file_id:
+        st.session_state.issue_estimate = None
+
+def describe_queued_job(job):
+    """Queue position text for a waiting job"""
+    position = get_job_manager().queue_position(job.job_id)
+    text = f"queued (position {position}"
+    load = get_job_manager().load()
+    if load['memory_budget']:
+        text += f", {load['running']} running, {load['committed_memory'] / 1024 ** 2:,.0f} of {load['memory_budget'] / 1024 ** 2:,.0f} MB in use"
+    text += ")."
+    if job.message.startswith('Waiting for memory'):
+        text += f" Next in line; needs about {job.memory / 1024 ** 2:,.0f} MB."
+    return text
+
+@st.fragment(run_every=1.0)
+def show_workbook_load_status():
+    """Show the queued or running workbook parse and hand its DataFrame to the page when ready"""
+    show_upload_estimate()
+    if st.session_state.load_job_id is None:
+        estimate = st.session_state.upload_estimate
+        if estimate is not None and estimate['route'] == 'batch' and not st.session_state.load_error:
+            st.error("❌ This workbook is too large to validate on this page. Put it in the watched folder "
+                     "or send it to the validation service instead.")
+            if st.button("Load anyway", key="load_anyway"):
+                submit_workbook_load()
+            return
+        if st.session_state.load_error:
+            st.error(f"❌ Error reading Excel file: {st.session_state.load_error}")
+            st.markdown("Please ensure the file is a valid Excel format (.xlsx or .xls).")
+        return
+    
+    job = get_job_manager().get(st.session_state.load_job_id)
+    if job is None:
+        st.session_state.load_job_id = None
+        st.session_state.load_file_id = None
+        st.warning("⚠️ The upload was dropped from the queue. Please upload the file again.")
+        return
+    
+    if job.status == 'queued':
+        st.info(f"⏳ Loading of {job.label} is {describe_queued_job(job)}")
+        return
+    
+    if job.status == 'running':
+        st.info(f"📥 Loading {job.label}...")
+        return
+    
+    st.session_state.load_job_id = None
+    if job.status == 'failed':
+        st.session_state.load_error = job.error
+    else:
+        record_run_cost(parse_seconds=job.finished_at - job.started_at)
+        # Sessions hold the shared DataFrame; the job keeps no copy of its own
+        attach_workbook(get_shared_frames().put(st.session_state.upload_hash, job.result))
+        job.result = None
+    st.rerun()
+
+def show_completion_celebration():
+    """Fireworks shown once after a validation job finishes"""
     # Fireworks celebration effect
     st.markdown("""
     <div style="position: fixed; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none; z-index: 9999;">
@@ -453,15 +909,31 @@ def run_validation(df, check_banner, check_trade, check_address_cols, check_z_co
     """, unsafe_allow_html=True)
     
     st.success("✅ Validation completed! Results are ready for review.")
-    time.sleep(2)  # Show fireworks for 2 seconds
-    st.rerun()
 
-def display_validation_results():
+def offer_file_download(export_file, **button_kwargs):
+    """Download button for an export already written to a temporary file.
+
+    Streamlit accepts read-only file objects but not the read/write handle TemporaryFile returns, so a
+    reader is opened on the same descriptor. Streamlit still copies the payload into its in-memory media
+    store for as long as the button is shown; the export itself was built on disk.
+    """
+    export_file.flush()
+    with open(export_file.fileno(), 'rb', closefd=False) as reader:
+        st.download_button(data=reader, **button_kwargs)
+
+def display_validation_results(uploaded_file=None):
     """Display the validation results"""
     results = st.session_state.validation_results
     
     st.header("📋 Validation Results")
     
+    if results.incomplete:
+        st.error("⏱️ Incomplete results: the run stopped at its time budget, so the counts below do not cover the whole file.")
+    
+    # Early warning when the failure rate suggests the column layout is wrong
+    for warning in results.warnings:
+        st.warning(f"⚠️ {warning}")
+    
     # Summary metrics with light styling
     total_issues = sum(len(issues) for issues in results.values())
     
@@ -477,18 +949,17 @@ def display_validation_results():
         st.metric("Issue Rate", f"{issue_rate:.1f}%")
     with col4:
         # Calculate clean records by getting unique row numbers with issues
-        rows_with_issues = set()
-        for issues in results.values():
-            if issues:
-                for issue in issues:
-                    if isinstance(issue, dict) and 'row' in issue:
-                        rows_with_issues.add(issue['row'])
-                    elif isinstance(issue, dict) and 'rows' in issue:
-                        rows_with_issues.update(issue['rows'])
-        clean_records = len(st.session_state.uploaded_data) - len(rows_with_issues)
+        if results.rollups is not None:
+            flagged_count = results.rollups.flagged_count
+        else:
+            flagged_count = len(results.flagged_rows())
+        clean_records = len(st.session_state.uploaded_data) - flagged_count
         st.metric("Clean Records", clean_records)
     st.markdown('</div>', unsafe_allow_html=True)
     
+    if results.rollups is not None and results.rollups.dimensions:
+        display_breakdown(results.rollups)
+    
     # Detailed results
     st.subheader("🔍 Detailed Issues")
     
@@ -496,17 +967,20 @@ def display_validation_results():
         if issues:
             with st.expander(f"{check_type.replace('_', ' ').title()} ({len(issues)} issues)", expanded=False):
                 st.markdown('<div class="validation-report-box">', unsafe_allow_html=True)
-                if isinstance(issues, list) and len(issues) > 0:
-                    if isinstance(issues[0], dict):
-                        # Display as DataFrame for structured data
-                        issues_df = pd.DataFrame(issues)
-                        st.dataframe(issues_df, use_container_width=True)
-                    else:
-                        # Display as simple list
-                        for i, issue in enumerate(issues, 1):
-                            st.write(f"{i}. {issue}")
+                # Page through the issues; spilled issues are read back from disk one page at a time
+                page_count = (len(issues) - 1) // ISSUES_PAGE_SIZE + 1
+                page = 1
+                if page_count > 1:
+                    page = st.number_input(f"Page (1-{page_count})", min_value=1, max_value=page_count, value=1, key=f"page_{check_type}")
+                page_issues = issues[(page - 1) * ISSUES_PAGE_SIZE:page * ISSUES_PAGE_SIZE]
+                if isinstance(page_issues[0], dict):
+                    # Display as DataFrame for structured data
+                    issues_df = pd.DataFrame(page_issues)
+                    st.dataframe(issues_df, use_container_width=True)
                 else:
-                    st.write("No specific details available for these issues.")
+                    # Display as simple list
+                    for i, issue in enumerate(page_issues, (page - 1) * ISSUES_PAGE_SIZE + 1):
+                        st.write(f"{i}. {issue}")
                 st.markdown('</div>', unsafe_allow_html=True)
     
     # Export functionality
@@ -515,13 +989,14 @@ def display_validation_results():
     
     with col1:
         if st.button("📊 Download Detailed Report", use_container_width=True):
-            report_data = export_report(st.session_state.uploaded_data, results)
-            st.download_button(
-                label="💾 Download Excel Report",
-                data=report_data,
-                file_name="validation_report.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            with tempfile.TemporaryFile() as report_file:
+                export_report(st.session_state.uploaded_data, results, report_file)
+                offer_file_download(
+                    report_file,
+                    label="💾 Download Excel Report",
+                    file_name="validation_report.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
     
     with col2:
         if st.button("📋 Download Summary Report", use_container_width=True):
@@ -532,6 +1007,70 @@ def display_validation_results():
                 file_name="validation_summary.csv",
                 mime="text/csv"
             )
+    
+    # The uploaded workbook itself, with its formatting kept and the flagged cells marked
+    if uploaded_file is not None and uploaded_file.name.lower().endswith('.xlsx') and os.path.exists(st.session_state.upload_path or ''):
+        if st.button("🖍️ Download Annotated Workbook", use_container_width=True):
+            with st.spinner("Marking flagged cells..."):
+                with tempfile.TemporaryFile() as annotated_file:
+                    summary = annotate_workbook(st.session_state.upload_path, results, annotated_file)
+                    for note in summary['notes']:
+                        st.info(note)
+                    offer_file_download(
+                        annotated_file,
+                        label=f"💾 Download Workbook ({summary['cells']:,} cells flagged)",
+                        file_name=f"{os.path.splitext(uploaded_file.name)[0]}_annotated.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+    
+    # Every issue of every check, written chunk by chunk for downstream tools
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        export_format = st.selectbox("Issue export format", list(EXPORT_FORMATS), key="issue_export_format")
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🧾 Export All Issues", use_container_width=True):
+            suffix, mime = EXPORT_FORMATS[export_format]
+            with st.spinner("Writing issues..."):
+                with tempfile.TemporaryFile() as export_file:
+                    written = export_issues(results, export_file, export_format)
+                    offer_file_download(
+                        export_file,
+                        label=f"💾 Download {written:,} Issues ({export_format})",
+                        file_name=f"validation_issues{suffix}",
+                        mime=mime
+                    )
+
+def display_breakdown(cube):
+    """Issue counts by banner, state, trade code or job, read from the run's rollup cube"""
+    st.subheader("📊 Breakdown")
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        dimension = st.selectbox("Break down by", cube.dimensions, format_func=lambda name: DIMENSIONS[name][1],
+                                 key="breakdown_dimension")
+    with col2:
+        measure = st.radio("Count", ['issues', 'rows'], horizontal=True, key="breakdown_measure",
+                           format_func=lambda name: "Issues" if name == 'issues' else "Distinct rows")
+    
+    table = cube.pivot(dimension, measure)
+    st.dataframe(table.style.format({'Issue Rate': '{:.1%}'}), use_container_width=True)
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        value = st.selectbox(f"Drill into a {DIMENSIONS[dimension][1]} value", list(table.index), key="breakdown_value")
+    if value is not None:
+        detail = cube.drill_down(dimension, value)
+        st.dataframe(detail[detail['Issues'] > 0], use_container_width=True, hide_index=True)
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.download_button(
+            label="💾 Download Breakdown (CSV)",
+            data=cube.to_frame().to_csv(index=False),
+            file_name="validation_breakdown.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
 
 if __name__ == "__main__":
     main()
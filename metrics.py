@@ -0,0 +1,327 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and latency histograms are updated from the validation pipeline
+and rendered in the Prometheus text format (version 0.0.4), either through a
+local HTTP endpoint or a file for node_exporter's textfile collector:
+
+    QC_METRICS_PORT=9464         serve http://127.0.0.1:9464/metrics
+    QC_METRICS_FILE=/var/lib/node_exporter/qc.prom
+
+Updates are a dict lookup and an add under a per-metric lock, so instrumenting
+per check (not per row) costs nothing measurable. Worker processes drain() what
+they recorded and the parent merge()s it, so pool-based runs report in one place.
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a single cheap check up to parsing a very large workbook
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{self._label_text(key)} {_number(value)}' for key, value in items]
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; set_function() reads it lazily at render time"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = float(function())
+            except Exception:
+                continue
+        return self.header() + [f'{self.name}{self._label_text(key)} {_number(value)}' for key, value in sorted(values.items())]
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            self._values.update(values)
+
+
+class Histogram(_Metric):
+    """Latency distribution over fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bucket_labels = self._label_text(key, f'le="{_number(bound)}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {_number(total)}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {count}')
+        return lines
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    """Named collection of metrics; creating a metric twice returns the existing one"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def drain(self) -> Dict[str, Any]:
+        """Take everything recorded so far (used to ship worker-process metrics to the parent)"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.drain() for name, metric in metrics}
+
+    def merge(self, drained: Optional[Dict[str, Any]]):
+        if not drained:
+            return
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values in drained.items():
+            if name in metrics:
+                metrics[name].merge(values)
+
+    def write_textfile(self, path: str):
+        """Write the exposition atomically, for node_exporter's textfile collector"""
+        partial = f'{path}.{os.getpid()}.partial'
+        with open(partial, 'w', encoding='utf-8') as handle:
+            handle.write(self.render())
+        os.replace(partial, path)
+
+
+REGISTRY = Registry()
+
+# Pipeline metrics, shared by the Streamlit page, the service, the watcher and worker processes
+PARSE_SECONDS = REGISTRY.histogram('qc_parse_seconds', 'Time spent reading workbooks into DataFrames')
+CHECK_SECONDS = REGISTRY.histogram('qc_check_seconds', 'Time spent in each validation check', ['check'])
+VALIDATION_SECONDS = REGISTRY.histogram('qc_validation_seconds', 'Time spent in validate_data')
+VALIDATIONS = REGISTRY.counter('qc_validations_total', 'Completed validate_data runs')
+ROWS_VALIDATED = REGISTRY.counter('qc_rows_validated_total', 'Data rows run through validate_data')
+ROWS_PER_SECOND = REGISTRY.gauge('qc_rows_per_second', 'Data rows per second of the most recent validation')
+ISSUES = REGISTRY.counter('qc_issues_total', 'Issues found, by rule', ['rule'])
+CACHE_LOOKUPS = REGISTRY.counter('qc_cache_lookups_total', 'Lookups served by a per-value cache', ['cache'])
+CACHE_HITS = REGISTRY.counter('qc_cache_hits_total', 'Lookups answered without recomputing', ['cache'])
+QUEUE_DEPTH = REGISTRY.gauge('qc_queue_depth', 'Jobs waiting for a worker', ['queue'])
+IN_FLIGHT = REGISTRY.gauge('qc_in_flight', 'Jobs currently running', ['queue'])
+STARTUP_SECONDS = REGISTRY.histogram('qc_worker_startup_seconds', 'Worker start-up time, by phase (import, warm)', ['phase'])
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, address: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread"""
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_textfile_writer(path: str, interval: float = 15.0) -> threading.Thread:
+    """Rewrite the metrics file every interval seconds from a daemon thread"""
+    def loop():
+        while True:
+            try:
+                REGISTRY.write_textfile(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='metrics-textfile', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_exporters_from_env():
+    """Start the endpoint and/or file writer configured by QC_METRICS_PORT / QC_METRICS_FILE"""
+    started = {}
+    if os.environ.get('QC_METRICS_PORT'):
+        started['http'] = start_http_server(int(os.environ['QC_METRICS_PORT']),
+                                            os.environ.get('QC_METRICS_ADDRESS', '127.0.0.1'))
+    if os.environ.get('QC_METRICS_FILE'):
+        started['textfile'] = start_textfile_writer(os.environ['QC_METRICS_FILE'],
+                                                    float(os.environ.get('QC_METRICS_INTERVAL', 15)))
+    return started
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
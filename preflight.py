@@ -0,0 +1,317 @@
+"""Pre-flight size and cost estimate for .xlsx workbooks, read without parsing any cells.
+
+inspect_workbook() reads the zip container's central directory and only the start of
+a few parts:
+
+    xl/workbook.xml + rels     sheet names and their parts, in workbook order
+    each worksheet part        the declared <dimension ref="A1:AR40001"/> near its start
+    xl/sharedStrings.xml       the count and uniqueCount attributes of <sst>
+
+plus each part's compressed and uncompressed size from the directory. That takes a few
+milliseconds whatever the file size.
+
+CostModel turns the profile of the first sheet (the one pandas reads) into predicted
+parse time, validation time and memory, and a route: parse right away in the session,
+on the shared background queue, or batch only (the folder watcher or the service).
+Parse time is linear in the XML bytes of the sheet plus its shared strings, and
+validation time is linear in rows. The coefficients are refitted from the timings
+recorded after real runs (QC_COST_MODEL_PATH). Until MIN_OBSERVATIONS runs are
+recorded, the defaults below are used; they were measured on typical 44-column files.
+
+    python preflight.py workbook.xlsx
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+from admission import estimate_parse_memory, estimate_validation_memory
+
+DEFAULT_COST_MODEL_PATH = os.path.join(os.path.expanduser('~'), '.matching_qc', 'run_costs.jsonl')
+
+# Defaults until enough runs are recorded (xlsx_reader parses about 18 MB of sheet XML a second per core)
+DEFAULT_PARSE_SECONDS_PER_BYTE = 0.055e-6
+DEFAULT_VALIDATE_SECONDS_PER_ROW = 15e-6
+
+# Sheet XML per row, used for the row count of sheets that declare no dimension
+DEFAULT_XML_BYTES_PER_ROW = 1000
+
+MIN_OBSERVATIONS = 5
+MAX_OBSERVATIONS = 500
+# The run log is cut back to the newest MAX_OBSERVATIONS runs once it grows past this (runs are ~200 bytes)
+MAX_LOG_BYTES = MAX_OBSERVATIONS * 1024
+
+# Routing thresholds on predicted parse + validation time and peak memory
+INTERACTIVE_SECONDS = 5.0
+INTERACTIVE_BYTES = 256 * 1024 * 1024
+BATCH_SECONDS = 15 * 60
+
+ROUTES = {
+    'interactive': 'parsed right away in this session',
+    'queue': 'parsed on the shared background queue',
+    'batch': 'too large for the page; run it through the folder watcher or the validation service'
+}
+
+# Decompressed bytes read from the start of a part to find its header element
+HEAD_BYTES = 64 * 1024
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension\s+ref="\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?"')
+_SST_COUNT = re.compile(rb'<(?:\w+:)?sst\b[^>]*?\scount="(\d+)"')
+_SST_UNIQUE = re.compile(rb'<(?:\w+:)?sst\b[^>]*?\suniqueCount="(\d+)"')
+
+
+def _column_number(letters: bytes) -> int:
+    number = 0
+    for letter in letters:
+        number = number * 26 + letter - ord('A') + 1
+    return number
+
+
+def _head(archive: zipfile.ZipFile, name: str) -> bytes:
+    with archive.open(name) as stream:
+        return stream.read(HEAD_BYTES)
+
+
+def sheet_parts(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """(sheet name, part name) in workbook order"""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    relations = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {relation.get('Id'): relation.get('Target') for relation in relations.iter(f'{_PACKAGE_REL_NS}Relationship')}
+
+    parts = []
+    for sheet in workbook.iter(f'{_MAIN_NS}sheet'):
+        target = targets.get(sheet.get(f'{_REL_NS}id'))
+        if target:
+            # Targets are relative to xl/ unless absolute within the package
+            parts.append((sheet.get('name'), target.lstrip('/') if target.startswith('/') else 'xl/' + target))
+    return parts
+
+
+def inspect_workbook(source: Union[str, BinaryIO]) -> Dict[str, Any]:
+    """Declared sheet dimensions, shared-string counts and part sizes of an .xlsx file
+
+    Each sheet has rows and columns (the declared last cell; None when the sheet does
+    not declare a usable dimension), compressed_bytes and xml_bytes. Raises ValueError
+    when source is not an .xlsx container.
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as error:
+        raise ValueError(f"Not an .xlsx workbook: {error}") from error
+
+    try:
+        sizes = {info.filename: info for info in archive.infolist()}
+        sheets = []
+        for name, part in sheet_parts(archive):
+            info = sizes.get(part)
+            if info is None:
+                continue
+            rows = columns = None
+            match = _DIMENSION.search(_head(archive, part))
+            if match and match.group(3):
+                rows, columns = int(match.group(4)), _column_number(match.group(3))
+            elif match and info.file_size < HEAD_BYTES:
+                # A bare "A1" is only believable for a sheet that small
+                rows, columns = int(match.group(2)), _column_number(match.group(1))
+            sheets.append({'name': name, 'part': part, 'rows': rows, 'columns': columns,
+                           'compressed_bytes': info.compress_size, 'xml_bytes': info.file_size})
+
+        shared_strings = unique_strings = None
+        shared_info = sizes.get('xl/sharedStrings.xml')
+        if shared_info is not None:
+            head = _head(archive, shared_info.filename)
+            count, unique = _SST_COUNT.search(head), _SST_UNIQUE.search(head)
+            shared_strings = int(count.group(1)) if count else None
+            unique_strings = int(unique.group(1)) if unique else None
+    except (KeyError, ElementTree.ParseError) as error:
+        raise ValueError(f"Not an .xlsx workbook: {error}") from error
+    finally:
+        archive.close()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    if isinstance(source, str):
+        file_bytes = os.path.getsize(source)
+    else:
+        file_bytes = source.seek(0, os.SEEK_END)
+        source.seek(0)
+    return {
+        'file_bytes': file_bytes,
+        'sheets': sheets,
+        'shared_strings': shared_strings,
+        'unique_strings': unique_strings,
+        'shared_strings_bytes': shared_info.file_size if shared_info is not None else 0
+    }
+
+
+def cost_features(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """XML bytes, rows and columns of the sheet pandas reads (the first), rows estimated when undeclared"""
+    sheet = profile['sheets'][0] if profile['sheets'] else {'rows': None, 'columns': None, 'xml_bytes': 0}
+    xml_bytes = sheet['xml_bytes'] + profile['shared_strings_bytes']
+    declared = sheet['rows'] is not None
+    rows = sheet['rows'] if declared else max(sheet['xml_bytes'] // DEFAULT_XML_BYTES_PER_ROW, 1)
+    return {'xml_bytes': xml_bytes, 'rows': rows, 'columns': sheet['columns'], 'rows_declared': declared}
+
+
+class CostModel:
+    """Linear parse and validation time model, refitted from the runs recorded in path"""
+
+    def __init__(self, path: str = DEFAULT_COST_MODEL_PATH):
+        self.path = path
+        self.parse = (0.0, DEFAULT_PARSE_SECONDS_PER_BYTE)  # (intercept, seconds per XML byte)
+        self.validate = (0.0, DEFAULT_VALIDATE_SECONDS_PER_ROW)  # (intercept, seconds per row)
+        self.observations = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Refit when the recorded runs changed (other processes append to the same file)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+
+        lines = _tail_lines(self.path, MAX_OBSERVATIONS)
+        parse_points, validate_points = [], []
+        for line in lines:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a concurrent append
+            if run.get('parse_seconds') is not None:
+                parse_points.append((run['xml_bytes'], run['parse_seconds']))
+            if run.get('validate_seconds') is not None:
+                validate_points.append((run['rows'], run['validate_seconds']))
+        self.observations = len(lines)
+        self.parse = _fit(parse_points) or (0.0, DEFAULT_PARSE_SECONDS_PER_BYTE)
+        self.validate = _fit(validate_points) or (0.0, DEFAULT_VALIDATE_SECONDS_PER_ROW)
+
+    def estimate(self, profile: Dict[str, Any], memory_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Predicted seconds and bytes for parsing and validating the workbook, and its route"""
+        with self._lock:
+            self._refresh()
+            parse, validate = self.parse, self.validate
+        features = cost_features(profile)
+        parse_seconds = parse[0] + parse[1] * features['xml_bytes']
+        validate_seconds = validate[0] + validate[1] * features['rows']
+        parse_memory = estimate_parse_memory(profile['file_bytes'], features['rows'] if features['rows_declared'] else None,
+                                             features['columns'])
+        validate_memory = estimate_validation_memory(features['rows'], features['columns'])
+
+        seconds = parse_seconds + validate_seconds
+        memory = max(parse_memory, validate_memory)
+        if seconds > BATCH_SECONDS or (memory_budget and memory > memory_budget):
+            route = 'batch'
+        elif seconds <= INTERACTIVE_SECONDS and memory <= INTERACTIVE_BYTES:
+            route = 'interactive'
+        else:
+            route = 'queue'
+
+        return dict(features, parse_seconds=parse_seconds, validate_seconds=validate_seconds,
+                    parse_memory=parse_memory, validate_memory=validate_memory, route=route,
+                    calibrated_from=self.observations if self.observations >= MIN_OBSERVATIONS else 0)
+
+    def observe(self, profile: Dict[str, Any], parse_seconds: Optional[float] = None,
+                validate_seconds: Optional[float] = None):
+        """Record the measured times of one run for the next fit"""
+        run = dict(cost_features(profile), parse_seconds=parse_seconds, validate_seconds=validate_seconds,
+                   recorded_at=time.time())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(json.dumps(run) + '\n')
+                size = handle.tell()
+            if size > MAX_LOG_BYTES:
+                self._compact()
+        except OSError:
+            pass  # an estimate is never worth failing a run for
+
+    def _compact(self):
+        """Rewrite the run log with only the newest MAX_OBSERVATIONS runs, the most the fit reads
+
+        A run another process appends between the read and the rename is lost, which only
+        costs the fit one point.
+        """
+        lines = _tail_lines(self.path, MAX_OBSERVATIONS)
+        temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                handle.writelines(line + '\n' for line in lines)
+            os.replace(temporary, self.path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+def _tail_lines(path: str, count: int, block_bytes: int = 64 * 1024) -> List[str]:
+    """The last count lines of a text file, read backwards from its end one block at a time"""
+    with open(path, 'rb') as handle:
+        position = handle.seek(0, os.SEEK_END)
+        data = b''
+        while position > 0 and data.count(b'\n') <= count:
+            step = min(block_bytes, position)
+            position -= step
+            handle.seek(position)
+            data = handle.read(step) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0:
+        lines = lines[1:]  # starts partway through a line
+    return lines[-count:]
+
+
+def _fit(points: List[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """Least-squares (intercept, slope), or None with too few points or no positive slope"""
+    if len(points) < MIN_OBSERVATIONS:
+        return None
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if spread > 0:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+        intercept = mean_y - slope * mean_x
+        if slope > 0 and intercept >= 0:
+            return intercept, slope
+    # All runs the same size, or a fit through negative time: proportional model instead
+    total_x = sum(x for x, _ in points)
+    if total_x <= 0:
+        return None
+    return 0.0, sum(y for _, y in points) / total_x
+
+
+@lru_cache(maxsize=1)
+def load_cost_model() -> CostModel:
+    """The model recorded in QC_COST_MODEL_PATH, shared by everything in this process"""
+    return CostModel(os.environ.get('QC_COST_MODEL_PATH', DEFAULT_COST_MODEL_PATH))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-flight size and cost estimate of an .xlsx workbook')
+    parser.add_argument('workbook')
+    parser.add_argument('--model', default=os.environ.get('QC_COST_MODEL_PATH', DEFAULT_COST_MODEL_PATH),
+                        help='recorded run timings the model is fitted from')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    profile = inspect_workbook(args.workbook)
+    inspected = time.perf_counter()
+    estimate = CostModel(args.model).estimate(profile)
+    print(json.dumps({'profile': profile, 'estimate': estimate,
+                      'inspect_seconds': inspected - started}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
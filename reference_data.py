@@ -0,0 +1,179 @@
+"""Approved master lists of client banners and store addresses, indexed for bulk lookups.
+
+Each list is a CSV file with a header. The value column ('banner' or 'address', else
+the first column) holds a name, and rows sharing a master_id are aliases of one master
+record (without a master_id column every distinct name is its own record):
+
+    master_id,banner
+    WAG,Walgreens
+    WAG,Walgreens Pharmacy
+    WMT,Walmart
+
+    QC_BANNER_MASTER=/srv/qc/banners.csv
+    QC_ADDRESS_MASTER=/srv/qc/store_addresses.csv
+
+Names are reduced to keys (banners upper-cased without punctuation, addresses through
+canonical_address) and a cell resolves to a master record by, in order:
+
+    exact key           hash lookup
+    leading words       the longest run of leading words that is a key ("WALGREENS 1234")
+    truncated key       the cell is the start of keys of exactly one record ("WALGRE")
+
+Lookups take the distinct cell values of a column at once; the last step is a binary
+search over the sorted keys, so a million-entry list costs about 20 comparisons a value.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from addresses import canonical_address
+
+# Record number of keys shared by several records, and of values that do not resolve
+AMBIGUOUS = -2
+UNRESOLVED = -1
+
+# Shortest truncated value that may resolve by prefix ("WAL" could be Walmart or Walgreens)
+MIN_PREFIX_CHARS = 4
+
+# Periods and apostrophes vanish; any other punctuation separates words
+_DROPPED = re.compile(r"[.'’]")
+_SEPARATORS = re.compile(r'[^\w\s]|_')
+
+# Sorts after every character a key can contain
+_KEY_END = '\U0010ffff'
+
+
+def canonical_banner(text: str) -> str:
+    """Upper-cased, punctuation-free, whitespace-collapsed banner name"""
+    return ' '.join(_SEPARATORS.sub(' ', _DROPPED.sub('', text.upper())).split())
+
+
+class MasterIndex:
+    """Master records and their name keys, resolved by hash, leading words or unique prefix"""
+
+    def __init__(self, record_ids: Iterable[str], names: Iterable[str], normalize: Callable[[str], str],
+                 min_words: int = 1):
+        self.normalize = normalize
+        self.min_words = min_words
+
+        record_ids = [str(record_id) for record_id in record_ids]
+        names = [str(name) for name in names]
+        record_numbers, self.record_ids = pd.factorize(pd.Series(record_ids, dtype=object))
+
+        # Display name of each record: the first name listed for it
+        self.names = np.empty(len(self.record_ids), dtype=object)
+        for number, name in zip(record_numbers[::-1], names[::-1]):
+            self.names[number] = name
+
+        self._exact: Dict[str, int] = {}
+        for number, name in zip(record_numbers, names):
+            key = normalize(name)
+            if not key:
+                continue
+            known = self._exact.setdefault(key, int(number))
+            if known != number:
+                self._exact[key] = AMBIGUOUS
+
+        self._keys = np.array(sorted(self._exact), dtype=object)
+        self._records = np.fromiter((self._exact[key] for key in self._keys), dtype=np.int64, count=len(self._keys))
+
+    @classmethod
+    def from_csv(cls, path: str, value_column: str, normalize: Callable[[str], str], min_words: int = 1,
+                 id_column: str = 'master_id') -> 'MasterIndex':
+        table = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if table.empty:
+            raise ValueError(f"Master list {path} has no entries")
+        values = table[value_column] if value_column in table.columns else table.iloc[:, 0]
+        record_ids = table[id_column] if id_column in table.columns else values
+        return cls(record_ids.tolist(), values.tolist(), normalize, min_words)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def resolve(self, values: Iterable, normalized: bool = False) -> np.ndarray:
+        """Record number of each value, UNRESOLVED (-1) when it matches no single record
+
+        values are raw cells (None/NaN for missing) or, with normalized, keys already in
+        the index's normal form.
+        """
+        keys = [self._key(value, normalized) for value in values]
+        resolved = np.fromiter((self._exact.get(key, UNRESOLVED) if key else UNRESOLVED for key in keys),
+                               dtype=np.int64, count=len(keys))
+
+        # Leading words: "WALGREENS 1234" -> "WALGREENS", "123 MAIN ST STE 4" -> "123 MAIN ST"
+        for position in np.flatnonzero(resolved == UNRESOLVED):
+            words = keys[position].split()
+            for length in range(len(words) - 1, self.min_words - 1, -1):
+                record = self._exact.get(' '.join(words[:length]))
+                if record is not None:
+                    resolved[position] = record
+                    break
+
+        # Truncated cells: keys starting with the value, all of one record
+        pending = np.flatnonzero(resolved == UNRESOLVED)
+        pending = np.array([position for position in pending if len(keys[position]) >= MIN_PREFIX_CHARS], dtype=np.int64)
+        if len(pending) and len(self._keys):
+            prefixes = np.array([keys[position] for position in pending], dtype=object)
+            starts = np.searchsorted(self._keys, prefixes, side='left')
+            # Most values start no key at all; only search for the end of the run for those that do
+            found = np.fromiter((start < len(self._keys) and self._keys[start].startswith(prefix)
+                                 for start, prefix in zip(starts, prefixes)), dtype=bool, count=len(prefixes))
+            pending, prefixes, starts = pending[found], prefixes[found], starts[found]
+            ends = np.searchsorted(self._keys, np.array([prefix + _KEY_END for prefix in prefixes], dtype=object),
+                                   side='left')
+            for position, start, end in zip(pending, starts, ends):
+                if end > start:
+                    records = np.unique(self._records[start:end])
+                    if len(records) == 1:
+                        resolved[position] = records[0]
+
+        resolved[resolved == AMBIGUOUS] = UNRESOLVED
+        return resolved
+
+    def _key(self, value, normalized: bool) -> str:
+        if value is None or (isinstance(value, float) and value != value):
+            return ''
+        return str(value) if normalized else self.normalize(str(value))
+
+    def record_id(self, record: int) -> str:
+        return str(self.record_ids[record])
+
+    def name(self, record: int) -> str:
+        return str(self.names[record])
+
+
+class ReferenceData:
+    """The banner and store address master lists a DataValidator checks F/G and J/K against"""
+
+    def __init__(self, banners: Optional[MasterIndex] = None, addresses: Optional[MasterIndex] = None):
+        self.banners = banners
+        self.addresses = addresses
+
+    @classmethod
+    def from_files(cls, banner_path: Optional[str] = None, address_path: Optional[str] = None) -> 'ReferenceData':
+        banners = MasterIndex.from_csv(banner_path, 'banner', canonical_banner) if banner_path else None
+        # Keep the house number and street when dropping trailing words
+        addresses = MasterIndex.from_csv(address_path, 'address', canonical_address, min_words=2) if address_path else None
+        return cls(banners, addresses)
+
+    def summary(self) -> List[str]:
+        lines = []
+        if self.banners is not None:
+            lines.append(f"{len(self.banners.record_ids):,} master banners ({len(self.banners):,} names)")
+        if self.addresses is not None:
+            lines.append(f"{len(self.addresses.record_ids):,} master store addresses ({len(self.addresses):,} names)")
+        return lines
+
+
+@lru_cache(maxsize=1)
+def load_reference_data() -> Optional[ReferenceData]:
+    """Master lists named by QC_BANNER_MASTER / QC_ADDRESS_MASTER, loaded once per process"""
+    banner_path = os.environ.get('QC_BANNER_MASTER')
+    address_path = os.environ.get('QC_ADDRESS_MASTER')
+    if not banner_path and not address_path:
+        return None
+    return ReferenceData.from_files(banner_path, address_path)
@@ -0,0 +1,243 @@
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from array import array
+from typing import Dict, List, Any, Optional, Iterable, Iterator
+
+import numpy as np
+
+
+class RuleIssues:
+    """List-like issue store for one rule with a retention policy.
+
+    The exact count is always kept. The first max_in_memory issues stay in memory and
+    the rest are spilled in batches to a Parquet file (row number + JSON payload) that
+    iteration, slicing and exports read back transparently.
+    """
+
+    def __init__(self, rule: str, max_in_memory: int, spill_path: str, spill_batch_size: int = 10000):
+        self.rule = rule
+        self.max_in_memory = max_in_memory
+        self.spill_path = spill_path
+        self.spill_batch_size = spill_batch_size
+
+        self.issues: List[Dict[str, Any]] = []
+        self.spilled_count = 0
+        self._row_numbers = array('q')
+        self._pending: List[Dict[str, Any]] = []
+        self._writer = None
+        self._sealed = False
+
+    def append(self, issue: Dict[str, Any]):
+        self._row_numbers.extend(_issue_rows(issue))
+        if len(self.issues) < self.max_in_memory:
+            self.issues.append(issue)
+            return
+
+        self._pending.append(issue)
+        if len(self._pending) >= self.spill_batch_size:
+            self._flush()
+
+    def extend(self, issues):
+        for issue in issues:
+            self.append(issue)
+
+    def close(self):
+        """Flush pending spilled issues and close the spill file so it can be read"""
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._sealed = True
+
+    def __len__(self) -> int:
+        return len(self.issues) + self.spilled_count + len(self._pending)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        yield from self.issues
+        yield from self._iter_spilled(0)
+        yield from self._pending
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return list(self)[key]
+            return self.page(start, stop)
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('issue index out of range')
+        return self.page(key, key + 1)[0]
+
+    def page(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Issues [start, stop) in insertion order, reading only the spilled row groups needed"""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+
+        page = self.issues[start:stop]
+        if stop <= len(self.issues):
+            return page
+
+        spilled_start = max(start - len(self.issues), 0)
+        spilled_stop = min(stop - len(self.issues), self.spilled_count)
+        for index, issue in enumerate(self._iter_spilled(spilled_start), start=spilled_start):
+            if index >= spilled_stop:
+                break
+            page.append(issue)
+
+        pending_start = max(start - len(self.issues) - self.spilled_count, 0)
+        pending_stop = stop - len(self.issues) - self.spilled_count
+        if pending_stop > 0:
+            page.extend(self._pending[pending_start:pending_stop])
+        return page
+
+    def row_numbers(self) -> np.ndarray:
+        """Row numbers referenced by the issues (a row appears once per issue that names it)"""
+        return np.array(self._row_numbers, dtype=np.int64)
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            'row': pa.array([_issue_row(issue) for issue in self._pending], type=pa.int64()),
+            'issue': pa.array([json.dumps(issue, default=str) for issue in self._pending], type=pa.string())
+        })
+        if self._writer is None:
+            if self._sealed:
+                raise RuntimeError(f"Spill file for '{self.rule}' is already closed; issues cannot be appended after it was read")
+            self._writer = pq.ParquetWriter(self.spill_path, table.schema)
+        self._writer.write_table(table)
+
+        self.spilled_count += len(self._pending)
+        self._pending = []
+
+    def _iter_spilled(self, skip: int) -> Iterator[Dict[str, Any]]:
+        if not self.spilled_count:
+            return
+        if self._writer is not None:
+            self.close()
+
+        import pyarrow.parquet as pq
+
+        spill_file = pq.ParquetFile(self.spill_path)
+        for group in range(spill_file.num_row_groups):
+            group_rows = spill_file.metadata.row_group(group).num_rows
+            if skip >= group_rows:
+                skip -= group_rows
+                continue
+            payloads = spill_file.read_row_group(group, columns=['issue']).column('issue').to_pylist()
+            for payload in payloads[skip:]:
+                yield json.loads(payload)
+            skip = 0
+
+    def __getstate__(self):
+        self.close()
+        return self.__dict__.copy()
+
+
+class ValidationResults(dict):
+    """Mapping of check name -> issues, plus run-level warnings"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.warnings: List[str] = []
+        self.collector: Optional['ResultCollector'] = None
+        self.layout = None
+        # Set when the run stopped at its time budget; skipped_checks were not run
+        self.incomplete = False
+        self.skipped_checks: List[str] = []
+        # RollupCube of per-dimension issue counts, when the run built one
+        self.rollups = None
+
+    def issue_counts(self) -> Dict[str, int]:
+        return {rule: len(issues) for rule, issues in self.items()}
+
+    def order_by(self, rules: Iterable[str]):
+        """Put the checks in the order of rules (the run's validation options); others follow as they were"""
+        positions = {rule: position for position, rule in enumerate(rules)}
+        for rule in sorted(self, key=lambda rule: positions.get(rule, len(positions))):
+            self[rule] = self.pop(rule)
+
+    def flagged_rows(self) -> np.ndarray:
+        """Distinct row numbers that have at least one issue"""
+        row_arrays = [rule_row_numbers(issues) for issues in self.values()]
+        if not row_arrays:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(row_arrays))
+
+
+class ResultCollector:
+    """Retention policy for validation issues shared by all rules of one run"""
+
+    def __init__(self, max_issues_per_rule: int = 5000, spill_dir: Optional[str] = None,
+                 spill_batch_size: int = 10000):
+        self.max_issues_per_rule = max_issues_per_rule
+        self.spill_batch_size = spill_batch_size
+        self.spill_dir = tempfile.mkdtemp(prefix='qc-issues-', dir=spill_dir)
+        self.rules: Dict[str, RuleIssues] = {}
+
+        # Spill files live as long as the collector (and the results that reference it)
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    def issue_list(self, rule: str) -> RuleIssues:
+        issues = RuleIssues(rule, self.max_issues_per_rule,
+                            os.path.join(self.spill_dir, f"{rule}.parquet"), self.spill_batch_size)
+        self.rules[rule] = issues
+        return issues
+
+    def finish(self):
+        for issues in self.rules.values():
+            issues.close()
+
+    def cleanup(self):
+        self._cleanup()
+
+
+def rule_row_numbers(issues) -> np.ndarray:
+    """Row numbers referenced by one rule's issues, once per issue that names the row"""
+    if isinstance(issues, RuleIssues):
+        return issues.row_numbers()
+    try:
+        # Nearly every rule has exactly one int 'row' per issue
+        return np.fromiter((issue['row'] for issue in issues), dtype=np.int64, count=len(issues))
+    except (KeyError, TypeError, ValueError):
+        pass
+    return np.array([row for issue in issues for row in _issue_rows(issue)], dtype=np.int64)
+
+
+def layout_warning(rule: str, issue_count: int, data_rows: int, threshold: float = 0.9,
+                   min_rows: int = 50) -> Optional[str]:
+    """Warning text when a rule fails on so many rows that the column layout is probably wrong"""
+    if data_rows < min_rows or issue_count < threshold * data_rows:
+        return None
+    rate = min(issue_count / data_rows, 1.0)
+    return (f"{rule.replace('_', ' ').title()} failed on {rate:.0%} of data rows; "
+            f"the file's column layout may not match the expected template.")
+
+
+def _issue_row(issue: Any) -> int:
+    if isinstance(issue, dict) and isinstance(issue.get('row'), (int, np.integer)):
+        return int(issue['row'])
+    return -1
+
+
+def _issue_rows(issue: Any) -> List[int]:
+    """Every row number an issue refers to ('row' or the 'rows' list of multi-row issues)"""
+    if not isinstance(issue, dict):
+        return []
+    if 'rows' in issue:
+        return [int(row) for row in issue['rows']]
+    row = _issue_row(issue)
+    return [row] if row >= 0 else []
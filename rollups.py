@@ -0,0 +1,167 @@
+"""Rollup cubes: issue counts per rule and per value of the sheet's key dimensions.
+
+validate_data builds one RollupCube per run. It factorizes the dimension columns once
+and, as each check finishes, adds that rule's issue rows with a single bincount per
+dimension. Drill-downs, pivots and breakdown exports are then read from the small
+count arrays; the issue lists are never scanned again.
+
+For every dimension value the cube holds:
+    total rows        data rows with that value
+    issues per rule   issue hits (an issue naming several rows counts once per row)
+    rows per rule     distinct rows with at least one issue of the rule
+    flagged rows      distinct rows with an issue of any rule
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from layout import SheetLayout
+from results import rule_row_numbers
+
+# Dimension -> (layout field, display name)
+DIMENSIONS = {
+    'banner': ('client_banner', 'Banner (F)'),
+    'client_state': ('state_o', 'Client State (O)'),
+    'matched_state': ('state_p', 'Matched State (P)'),
+    'trade_code': ('trade_code', 'Trade Code (C)'),
+    'job': ('job_id', 'Job ID (AO)')
+}
+
+BLANK_LABEL = '(blank)'
+
+
+def _label(value: Any) -> str:
+    """Text a dimension value is grouped under; IDs read as 123.0 group with '123'"""
+    if value is None or (isinstance(value, float) and value != value):
+        return BLANK_LABEL
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = ' '.join(str(value).split())
+    return text or BLANK_LABEL
+
+
+class RollupCube:
+    """Per-dimension count arrays, filled rule by rule while a sheet is validated"""
+
+    def __init__(self, data_rows: int = 0):
+        self.data_rows = data_rows
+        self.labels: Dict[str, np.ndarray] = {}
+        self.totals: Dict[str, np.ndarray] = {}
+        self.issues: Dict[str, Dict[str, np.ndarray]] = {}
+        self.rows: Dict[str, Dict[str, np.ndarray]] = {}
+        self.flagged: Dict[str, np.ndarray] = {}
+        self.rules: List[str] = []
+        self.flagged_count = 0
+
+        # Row-level state, only kept until finish()
+        self._codes: Dict[str, np.ndarray] = {}
+        self._flagged_mask: Optional[np.ndarray] = None
+
+    @classmethod
+    def for_sheet(cls, df: pd.DataFrame, layout: SheetLayout) -> 'RollupCube':
+        """Empty cube over the dimensions this sheet has"""
+        cube = cls(max(len(df) - layout.data_start, 0))
+        for dimension, (field, _) in DIMENSIONS.items():
+            column = layout.full_column(df, field)
+            if column is None:
+                continue
+            raw_codes, uniques = pd.factorize(column, use_na_sentinel=True)
+            # Different raw values can share a label ('IL' / ' IL'); merge them
+            label_codes, labels = pd.factorize(pd.Series([_label(value) for value in uniques] + [BLANK_LABEL], dtype=object))
+            codes = label_codes[np.where(raw_codes >= 0, raw_codes, len(uniques))]
+            cube._codes[dimension] = codes
+            cube.labels[dimension] = np.asarray(labels, dtype=object)
+            cube.totals[dimension] = np.bincount(codes[layout.data_start:], minlength=len(labels))
+            cube.issues[dimension] = {}
+            cube.rows[dimension] = {}
+        cube._flagged_mask = np.zeros(len(df), dtype=bool)
+        return cube
+
+    @classmethod
+    def from_results(cls, df: pd.DataFrame, layout: SheetLayout, results) -> 'RollupCube':
+        """Cube for results that were produced elsewhere (shards, checkpoints)"""
+        cube = cls.for_sheet(df, layout)
+        for rule, issues in results.items():
+            cube.add_rule(rule, issues)
+        cube.finish()
+        return cube
+
+    def add_rule(self, rule: str, issues):
+        """Count one finished rule's issues into every dimension"""
+        positions = rule_row_numbers(issues) - 1
+        positions = positions[(positions >= 0) & (positions < len(self._flagged_mask))]
+        distinct = np.unique(positions)
+        self._flagged_mask[distinct] = True
+        if rule not in self.rules:
+            self.rules.append(rule)
+        for dimension, codes in self._codes.items():
+            size = len(self.labels[dimension])
+            self.issues[dimension][rule] = np.bincount(codes[positions], minlength=size)
+            self.rows[dimension][rule] = np.bincount(codes[distinct], minlength=size)
+
+    def finish(self):
+        """Compute the any-rule counts and drop the row-level state"""
+        if self._flagged_mask is None:
+            return
+        flagged = np.flatnonzero(self._flagged_mask)
+        self.flagged_count = len(flagged)
+        for dimension, codes in self._codes.items():
+            self.flagged[dimension] = np.bincount(codes[flagged], minlength=len(self.labels[dimension]))
+        self._codes = {}
+        self._flagged_mask = None
+
+    @property
+    def dimensions(self) -> List[str]:
+        return list(self.labels)
+
+    def rule_rows(self, rule: str) -> int:
+        """Distinct rows with at least one issue of rule (every row falls under one value of a dimension)"""
+        if rule not in self.rules or not self.rows:
+            return 0
+        return int(next(iter(self.rows.values()))[rule].sum())
+
+    def pivot(self, dimension: str, measure: str = 'issues') -> pd.DataFrame:
+        """One row per dimension value, one column per rule, plus flagged/total rows and the flagged rate
+
+        measure is 'issues' (issue hits) or 'rows' (distinct rows) for the rule columns.
+        """
+        counts = self.issues if measure == 'issues' else self.rows
+        table = pd.DataFrame({rule: counts[dimension][rule] for rule in self.rules},
+                             index=pd.Index(self.labels[dimension], name=DIMENSIONS[dimension][1]))
+        table['Rows With Issues'] = self.flagged.get(dimension, np.zeros(len(table), dtype=np.int64))
+        table['Total Rows'] = self.totals[dimension]
+        table['Issue Rate'] = (table['Rows With Issues'] / table['Total Rows'].where(table['Total Rows'] > 0)).fillna(0.0)
+        # Header-only values have no data rows and no issues
+        table = table[(table['Total Rows'] > 0) | (table['Rows With Issues'] > 0)]
+        return table.sort_values(['Rows With Issues', 'Total Rows'], ascending=False)
+
+    def drill_down(self, dimension: str, value: str) -> pd.DataFrame:
+        """Per-rule issue and distinct-row counts for one dimension value"""
+        matches = np.flatnonzero(self.labels[dimension] == value)
+        if not len(matches):
+            return pd.DataFrame(columns=['Check', 'Issues', 'Rows'])
+        code = matches[0]
+        return pd.DataFrame([{'Check': rule, 'Issues': int(self.issues[dimension][rule][code]),
+                              'Rows': int(self.rows[dimension][rule][code])} for rule in self.rules])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long format: dimension, value, rule, issues, rows, total_rows (rule '*' = any rule)"""
+        frames = []
+        for dimension, labels in self.labels.items():
+            for rule in self.rules + ['*']:
+                issues = self.issues[dimension][rule] if rule != '*' else self.flagged.get(dimension)
+                rows = self.rows[dimension][rule] if rule != '*' else self.flagged.get(dimension)
+                if issues is None:
+                    continue
+                frame = pd.DataFrame({'dimension': dimension, 'value': labels, 'rule': rule,
+                                      'issues': issues, 'rows': rows, 'total_rows': self.totals[dimension]})
+                frames.append(frame[frame['issues'] > 0])
+        if not frames:
+            return pd.DataFrame(columns=['dimension', 'value', 'rule', 'issues', 'rows', 'total_rows'])
+        return pd.concat(frames, ignore_index=True)
+
+    def __getstate__(self):
+        # Ship aggregates only
+        self.finish()
+        return self.__dict__.copy()
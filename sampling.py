@@ -0,0 +1,76 @@
+import math
+from statistics import NormalDist
+from typing import Tuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from admission import workbook_shape
+from layout import HEADER_SCAN_ROWS, detect_layout
+from xlsx_reader import read_xlsx_rows
+
+
+def stratified_positions(population: int, sample_size: int, strata: int = 20,
+                         seed: Optional[int] = None) -> np.ndarray:
+    """Sorted random positions in [0, population), drawn evenly from equal-sized blocks
+
+    Splitting the rows into contiguous strata spreads the sample over the whole sheet
+    instead of letting it cluster, so problems that only start halfway down still show up.
+    """
+    if sample_size >= population:
+        return np.arange(population)
+
+    rng = np.random.default_rng(seed)
+    strata = max(1, min(strata, sample_size))
+    bounds = np.linspace(0, population, strata + 1).astype(np.int64)
+    per_stratum = np.full(strata, sample_size // strata)
+    per_stratum[:sample_size % strata] += 1
+
+    picks = []
+    for (start, stop), count in zip(zip(bounds[:-1], bounds[1:]), per_stratum):
+        count = min(count, stop - start)
+        picks.append(start + rng.choice(stop - start, size=count, replace=False))
+    return np.sort(np.concatenate(picks))
+
+
+def wilson_interval(flagged: int, sampled: int, confidence: float = 0.95,
+                    population: Optional[int] = None) -> Tuple[float, float]:
+    """Wilson score interval for a proportion, narrowed by the finite population correction"""
+    if sampled == 0:
+        return 0.0, 1.0
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = flagged / sampled
+    denominator = 1 + z * z / sampled
+    center = (rate + z * z / (2 * sampled)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / sampled + z * z / (4 * sampled * sampled)) / denominator
+
+    if population and population > 1:
+        half_width *= math.sqrt(max(population - sampled, 0) / (population - 1))
+
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def read_excel_sample(source, sample_size: int = 2000, strata: int = 20, seed: Optional[int] = None,
+                      head_rows: int = HEADER_SCAN_ROWS) -> Tuple[pd.DataFrame, int]:
+    """Read the header block of the first sheet plus a stratified sample of its data rows
+
+    The top head_rows rows are read first only to find where the data starts; the sample
+    frame holds the rows above that point and then exactly min(sample_size, data rows)
+    rows drawn from all data rows, so every data row is equally likely to be sampled.
+    Only those rows are parsed: the others are passed over by a byte search for their
+    <row> tags, and the sheet's declared dimension gives the row count.
+    Returns (sample frame, number of data rows in the whole sheet).
+    """
+    sheet_rows, _ = workbook_shape(source)
+
+    # Sheet row 1 becomes the column names, so DataFrame position i is sheet row i + 2
+    frame_rows = max(sheet_rows - 1, 0)
+    head = read_xlsx_rows(source, range(2, min(head_rows, frame_rows) + 2))
+    data_start = min(detect_layout(head).data_start, frame_rows)
+    population = frame_rows - data_start
+
+    sampled = data_start + stratified_positions(population, sample_size, strata, seed)
+    positions = np.concatenate([np.arange(data_start), sampled])
+    sample = read_xlsx_rows(source, (positions + 2).tolist())
+    return sample, population
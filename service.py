@@ -0,0 +1,311 @@
+"""Local HTTP validation service.
+
+POST a workbook as the raw request body to /validate and get the QC results back:
+
+    curl --data-binary @file.xlsx "http://127.0.0.1:8600/validate?checks=banner_mismatches,trade_errors"
+
+Add format=arrow (or send Accept: application/vnd.apache.arrow.stream) to get the issues
+as an Arrow IPC stream instead of JSON. mode=estimate validates only a stratified sample
+of rows and returns estimated per-rule issue rates. GET /stats reports latency and queue depth,
+GET /metrics the same plus per-check latencies in Prometheus text format.
+"""
+import argparse
+import collections
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import tornado.ioloop
+import tornado.web
+from tornado.httpserver import HTTPServer
+
+import metrics
+from exporters import issue_chunks, issue_schema
+from worker_pool import PRIMARY_CHECKS, collect_metrics, create_pool, estimate_workbook, validate_workbook
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+
+
+class ServiceStats:
+    """In-process request counters, latency window and queue depth"""
+
+    def __init__(self, window: int = 1000):
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.in_flight = 0  # admitted requests, from before their upload until their validation returns
+        self.started_at = time.time()
+
+    def record(self, seconds: float, ok: bool = True):
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        self.latencies.append(seconds)
+
+    def snapshot(self, max_workers: int):
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'requests': self.requests,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'queue_depth': max(self.in_flight - max_workers, 0),
+            'workers': max_workers,
+            'latency_seconds': {
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': ordered[-1] if ordered else None
+            }
+        }
+
+
+class ServicePool:
+    """The process pool requests run on, replaced when a dead worker (the OOM killer, say) breaks it"""
+
+    def __init__(self, executor, max_workers: int):
+        self.executor = executor
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+    async def run(self, function, *args):
+        """function(*args) on the pool; a call that finds the pool broken is tried once more on a new one"""
+        loop = tornado.ioloop.IOLoop.current()
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return await loop.run_in_executor(executor, function, *args)
+            except BrokenProcessPool:
+                self.replace(executor)
+                if attempt:
+                    raise
+
+    def replace(self, broken):
+        with self._lock:
+            if self.executor is not broken:
+                return
+            self.executor = create_pool(self.max_workers)
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+@tornado.web.stream_request_body
+class ValidateHandler(tornado.web.RequestHandler):
+    """Streams the uploaded workbook to a temp file and validates it on the process pool"""
+
+    def initialize(self, pool, stats, max_workers, max_queue, max_body_size, spool_dir):
+        self.pool = pool
+        self.stats = stats
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_body_size = max_body_size
+        self.spool_dir = spool_dir
+        self.upload = None
+        self.reserved = False
+        self.running = False
+
+    def prepare(self):
+        if self.request.method != 'POST':
+            return
+
+        # Bad requests and a full queue are turned away before the body is uploaded
+        self.options = self._validation_options()
+        self.estimate = self.get_argument('mode', 'full') == 'estimate'
+        try:
+            self.sample_size = int(self.get_argument('sample_size', '2000'))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason='sample_size must be a whole number')
+
+        if self.stats.in_flight >= self.max_workers + self.max_queue:
+            self.stats.rejected += 1
+            raise tornado.web.HTTPError(503, reason='Validation queue is full')
+        # The slot is held from here, through the upload, until the validation returns
+        self.stats.in_flight += 1
+        self.reserved = True
+
+        self.request.connection.set_max_body_size(self.max_body_size)
+        self.upload = tempfile.NamedTemporaryFile(prefix='qc-upload-', suffix='.xlsx', dir=self.spool_dir, delete=False)
+
+    def data_received(self, chunk: bytes):
+        self.upload.write(chunk)
+
+    async def post(self):
+        self.upload.close()
+        started = time.perf_counter()
+        self.running = True
+        ok = False
+
+        try:
+            if self.estimate:
+                outcome = await self.pool.run(estimate_workbook, self.upload.name, self.options, self.sample_size)
+            else:
+                outcome = await self.pool.run(validate_workbook, self.upload.name, self.options)
+            collect_metrics(outcome)
+            ok = True
+        except BrokenProcessPool:
+            # The workers died twice in a row; nothing says the file is at fault
+            self.set_status(503)
+            self.write({'error': 'Validation workers crashed; try again later'})
+            return
+        except Exception as e:
+            self.set_status(422)
+            self.write({'error': f"Could not validate workbook: {e}"})
+            return
+        finally:
+            self.running = False
+            self._release()
+            self.stats.record(time.perf_counter() - started, ok)
+            self._remove_upload()
+
+        if self.estimate:
+            self.write(outcome)
+        elif self._wants_arrow():
+            await self._write_arrow(outcome)
+        else:
+            self._write_json(outcome)
+
+    def on_finish(self):
+        self._release()
+        self._remove_upload()
+
+    def on_connection_close(self):
+        # A validation already on the pool keeps its slot and its file until it returns
+        if self.running:
+            return
+        self._release()
+        self._remove_upload()
+
+    def _release(self):
+        if self.reserved:
+            self.reserved = False
+            self.stats.in_flight -= 1
+
+    def _validation_options(self):
+        requested = self.get_argument('checks', ','.join(PRIMARY_CHECKS))
+        checks = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in checks if name not in PRIMARY_CHECKS]
+        if unknown:
+            raise tornado.web.HTTPError(400, reason=f"Unknown checks: {', '.join(unknown)}")
+        return {name: True for name in checks}
+
+    def _wants_arrow(self) -> bool:
+        requested = self.get_argument('format', '')
+        if requested:
+            return requested == 'arrow'
+        return ARROW_MIME in self.request.headers.get('Accept', '')
+
+    def _write_json(self, outcome):
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps({
+            'rows': outcome['rows'],
+            'columns': outcome['columns'],
+            'timings': outcome['timings'],
+            'issue_counts': {rule: len(issues) for rule, issues in outcome['results'].items()},
+            'results': outcome['results']
+        }, default=str))
+
+    async def _write_arrow(self, outcome):
+        """Send the IPC stream a chunk of issues at a time; only one chunk's bytes are held at once"""
+        import pyarrow as pa
+
+        schema = issue_schema()
+        self.set_header('Content-Type', ARROW_MIME)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for chunk in issue_chunks(outcome['results']):
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                self.write(sink.getvalue())
+                sink.seek(0)
+                sink.truncate()
+                await self.flush()
+        # Schema (for an empty stream) and end-of-stream marker
+        self.write(sink.getvalue())
+
+    def _remove_upload(self):
+        if self.upload is None:
+            return
+        if not self.upload.closed:
+            self.upload.close()
+        try:
+            os.remove(self.upload.name)
+        except FileNotFoundError:
+            pass
+        self.upload = None
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, stats, max_workers):
+        self.stats = stats
+        self.max_workers = max_workers
+
+    def get(self):
+        self.write(self.stats.snapshot(self.max_workers))
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Prometheus scrape endpoint"""
+
+    def get(self):
+        self.set_header('Content-Type', metrics.CONTENT_TYPE)
+        self.write(metrics.render())
+
+
+def make_app(pool, max_workers: int, max_queue: int = 16, max_body_size: int = 512 * 1024 * 1024,
+             spool_dir: str = None) -> tornado.web.Application:
+    stats = ServiceStats()
+    pool = ServicePool(pool, max_workers)
+    metrics.QUEUE_DEPTH.set_function(lambda: max(stats.in_flight - max_workers, 0), queue='service')
+    metrics.IN_FLIGHT.set_function(lambda: min(stats.in_flight, max_workers), queue='service')
+    validate_args = dict(pool=pool, stats=stats, max_workers=max_workers, max_queue=max_queue,
+                         max_body_size=max_body_size, spool_dir=spool_dir)
+    return tornado.web.Application([
+        (r'/validate', ValidateHandler, validate_args),
+        (r'/stats', StatsHandler, dict(stats=stats, max_workers=max_workers)),
+        (r'/metrics', MetricsHandler)
+    ], worker_pool=pool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP service for the matching QC checks')
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--workers', type=int, default=None, help='validation worker processes')
+    parser.add_argument('--max-queue', type=int, default=16, help='requests allowed to wait for a worker')
+    parser.add_argument('--max-upload-mb', type=int, default=512)
+    parser.add_argument('--spool-dir', default=None, help='where uploads are streamed to (default: system temp)')
+    args = parser.parse_args()
+
+    max_workers = args.workers or max(1, (os.cpu_count() or 2) - 1)
+    executor = create_pool(max_workers)
+    # Outcomes arrive as pickled ValidationResults; import what unpickling them needs before the first request
+    importlib.import_module('rollups')
+    max_body_size = args.max_upload_mb * 1024 * 1024
+
+    app = make_app(executor, max_workers, args.max_queue, max_body_size, args.spool_dir)
+    server = HTTPServer(app, max_body_size=max_body_size)
+    server.listen(args.port, address=args.address)
+    print(f"QC validation service on http://{args.address}:{args.port} with {max_workers} workers")
+
+    try:
+        tornado.ioloop.IOLoop.current().start()
+    finally:
+        app.settings['worker_pool'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live at the repository root, next to main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_sheet(rows: int = 3000, seed: int = 0) -> pd.DataFrame:
+    """A matching sheet as read_excel returns it: three structural rows, then data rows with issues mixed in
+
+    Columns are at the positions the checks read: C trade, F/G banners, J/K addresses,
+    O/P states, AL Z code, AO/AP job and store IDs, and a ZIP column in AQ.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({f'Column{position}': [None] * rows for position in range(44)}, dtype=object)
+    for position, label in {2: 'Trade Class', 5: 'Client Banner', 6: 'Matched Banner', 9: 'Client Address',
+                            10: 'Matched Address', 14: 'Client State', 15: 'Match State', 37: 'Z Code',
+                            40: 'Job ID', 41: 'Client Store ID', 42: 'ZIP'}.items():
+        df.iat[1, position] = label
+
+    banners = ['WALGREENS', 'WALMART', 'TARGET', 'Kroger', 'CVS Pharmacy']
+    addresses = ['123 Main Street', '456 North Oak Ave', 'PO Box 12', '789 Elm St.', '12 South Rd']
+    states = ['NY', 'CA', 'TX', 'Ontario', 'Florida', 'ZZ', 'nj']
+    data = rows - 3
+    df.iloc[3:, 2] = rng.choice(np.array(['05', '03', '07', '09', None], dtype=object), data)
+    df.iloc[3:, 5] = rng.choice(banners, data)
+    df.iloc[3:, 6] = rng.choice(np.array(banners + [None], dtype=object), data)
+    df.iloc[3:, 9] = rng.choice(addresses, data)
+    df.iloc[3:, 10] = rng.choice(np.array(addresses + [None], dtype=object), data)
+    df.iloc[3:, 14] = rng.choice(states, data)
+    df.iloc[3:, 15] = rng.choice(states, data)
+    df.iloc[3:, 37] = rng.choice(['777750Z', '777796Z', '12345Z'], data)
+    df.iloc[3:, 40] = [f'J{row % 500}' for row in range(data)]
+    df.iloc[3:, 41] = [f'S{row % 700}' for row in range(data)]
+    df.iloc[3:, 42] = rng.choice(np.array(['10001', '90210', '7510', 'ABCDE', '94105-1234', None], dtype=object), data)
+    return df
+
+
+@pytest.fixture(scope='session')
+def sheet() -> pd.DataFrame:
+    return make_sheet()
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from checkpoint import validate_with_checkpoints
+from validators import DataValidator
+from worker_pool import PRIMARY_CHECKS
+
+OPTIONS = {**{check: True for check in PRIMARY_CHECKS}, 'invalid_zip_codes': True, 'zip_state_mismatches': True,
+           'duplicate_addresses': True}
+
+
+class WorkerDied(Exception):
+    pass
+
+
+def counting(validator, fail_on_call=None):
+    """Count the validator's validate_data calls (one per chunk, one for the whole-sheet checks)"""
+    calls = []
+    real = validator.validate_data
+
+    def validate_data(*args, **kwargs):
+        calls.append(len(args[0]))
+        if len(calls) == fail_on_call:
+            raise WorkerDied()
+        return real(*args, **kwargs)
+
+    validator.validate_data = validate_data
+    return calls
+
+
+def as_json(results):
+    return {rule: json.dumps(list(issues), default=str) for rule, issues in results.items()}
+
+
+def test_resumed_run_equals_an_uninterrupted_one(sheet, tmp_path):
+    mapping = {'zip': sheet.columns[42], 'address': sheet.columns[9]}
+    expected = DataValidator().validate_data(sheet, mapping, OPTIONS)
+
+    crashing = DataValidator()
+    counting(crashing, fail_on_call=3)
+    with pytest.raises(WorkerDied):
+        validate_with_checkpoints(crashing, sheet, mapping, OPTIONS, 'sheet-hash', str(tmp_path), chunk_rows=1000)
+
+    resumed = DataValidator()
+    calls = counting(resumed)
+    results = validate_with_checkpoints(resumed, sheet, mapping, OPTIONS, 'sheet-hash', str(tmp_path), chunk_rows=1000)
+
+    # Two of the three chunks were saved: only the last chunk (the 997 data rows left after the
+    # three structural rows and two full chunks) and the whole-sheet pass run again
+    assert calls == [len(sheet) - 3 - 2 * 1000, len(sheet)]
+    assert list(results) == list(expected)
+    assert as_json(results) == as_json(expected)
+    assert results.warnings == expected.warnings
+    assert os.listdir(tmp_path) == []
+
+
+def test_checkpoint_is_not_reused_for_other_options(sheet, tmp_path):
+    mapping = {'zip': sheet.columns[42]}
+    options = {check: True for check in PRIMARY_CHECKS}
+    crashing = DataValidator()
+    counting(crashing, fail_on_call=2)
+    with pytest.raises(WorkerDied):
+        validate_with_checkpoints(crashing, sheet, mapping, options, 'sheet-hash', str(tmp_path), chunk_rows=1000)
+
+    fewer = dict(options, trade_errors=False)
+    validator = DataValidator()
+    calls = counting(validator)
+    results = validate_with_checkpoints(validator, sheet, mapping, fewer, 'sheet-hash', str(tmp_path), chunk_rows=1000)
+
+    assert len(calls) == 3
+    assert as_json(results) == as_json(DataValidator().validate_data(sheet, mapping, fewer))
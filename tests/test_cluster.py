@@ -0,0 +1,85 @@
+import json
+import socketserver
+import threading
+
+import pytest
+
+from cluster import Coordinator, WorkerLost, read_frame, start_worker
+from validators import DataValidator
+from worker_pool import PRIMARY_CHECKS
+
+OPTIONS = {**{check: True for check in PRIMARY_CHECKS}, 'invalid_zip_codes': True}
+
+
+class DroppingWorker(socketserver.ThreadingTCPServer):
+    """Reads one shard per connection and hangs up without answering, like a worker that crashed"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.shards_dropped = 0
+        super().__init__(('127.0.0.1', 0), _DropShard)
+
+
+class _DropShard(socketserver.StreamRequestHandler):
+    def handle(self):
+        read_frame(self.rfile)
+        self.server.shards_dropped += 1
+
+
+@pytest.fixture
+def dropping_worker():
+    server = DroppingWorker()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def worker():
+    server = start_worker()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def as_json(results):
+    return {rule: json.dumps(list(issues), default=str) for rule, issues in results.items()}
+
+
+def test_sharded_run_equals_a_local_run(sheet, worker):
+    mapping = {'zip': sheet.columns[42]}
+    results = Coordinator([worker.server_address], shard_rows=700).validate(sheet, OPTIONS, mapping)
+
+    assert as_json(results) == as_json(DataValidator().validate_data(sheet, mapping, OPTIONS))
+
+
+def test_shard_of_a_lost_worker_is_retried_on_another(sheet, worker, dropping_worker):
+    mapping = {'zip': sheet.columns[42]}
+    coordinator = Coordinator([dropping_worker.server_address, worker.server_address], shard_rows=300)
+    results = coordinator.validate(sheet, OPTIONS, mapping)
+
+    assert dropping_worker.shards_dropped == 1
+    assert as_json(results) == as_json(DataValidator().validate_data(sheet, mapping, OPTIONS))
+
+
+def test_run_fails_once_no_worker_is_left(sheet, dropping_worker):
+    coordinator = Coordinator([dropping_worker.server_address], shard_rows=1000)
+    with pytest.raises(WorkerLost, match='No workers left'):
+        coordinator.validate(sheet, OPTIONS, {'zip': sheet.columns[42]})
+
+
+def test_shard_gives_up_after_max_attempts(sheet):
+    servers = [DroppingWorker() for _ in range(3)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        coordinator = Coordinator([server.server_address for server in servers], shard_rows=5000, max_attempts=2)
+        with pytest.raises(WorkerLost, match='failed on 2 workers'):
+            coordinator.validate(sheet, OPTIONS)
+        assert sum(server.shards_dropped for server in servers) == 2
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,97 @@
+import zipfile
+
+import pandas as pd
+import pytest
+
+import xlsx_reader
+from xlsx_reader import edge_case_workbook, read_xlsx, read_xlsx_rows
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>'''
+_PACKAGE_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>'''
+
+
+def inline_string_workbook(path: str, rows: int = 50):
+    """A workbook without a shared string table: every text cell is an inline string (<is>)"""
+    def text(ref, value):
+        return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{value}</t></is></c>'
+
+    body = ['<row r="1">' + text('A1', 'name') + text('B1', 'count') + text('C1', 'flag') + text('D1', 'note') + '</row>']
+    for row in range(2, rows + 2):
+        cells = [text(f'A{row}', f'Store &amp; Co {row}'), f'<c r="B{row}"><v>{row * 1.5}</v></c>',
+                 f'<c r="C{row}" t="b"><v>{row % 2}</v></c>']
+        if row % 3:
+            cells.append(text(f'D{row}', f' padded {row} ' if row % 2 else '&lt;b&gt;markup&lt;/b&gt;'))
+        body.append(f'<row r="{row}">' + ''.join(cells) + '</row>')
+    sheet = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             f'<dimension ref="A1:D{rows + 1}"/><sheetData>' + ''.join(body) + '</sheetData></worksheet>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _PACKAGE_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/worksheets/sheet1.xml', sheet)
+
+
+@pytest.fixture(scope='module')
+def edge_cases(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('workbooks') / 'edge_cases.xlsx')
+    edge_case_workbook(path)
+    return path
+
+
+def test_edge_cases_read_as_read_excel_reads_them(edge_cases):
+    # Dates, bools with and without blanks, blank rows, NA text, numeric text and error cells
+    pd.testing.assert_frame_equal(read_xlsx(edge_cases, workers=1), pd.read_excel(edge_cases))
+
+
+def test_segments_parsed_in_worker_processes_merge_to_the_same_frame(edge_cases, monkeypatch):
+    pooled = []
+
+    def parse_in_pool(tasks, context, workers):
+        tasks = list(tasks)
+        pooled.append(len(tasks))
+        return original(tasks, context, workers)
+
+    original = xlsx_reader._parse_in_pool
+    monkeypatch.setattr(xlsx_reader, 'MIN_PARALLEL_BYTES', 0)
+    monkeypatch.setattr(xlsx_reader, '_parse_in_pool', parse_in_pool)
+
+    pd.testing.assert_frame_equal(read_xlsx(edge_cases, workers=2), pd.read_excel(edge_cases))
+    assert pooled and pooled[0] > 1
+
+
+def test_inline_strings(tmp_path):
+    path = str(tmp_path / 'inline.xlsx')
+    inline_string_workbook(path)
+    frame = read_xlsx(path, workers=1)
+
+    pd.testing.assert_frame_equal(frame, pd.read_excel(path))
+    assert frame.loc[0, 'name'] == 'Store & Co 2'
+    assert frame['note'].isna().sum() == 17
+
+
+def test_selected_rows_match_read_excel_with_skiprows(edge_cases):
+    # 135 is the blank row, 401 the last one
+    rows = [2, 3, 50, 134, 135, 136, 300, 401]
+    wanted = set(rows)
+    expected = pd.read_excel(edge_cases, skiprows=lambda index: index != 0 and index + 1 not in wanted)
+
+    pd.testing.assert_frame_equal(read_xlsx_rows(edge_cases, rows), expected)
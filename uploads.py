@@ -0,0 +1,150 @@
+"""Disk-spooled uploads and DataFrames shared between sessions.
+
+An uploaded workbook is copied in chunks into a spool file named after its SHA-256,
+parsed through a read-only memory map (the page cache holds the bytes, not the Python
+heap), and the parsed DataFrame is kept once per content hash for as long as some
+session has it loaded. Every session that uploads the same file gets a reference to
+the same DataFrame instead of its own copy, so the DataFrame must be treated as
+read-only.
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, BinaryIO, Optional, Tuple
+
+DEFAULT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'qc_uploads')
+
+# Upload bytes copied per read
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Spool files unused for this long are removed
+SPOOL_MAX_AGE_SECONDS = 6 * 3600
+
+
+class MappedFile(io.RawIOBase):
+    """Read-only, seekable file object over a memory map of a file on disk"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.name = path
+        with open(path, 'rb') as handle:
+            size = os.fstat(handle.fileno()).st_size
+            # mmap cannot map an empty file
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        if self._map is None or self._position >= self._size:
+            return 0
+        count = min(len(buffer), self._size - self._position)
+        buffer[:count] = self._map[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def read(self, size: int = -1) -> bytes:
+        if self._map is None or self._position >= self._size:
+            return b''
+        end = self._size if size is None or size < 0 else min(self._size, self._position + size)
+        data = self._map[self._position:end]
+        self._position = end
+        return data
+
+    def close(self):
+        if self._map is not None and not self.closed:
+            self._map.close()
+        super().close()
+
+
+def spool_upload(upload: BinaryIO, spool_dir: str = DEFAULT_SPOOL_DIR, suffix: str = '') -> Tuple[str, str]:
+    """Copy an upload to a spool file named by its content hash; returns (file_hash, path)
+
+    The upload is read in COPY_CHUNK_BYTES pieces, so no second full copy is made in
+    memory. Uploading the same bytes again reuses the existing spool file.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    prune_spool(spool_dir)
+
+    digest = hashlib.sha256()
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(dir=spool_dir, suffix='.partial', delete=False) as partial:
+        while True:
+            chunk = upload.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            partial.write(chunk)
+    upload.seek(0)
+
+    file_hash = digest.hexdigest()
+    path = os.path.join(spool_dir, file_hash + suffix)
+    if os.path.exists(path):
+        os.remove(partial.name)
+        os.utime(path)
+    else:
+        os.replace(partial.name, path)
+    return file_hash, path
+
+
+def prune_spool(spool_dir: str = DEFAULT_SPOOL_DIR, max_age: float = SPOOL_MAX_AGE_SECONDS):
+    """Remove spool files (and abandoned partial copies) not used within max_age seconds"""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(spool_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            continue  # in use on Windows, or removed by another session
+
+
+class SharedFrames:
+    """Parsed DataFrames by content hash, held only through the sessions that use them
+
+    Entries are weak references: once no session has a workbook loaded any more, its
+    DataFrame is freed and drops out of here, so the cache never keeps memory alive
+    that the sessions (and the job memory budget) do not already account for.
+    """
+
+    def __init__(self):
+        self._frames: 'weakref.WeakValueDictionary[str, Any]' = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, file_hash: str) -> Optional[Any]:
+        with self._lock:
+            return self._frames.get(file_hash)
+
+    def put(self, file_hash: str, frame: Any) -> Any:
+        """Store frame unless another session got there first; returns the shared frame"""
+        with self._lock:
+            return self._frames.setdefault(file_hash, frame)
+
+    def __len__(self) -> int:
+        return len(self._frames)
@@ -1,16 +1,63 @@
-import pandas as pd
-import io
+import tempfile
+import json
 
 def format_validation_results(results):
-    # Dummy summary as DataFrame
+    # Dummy summary as DataFrame (pandas imported here so headless exporters stay light)
+    import pandas as pd
     summary = []
+    rollups = getattr(results, 'rollups', None)
     for check, issues in results.items():
-        summary.append({'Check': check, 'Issues Found': len(issues)})
+        row = {'Check': check, 'Issues Found': len(issues)}
+        if rollups is not None and rollups.dimensions:
+            row['Rows Affected'] = rollups.rule_rows(check)
+        summary.append(row)
     return pd.DataFrame(summary)
 
-def export_report(df, results):
-    # Dummy Excel export: just returns the original dataframe as Excel bytes
-    output = io.BytesIO()
+def format_issue_estimate(estimate):
+    # Per-rule estimated issue rates from DataValidator.estimate_issue_rates
+    import pandas as pd
+    level = f"{estimate['confidence']:.0%}"
+    summary = []
+    for check, stats in estimate['rules'].items():
+        summary.append({
+            'Check': check,
+            'Flagged in Sample': stats['flagged_rows'],
+            'Estimated Rate': f"{stats['rate']:.1%}",
+            f'{level} Interval': f"{stats['rate_low']:.1%} – {stats['rate_high']:.1%}",
+            'Estimated Rows': stats['estimated_rows']
+        })
+    return pd.DataFrame(summary)
+
+def export_report(df, results, output=None):
+    # Dummy Excel export: writes the original dataframe as Excel to output (a disk-backed temp file by default)
+    if output is None:
+        output = tempfile.TemporaryFile()
     df.to_excel(output, index=False)
     output.seek(0)
     return output
+
+# Fields every issue row carries in flat exports; anything else goes into 'details'
+ISSUE_FIELDS = ['rule', 'row', 'reason', 'job_id', 'client_store_id']
+
+def flatten_issues(results):
+    """Yield one flat record per issue across all rules"""
+    for rule, issues in results.items():
+        for issue in issues:
+            if not isinstance(issue, dict):
+                yield {'rule': rule, 'row': None, 'reason': str(issue), 'job_id': '', 'client_store_id': '', 'details': ''}
+                continue
+            row = issue.get('row')
+            if row is None and issue.get('rows'):
+                row = issue['rows'][0]
+            reason = issue.get('reason')
+            if reason is None:
+                reason = '; '.join(issue.get('issues', issue.get('missing_components', [])))
+            details = {k: v for k, v in issue.items() if k not in ISSUE_FIELDS}
+            yield {
+                'rule': rule,
+                'row': row,
+                'reason': reason,
+                'job_id': issue.get('job_id', ''),
+                'client_store_id': issue.get('client_store_id', ''),
+                'details': json.dumps(details, default=str) if details else ''
+            }
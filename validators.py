@@ -1,193 +1,397 @@
 import pandas as pd
 import re
+import time
 import numpy as np
-from typing import Dict, List, Any, Optional
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from zip_index import get_zip_index
+from results import ResultCollector, ValidationResults, layout_warning
+from cross_batch_index import CrossBatchIndex, FINGERPRINT_COLUMNS
+from layout import SheetLayout, detect_layout
+from addresses import NormalizedColumn, factorize_cells
+from reference_data import UNRESOLVED, MasterIndex, ReferenceData
+from cancellation import CancellationToken, DeadlineExceeded
+from rollups import RollupCube
+from sampling import stratified_positions, wilson_interval
+from metrics import (CACHE_HITS, CACHE_LOOKUPS, CHECK_SECONDS, ISSUES, ROWS_PER_SECOND, ROWS_VALIDATED,
+                     VALIDATION_SECONDS, VALIDATIONS)
+
+# Distinct values evaluated between two cancellation/deadline checks
+POLL_EVERY = 4096
+
+# 5 digits or 5+4 format, ignoring any characters other than digits and hyphens
+_ZIP_NOISE = r'[^\d-]*'
+ZIP_FORMAT_PATTERN = re.compile(_ZIP_NOISE + (r'\d' + _ZIP_NOISE) * 5 + '(?:-' + _ZIP_NOISE + (r'\d' + _ZIP_NOISE) * 4 + ')?')
+
+# Lookup tables shared by every DataValidator, built once at import and read-only
+
+# Banned address patterns (common examples)
+BANNED_ADDRESS_PATTERNS = (
+    r'(?i)\b(p\.?o\.?\s*box|post\s*office\s*box)\b',  # PO Box variations
+    r'(?i)\b(general\s*delivery)\b',
+    r'(?i)\b(mail\s*drop)\b',
+    r'(?i)\b(private\s*mail\s*box|pmb)\b',
+    r'(?i)\b(do\s*not\s*mail|dnm)\b',
+    r'(?i)\b(deceased|vacant|abandoned)\b',
+    r'(?i)\b(return\s*to\s*sender|rts)\b'
+)
+_BANNED_REGEXES = tuple((pattern, re.compile(pattern)) for pattern in BANNED_ADDRESS_PATTERNS)
+
+# US states and territories
+US_STATES = frozenset({
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
+    'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
+    'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
+    'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
+    'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+    'DC', 'AS', 'GU', 'MP', 'PR', 'VI'  # Territories
+})
+
+# Full state names to abbreviations mapping
+STATE_NAME_TO_ABBR = MappingProxyType({
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR',
+    'california': 'CA', 'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
+    'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS',
+    'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD',
+    'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN', 'mississippi': 'MS',
+    'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY',
+    'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK',
+    'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC',
+    'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT',
+    'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
+    'wisconsin': 'WI', 'wyoming': 'WY', 'district of columbia': 'DC'
+})
+
+# Abbreviation or upper-cased full name -> abbreviation
+STATE_LOOKUP = MappingProxyType({**{abbr: abbr for abbr in US_STATES},
+                                 **{name.upper(): abbr for name, abbr in STATE_NAME_TO_ABBR.items()}})
+
+# Lower-cased abbreviations and names a near-miss state value is compared against
+_STATE_CANDIDATES = tuple(sorted(abbr.lower() for abbr in US_STATES)) + tuple(STATE_NAME_TO_ABBR)
+
 
 class DataValidator:
     """Data validation class for Excel file inspection"""
     
-    def __init__(self):
-        # Define banned address patterns (common examples)
-        self.banned_address_patterns = [
-            r'(?i)\b(p\.?o\.?\s*box|post\s*office\s*box)\b',  # PO Box variations
-            r'(?i)\b(general\s*delivery)\b',
-            r'(?i)\b(mail\s*drop)\b',
-            r'(?i)\b(private\s*mail\s*box|pmb)\b',
-            r'(?i)\b(do\s*not\s*mail|dnm)\b',
-            r'(?i)\b(deceased|vacant|abandoned)\b',
-            r'(?i)\b(return\s*to\s*sender|rts)\b'
-        ]
-        
-        # US states and territories
-        self.us_states = {
-            'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-            'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-            'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-            'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-            'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
-            'DC', 'AS', 'GU', 'MP', 'PR', 'VI'  # Territories
-        }
+    def __init__(self, cross_batch_index: Optional[CrossBatchIndex] = None,
+                 reference_data: Optional[ReferenceData] = None):
+        # Persistent index of IDs from earlier files (cross-batch check is skipped without it)
+        self.cross_batch_index = cross_batch_index
         
-        # Full state names to abbreviations mapping
-        self.state_name_to_abbr = {
-            'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR',
-            'california': 'CA', 'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE',
-            'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
-            'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS',
-            'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD',
-            'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN', 'mississippi': 'MS',
-            'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
-            'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY',
-            'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK',
-            'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC',
-            'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT',
-            'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
-            'wisconsin': 'WI', 'wyoming': 'WY', 'district of columbia': 'DC'
-        }
+        # Approved banner / store address master lists (only the LEFT-4 comparisons without them)
+        self.reference_data = reference_data
+        
+        # Shared read-only tables, also reachable from the instance
+        self.banned_address_patterns = BANNED_ADDRESS_PATTERNS
+        self._banned_regexes = _BANNED_REGEXES
+        self.us_states = US_STATES
+        self.state_name_to_abbr = STATE_NAME_TO_ABBR
+        
+        # Retention policy for the run in progress (None keeps every issue in plain lists)
+        self._collector: Optional[ResultCollector] = None
+        
+        # Layout of the sheet being validated, detected once per validate_data call
+        self._layout: Optional[SheetLayout] = None
+        
+        # Address-like columns normalized during the current validate_data call, by column position
+        self._normalized: Optional[Dict[int, NormalizedColumn]] = None
+        
+        # Stop signals of the current validate_data call
+        self._cancel_token: Optional[CancellationToken] = None
+        self._deadline: Optional[float] = None
     
     def validate_data(self, df: pd.DataFrame, column_mapping: Dict[str, str], 
-                     validation_options: Dict[str, bool]) -> Dict[str, List]:
-        """Main validation method that runs all selected checks"""
+                     validation_options: Dict[str, bool],
+                     progress_callback: Optional[Callable[[float, str, Optional[str]], None]] = None,
+                     collector: Optional[ResultCollector] = None,
+                     file_hash: Optional[str] = None, file_name: str = '',
+                     layout: Optional[SheetLayout] = None,
+                     cancel_token: Optional[CancellationToken] = None,
+                     time_budget: Optional[float] = None, rollups: bool = True) -> Dict[str, List]:
+        """Main validation method that runs all selected checks
+        
+        progress_callback, if given, is called as progress_callback(fraction, check_name, warning)
+        after each check finishes so background jobs can report progress; warning is set when
+        the check failed on so many rows that the column layout is probably wrong.
+        collector, if given, applies its retention policy to the issues of every check.
+        file_hash identifies the uploaded file; with a cross-batch index configured the file's
+        IDs are checked against earlier files and then recorded in the index.
+        layout, if given, is used instead of detecting the sheet layout from its header text.
+        cancel_token and time_budget (seconds) are checked between checks and while evaluating
+        distinct values: a cancelled run raises ValidationCancelled, a run out of time returns
+        the checks finished so far with results.incomplete set and the rest in skipped_checks.
+        With rollups, results.rollups is a RollupCube of issue counts per rule and per banner,
+        state, trade code and job, filled in as each check finishes.
+        """
+        
+        if layout is None:
+            layout = detect_layout(df)
+        
+        results = ValidationResults()
+        results.collector = collector
+        results.layout = layout
+        results.warnings.extend(layout.notes)
+        if rollups:
+            results.rollups = RollupCube.for_sheet(df, layout)
+        total_checks = max(sum(1 for enabled in validation_options.values() if enabled), 1)
+        data_rows = max(len(df) - layout.data_start, 0)
+        
+        started = time.perf_counter()
+        check_started = [started]
+        
+        def report(check_name: str):
+            # Time since the previous check finished is this check's latency
+            now = time.perf_counter()
+            CHECK_SECONDS.observe(now - check_started[0], check=check_name)
+            ISSUES.inc(len(results[check_name]), rule=check_name)
+            if results.rollups is not None:
+                results.rollups.add_rule(check_name, results[check_name])
+            check_started[0] = time.perf_counter()
+            
+            warning = layout_warning(check_name, len(results[check_name]), data_rows)
+            if warning:
+                results.warnings.append(warning)
+            if progress_callback is not None:
+                progress_callback(min(len(results) / total_checks, 1.0), check_name, warning)
+            self._poll()
+        
+        self._collector = collector
+        self._layout = layout
+        self._normalized = {}
+        self._cancel_token = cancel_token
+        self._deadline = time.monotonic() + time_budget if time_budget is not None else None
+        try:
+            try:
+                self._poll()
+                self._run_checks(df, column_mapping, validation_options, results, report)
+                
+                # Cross-batch repeats need the file identity and update the index afterwards
+                if self.cross_batch_index is not None and file_hash:
+                    if validation_options.get('cross_batch_repeats', False):
+                        results['cross_batch_repeats'] = self.check_cross_batch_repeats(df, file_hash)
+                        report('cross_batch_repeats')
+                    self.cross_batch_index.record_file(df, file_hash, file_name, layout.data_start,
+                                                       self._cross_batch_columns(layout))
+            except DeadlineExceeded:
+                results.incomplete = True
+                results.skipped_checks = [check for check, enabled in validation_options.items()
+                                          if enabled and check not in results]
+                results.warnings.append(f"Incomplete: stopped at the {time_budget:g}s time budget before running "
+                                        f"{', '.join(check.replace('_', ' ') for check in results.skipped_checks)}.")
+            
+            results.order_by(validation_options)
+            if results.rollups is not None:
+                results.rollups.finish()
+            
+            if not results.incomplete:
+                elapsed = time.perf_counter() - started
+                VALIDATIONS.inc()
+                VALIDATION_SECONDS.observe(elapsed)
+                ROWS_VALIDATED.inc(data_rows)
+                if elapsed > 0:
+                    ROWS_PER_SECOND.set(data_rows / elapsed)
+        finally:
+            self._collector = None
+            self._layout = None
+            self._normalized = None
+            self._cancel_token = None
+            self._deadline = None
+            if collector is not None:
+                collector.finish()
         
-        results = {}
+        return results
+    
+    def estimate_issue_rates(self, df: pd.DataFrame, column_mapping: Dict[str, str],
+                             validation_options: Dict[str, bool], sample_size: int = 2000, strata: int = 20,
+                             confidence: float = 0.95, seed: Optional[int] = None,
+                             population_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Quick mode: validate a stratified random sample of data rows and estimate per-rule issue rates
+        
+        By default the sample is drawn from df. When df is already a sample (for example from
+        sampling.read_excel_sample), pass population_rows and every data row in df is used.
+        Rules that compare rows with each other or with earlier files are not estimated.
+        """
+        layout = detect_layout(df)
+        data_rows = max(len(df) - layout.data_start, 0)
+        
+        if population_rows is None:
+            population_rows = data_rows
+            positions = stratified_positions(data_rows, sample_size, strata, seed) + layout.data_start
+            df = pd.concat([df.iloc[:layout.data_start], df.iloc[positions]], ignore_index=True)
+        
+        sampled_rows = max(len(df) - layout.data_start, 0)
+        options = {name: enabled for name, enabled in validation_options.items()
+                   if name not in ('duplicate_addresses', 'cross_batch_repeats')}
+        results = self.validate_data(df, column_mapping, options, layout=layout)
+        
+        rules = {}
+        for rule, issues in results.items():
+            # Distinct sampled data rows with at least one issue (rows are 1-based positions + 1)
+            flagged_rows = ValidationResults({rule: issues}).flagged_rows()
+            flagged = int(np.count_nonzero(flagged_rows > layout.data_start))
+            rate = flagged / sampled_rows if sampled_rows else 0.0
+            low, high = wilson_interval(flagged, sampled_rows, confidence, population_rows)
+            rules[rule] = {
+                'flagged_rows': flagged,
+                'rate': rate,
+                'rate_low': low,
+                'rate_high': high,
+                'estimated_rows': int(round(rate * population_rows))
+            }
+        
+        return {
+            'population_rows': population_rows,
+            'sampled_rows': sampled_rows,
+            'confidence': confidence,
+            'warnings': list(results.warnings),
+            'rules': rules
+        }
+    
+    def _run_checks(self, df: pd.DataFrame, column_mapping: Dict[str, str], validation_options: Dict[str, bool],
+                    results: ValidationResults, report: Callable[[str], None]):
+        """Run the selected checks in order, storing each check's issues in results"""
         
         # Banner validation using F and G columns
         if validation_options.get('banner_mismatches', False):
             results['banner_mismatches'] = self.check_banner_mismatches(df)
+            report('banner_mismatches')
         
         # Trade validation using C column
         if validation_options.get('trade_errors', False):
             results['trade_errors'] = self.check_trade_errors(df)
+            report('trade_errors')
         
         # Address validation using J and K columns
         if validation_options.get('address_column_mismatches', False):
             results['address_column_mismatches'] = self.check_address_column_mismatches(df)
+            report('address_column_mismatches')
         
         # Z Code validation using AL column
         if validation_options.get('z_code_errors', False):
             results['z_code_errors'] = self.check_z_code_errors(df)
+            report('z_code_errors')
         
         if validation_options.get('banned_addresses', False) and column_mapping.get('address'):
             results['banned_addresses'] = self.check_banned_addresses(df, column_mapping['address'])
+            report('banned_addresses')
         
         if validation_options.get('address_mismatches', False):
             results['address_mismatches'] = self.check_address_mismatches(df, column_mapping)
+            report('address_mismatches')
         
         # Check states in O and P columns for non-US states
         if validation_options.get('non_us_states', False):
             results['non_us_states'] = self.check_non_us_states_op_columns(df)
+            report('non_us_states')
         
         if validation_options.get('duplicate_addresses', False) and column_mapping.get('address'):
             results['duplicate_addresses'] = self.check_duplicate_addresses(df, column_mapping['address'])
+            report('duplicate_addresses')
         
         if validation_options.get('incomplete_addresses', False):
             results['incomplete_addresses'] = self.check_incomplete_addresses(df, column_mapping)
+            report('incomplete_addresses')
         
         if validation_options.get('invalid_zip_codes', False) and column_mapping.get('zip'):
             results['invalid_zip_codes'] = self.check_invalid_zip_codes(df, column_mapping['zip'])
+            report('invalid_zip_codes')
         
-        return results
+        # Cross-check ZIP codes against the states in O and P columns
+        if validation_options.get('zip_state_mismatches', False) and column_mapping.get('zip'):
+            results['zip_state_mismatches'] = self.check_zip_state_mismatches(df, column_mapping['zip'])
+            report('zip_state_mismatches')
     
     def check_banned_addresses(self, df: pd.DataFrame, address_column: str) -> List[Dict[str, Any]]:
         """Check for banned address patterns"""
-        banned_addresses = []
+        banned_addresses = self._issue_list('banned_addresses')
         
-        if address_column not in df.columns:
+        addresses = self._normalized_column(df, address_column)
+        if addresses is None:
             return banned_addresses
         
+        # First banned pattern found in each distinct address
+        matched = [next((pattern for pattern, regex in self._banned_regexes if regex.search(text)), None)
+                   for text in addresses.text]
+        has_match = np.fromiter((pattern is not None for pattern in matched), dtype=bool, count=len(matched))
+        
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        for idx, address in df[address_column].fillna('').items():
-            idx = int(idx)  # Ensure idx is int
-            address_str = str(address)
-            for pattern in self.banned_address_patterns:
-                if re.search(pattern, address_str):
-                    banned_record = {
-                        'row': idx + 1,
-                        'address': address_str,
-                        'reason': 'Contains banned pattern',
-                        'pattern_matched': pattern
-                    }
-                    
-                    # Add Job ID and Client Store ID if available
-                    if ao_column is not None:
-                        job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                        banned_record['job_id'] = job_id
-                    
-                    if ap_column is not None:
-                        client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                        banned_record['client_store_id'] = client_store_id
-                    
-                    banned_addresses.append(banned_record)
-                    break
+        ao_values, ap_values = self._id_column_values(df)
+        
+        for idx in self._polled(addresses.rows_where(has_match)):
+            idx = int(idx)
+            code = addresses.codes[idx]
+            banned_record = {
+                'row': idx + 1,
+                'address': addresses.text[code],
+                'reason': 'Contains banned pattern',
+                'pattern_matched': matched[code]
+            }
+            
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(banned_record, ao_values, ap_values, idx)
+            
+            banned_addresses.append(banned_record)
         
         return banned_addresses
     
     def check_address_mismatches(self, df: pd.DataFrame, column_mapping: Dict[str, str]) -> List[Dict[str, Any]]:
         """Check for potential address component mismatches"""
-        mismatches = []
+        mismatches = self._issue_list('address_mismatches')
         
-        address_col = column_mapping.get('address')
-        city_col = column_mapping.get('city')
-        state_col = column_mapping.get('state')
-        zip_col = column_mapping.get('zip')
+        address = self._normalized_column(df, column_mapping.get('address'))
+        city = self._normalized_column(df, column_mapping.get('city'))
+        state = self._normalized_column(df, column_mapping.get('state'))
         
-        if not any([address_col, city_col, state_col, zip_col]):
+        # Both comparisons need the address text
+        if address is None or (city is None and state is None):
             return mismatches
         
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        for idx, row in df.iterrows():
-            idx = int(idx)  # Ensure idx is int
-            issues = []
+        ao_values, ap_values = self._id_column_values(df)
+        
+        # Judge each distinct (address, city, state) combination once on the case-folded text
+        columns = [address, city or address, state or address]
+        codes, verdicts = self.evaluate_factorized([column.factorized(form='folded') for column in columns],
+                                                   lambda a, c, s: self._component_issues(a, c if city else None,
+                                                                                          s if state else None))
+        
+        for idx in self._polled(self.flagged_positions(codes, verdicts)):
+            idx = int(idx)
+            mismatch_record = {
+                'row': idx + 1,
+                'issues': verdicts[codes[idx]],
+                'address': address.value(idx),
+                'city': city.value(idx) if city else '',
+                'state': state.value(idx) if state else ''
+            }
             
-            # Check if city appears in address but differs from city column
-            if address_col and city_col and address_col in df.columns and city_col in df.columns:
-                address = str(row.get(address_col, '')).lower()
-                city = str(row.get(city_col, '')).lower()
-                
-                if city and len(city) > 2 and city in address:
-                    # City found in address, this is generally good
-                    pass
-                elif city and len(city) > 2 and city not in address:
-                    issues.append(f"City '{city}' not found in address")
-            
-            # Check state consistency
-            if address_col and state_col and address_col in df.columns and state_col in df.columns:
-                address = str(row.get(address_col, '')).lower()
-                state = str(row.get(state_col, '')).upper()
-                
-                if state and len(state) >= 2:
-                    state_abbr = state[:2] if len(state) > 2 else state
-                    if state_abbr not in address.upper() and state.lower() not in address:
-                        issues.append(f"State '{state}' not found in address")
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(mismatch_record, ao_values, ap_values, idx)
             
-            if issues:
-                mismatch_record = {
-                    'row': idx + 1,
-                    'issues': issues,
-                    'address': str(row.get(address_col, '')) if address_col else '',
-                    'city': str(row.get(city_col, '')) if city_col else '',
-                    'state': str(row.get(state_col, '')) if state_col else ''
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    mismatch_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    mismatch_record['client_store_id'] = client_store_id
-                
-                mismatches.append(mismatch_record)
+            mismatches.append(mismatch_record)
         
         return mismatches
     
+    @staticmethod
+    def _component_issues(address: Optional[str], city: Optional[str], state: Optional[str]) -> Optional[List[str]]:
+        """City/state problems for one distinct combination of case-folded values, None when it passes"""
+        address = address or ''
+        issues = []
+        
+        # Check if city appears in address but differs from city column
+        if city and len(city) > 2 and city not in address:
+            issues.append(f"City '{city.lower()}' not found in address")
+        
+        # Check state consistency
+        if state and len(state) >= 2:
+            state_abbr = state[:2] if len(state) > 2 else state
+            if state_abbr not in address:
+                issues.append(f"State '{state}' not found in address")
+        
+        return issues or None
+    
     def check_non_us_states(self, df: pd.DataFrame, state_column: str) -> List[Dict[str, Any]]:
         """Check for non-US states"""
         non_us_states = []
@@ -198,298 +402,297 @@ class DataValidator:
         for idx, state in df[state_column].fillna('').items():
             state_str = str(state).strip().upper()
             
-            if not state_str:
+            # Abbreviation, full name or a likely typo of a US state
+            if not state_str or self._is_us_state(state_str):
                 continue
             
-            # Check if it's a valid US state abbreviation
-            if len(state_str) == 2 and state_str in self.us_states:
-                continue
-            
-            # Check if it's a full state name
-            state_lower = state_str.lower()
-            if state_lower in self.state_name_to_abbr:
-                continue
-            
-            # Check if it might be a typo of a US state
-            is_likely_us_state = False
-            for us_state in list(self.us_states) + list(self.state_name_to_abbr.keys()):
-                if abs(len(state_str) - len(us_state)) <= 2:  # Similar length
-                    # Simple similarity check
-                    matches = sum(1 for a, b in zip(state_str.lower(), us_state.lower()) if a == b)
-                    if matches / max(len(state_str), len(us_state)) > 0.7:
-                        is_likely_us_state = True
-                        break
-            
-            if not is_likely_us_state:
-                non_us_states.append({
-                    'row': idx + 1,
-                    'state': state_str,
-                    'reason': 'Not a recognized US state or territory'
-                })
+            non_us_states.append({
+                'row': idx + 1,
+                'state': state_str,
+                'reason': 'Not a recognized US state or territory'
+            })
         
         return non_us_states
     
     def check_duplicate_addresses(self, df: pd.DataFrame, address_column: str) -> List[Dict[str, Any]]:
         """Check for duplicate addresses"""
-        duplicates = []
+        duplicates = self._issue_list('duplicate_addresses')
         
-        if address_column not in df.columns:
+        addresses = self._normalized_column(df, address_column)
+        if addresses is None:
             return duplicates
         
-        # Normalize addresses for comparison
-        df_copy = df.copy()
-        df_copy['normalized_address'] = df_copy[address_column].fillna('').astype(str).str.lower().str.strip()
+        # Compare canonical forms so "123 Main Street" and "123 MAIN ST." are duplicates
+        keys, key_texts = pd.factorize(addresses.canonical)
+        row_keys = np.where(addresses.codes >= 0, keys[addresses.codes] if len(keys) else -1, -1)
         
-        # Find duplicates
-        duplicate_groups = df_copy.groupby('normalized_address').size()
-        duplicate_addresses = duplicate_groups[duplicate_groups > 1].index
+        # Skip empty addresses
+        empty = np.flatnonzero(key_texts == '')
+        if len(empty):
+            row_keys[row_keys == empty[0]] = -1
         
-        for addr in duplicate_addresses:
-            if addr:  # Skip empty addresses
-                duplicate_rows = df_copy[df_copy['normalized_address'] == addr].index.tolist()
-                duplicates.append({
-                    'address': addr,
-                    'rows': [row + 1 for row in duplicate_rows],
-                    'count': len(duplicate_rows)
-                })
+        counts = np.bincount(row_keys[row_keys >= 0], minlength=len(key_texts))
+        order = np.argsort(row_keys, kind='stable')
+        starts = np.searchsorted(row_keys[order], np.arange(len(key_texts)))
+        
+        for key in sorted(np.flatnonzero(counts > 1), key=lambda key: key_texts[key]):
+            rows = order[starts[key]:starts[key] + counts[key]]
+            duplicates.append({
+                'address': key_texts[key],
+                'rows': [int(row) + 1 for row in rows],
+                'count': int(counts[key])
+            })
         
         return duplicates
     
     def check_incomplete_addresses(self, df: pd.DataFrame, column_mapping: Dict[str, str]) -> List[Dict[str, Any]]:
         """Check for incomplete or missing address components"""
-        incomplete = []
+        incomplete = self._issue_list('incomplete_addresses')
         
-        address_col = column_mapping.get('address')
-        city_col = column_mapping.get('city')
-        state_col = column_mapping.get('state')
-        zip_col = column_mapping.get('zip')
+        components = {name: self._normalized_column(df, column_mapping.get(name))
+                      for name in ('address', 'city', 'state', 'zip')}
+        blanks = {name: column.missing_or_blank() for name, column in components.items() if column is not None}
+        if not blanks:
+            return incomplete
         
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        for idx, row in df.iterrows():
-            idx = int(idx)  # Ensure idx is int
-            missing_components = []
-            
-            if address_col and address_col in df.columns:
-                if pd.isna(row.get(address_col)) or not str(row.get(address_col, '')).strip():
-                    missing_components.append('address')
-            
-            if city_col and city_col in df.columns:
-                if pd.isna(row.get(city_col)) or not str(row.get(city_col, '')).strip():
-                    missing_components.append('city')
+        ao_values, ap_values = self._id_column_values(df)
+        
+        for idx in self._polled(np.flatnonzero(np.logical_or.reduce(list(blanks.values())))):
+            idx = int(idx)
+            incomplete_record = {
+                'row': idx + 1,
+                'missing_components': [name for name, blank in blanks.items() if blank[idx]]
+            }
+            for name, column in components.items():
+                incomplete_record[name] = column.value(idx) if column is not None else ''
             
-            if state_col and state_col in df.columns:
-                if pd.isna(row.get(state_col)) or not str(row.get(state_col, '')).strip():
-                    missing_components.append('state')
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(incomplete_record, ao_values, ap_values, idx)
             
-            if zip_col and zip_col in df.columns:
-                if pd.isna(row.get(zip_col)) or not str(row.get(zip_col, '')).strip():
-                    missing_components.append('zip')
-            
-            if missing_components:
-                incomplete_record = {
-                    'row': idx + 1,
-                    'missing_components': missing_components,
-                    'address': str(row.get(address_col, '')) if address_col else '',
-                    'city': str(row.get(city_col, '')) if city_col else '',
-                    'state': str(row.get(state_col, '')) if state_col else '',
-                    'zip': str(row.get(zip_col, '')) if zip_col else ''
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    incomplete_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    incomplete_record['client_store_id'] = client_store_id
-                
-                incomplete.append(incomplete_record)
+            incomplete.append(incomplete_record)
         
         return incomplete
     
     def check_invalid_zip_codes(self, df: pd.DataFrame, zip_column: str) -> List[Dict[str, Any]]:
         """Check for invalid ZIP codes"""
-        invalid_zips = []
+        invalid_zips = self._issue_list('invalid_zip_codes')
         
         if zip_column not in df.columns:
             return invalid_zips
         
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
+        ao_values, ap_values = self._id_column_values(df)
         
-        # ZIP code patterns (5 digits or 5+4 format)
-        zip_pattern = re.compile(r'^\d{5}(-\d{4})?$')
+        zip_strings = df[zip_column].fillna('').astype(str).str.strip()
         
-        for idx, zip_code in df[zip_column].fillna('').items():
-            idx = int(idx)  # Ensure idx is int
-            zip_str = str(zip_code).strip()
-            
-            if not zip_str:
-                continue
+        # One regex pass: 5 digits or 5+4 format once any characters other than digits and hyphens are ignored
+        is_valid = zip_strings.str.fullmatch(ZIP_FORMAT_PATTERN).to_numpy(dtype=bool)
+        is_blank = (zip_strings == '').to_numpy(dtype=bool)
+        
+        for idx in self._polled(np.flatnonzero(~is_valid & ~is_blank)):
+            idx = int(idx)
+            invalid_record = {
+                'row': idx + 1,
+                'zip_code': zip_strings.iloc[idx],
+                'reason': 'Invalid ZIP code format (expected 5 digits or 5+4 format)'
+            }
             
-            # Remove any non-digit characters except hyphens
-            cleaned_zip = re.sub(r'[^\d-]', '', zip_str)
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(invalid_record, ao_values, ap_values, idx)
             
-            if not zip_pattern.match(cleaned_zip):
-                invalid_record = {
-                    'row': idx + 1,
-                    'zip_code': zip_str,
-                    'reason': 'Invalid ZIP code format (expected 5 digits or 5+4 format)'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    invalid_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    invalid_record['client_store_id'] = client_store_id
-                
-                invalid_zips.append(invalid_record)
+            invalid_zips.append(invalid_record)
         
         return invalid_zips
     
-    def check_banner_mismatches(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Check banner mismatches using F and G columns with LEFT(F,4)=LEFT(G,4) logic"""
-        banner_mismatches = []
+    def check_zip_state_mismatches(self, df: pd.DataFrame, zip_column: str) -> List[Dict[str, Any]]:
+        """Check that each ZIP code lies in one of the states given in the O and P columns"""
+        zip_state_mismatches = self._issue_list('zip_state_mismatches')
+        layout = self._sheet_layout(df)
         
-        # Check if F and G columns exist (0-based indexing: F=5, G=6)
-        if len(df.columns) < 7:
-            return banner_mismatches
+        # Needs the ZIP column plus the O and P state columns
+        if zip_column not in df.columns or not layout.has(df, 'state_o', 'state_p'):
+            return zip_state_mismatches
         
-        f_column = df.iloc[:, 5]  # F column (6th column, 0-based index 5)
-        g_column = df.iloc[:, 6]  # G column (7th column, 0-based index 6)
+        zip_cells = df[zip_column].iloc[layout.data_start:]
+        zip_strings = zip_cells.fillna('').astype(str).str.strip()
+        zip_states = get_zip_index().lookup_series(zip_cells)
+        o_states = self._normalize_state_column(layout.column(df, 'state_o'))
+        p_states = self._normalize_state_column(layout.column(df, 'state_p'))
         
-        # Get AO and AP columns if they exist (AO=40, AP=41 in 0-based indexing)
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
+        # Only compare rows where both the ZIP and at least one stated state are recognized
+        known = (zip_states != '') & ((o_states != '') | (p_states != ''))
+        mismatched = known & (zip_states != o_states) & (zip_states != p_states)
         
-        for idx in range(3, len(df)):  # Start validation from 4th row (index 3)
-            f_value = str(f_column.iloc[idx]) if pd.notna(f_column.iloc[idx]) else ""
-            g_value = str(g_column.iloc[idx]) if pd.notna(g_column.iloc[idx]) else ""
-            
-            # Skip if G column is blank (don't treat as mismatch)
-            if not g_value.strip():
-                continue
+        # Get AO and AP columns if they exist
+        ao_values, ap_values = self._id_column_values(df)
+        o_raw = layout.full_column(df, 'state_o')
+        p_raw = layout.full_column(df, 'state_p')
+        
+        for pos in self._polled(np.flatnonzero(mismatched)):
+            idx = int(pos) + layout.data_start
+            zip_state = str(zip_states[pos])
+            stated = [str(state) for state in (o_states[pos], p_states[pos]) if state]
+            zip_state_record = {
+                'row': idx + 1,
+                'zip_code': zip_strings.iloc[pos],
+                'zip_state': zip_state,
+                'state_o': str(o_raw.iloc[idx]) if pd.notna(o_raw.iloc[idx]) else "",
+                'state_p': str(p_raw.iloc[idx]) if pd.notna(p_raw.iloc[idx]) else "",
+                'reason': f'ZIP {zip_strings.iloc[pos]} is in {zip_state}, not {"/".join(dict.fromkeys(stated))}'
+            }
             
-            # Apply LEFT(F,4)=LEFT(G,4) logic (case-insensitive)
-            f_left4 = f_value[:4].upper() if len(f_value) >= 4 else f_value.upper()
-            g_left4 = g_value[:4].upper() if len(g_value) >= 4 else g_value.upper()
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(zip_state_record, ao_values, ap_values, idx)
             
-            if f_left4 != g_left4:
-                mismatch_record = {
-                    'row': idx + 1,
-                    'client_banner': f_value,
-                    'matched_info': g_value,
-                    'f_left4': f_left4,
-                    'g_left4': g_left4,
-                    'reason': f'Banner mismatch: "{f_left4}" ≠ "{g_left4}"'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    mismatch_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    mismatch_record['client_store_id'] = client_store_id
-                
-                banner_mismatches.append(mismatch_record)
+            zip_state_mismatches.append(zip_state_record)
+        
+        return zip_state_mismatches
+    
+    def _normalize_state_column(self, column: pd.Series) -> np.ndarray:
+        """Map state abbreviations and full state names to abbreviations; '' when not recognized"""
+        normalized = column.fillna('').astype(str).str.strip().str.upper().map(STATE_LOOKUP)
+        return normalized.fillna('').to_numpy(dtype='<U2')
+    
+    def check_banner_mismatches(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Check banner mismatches using F and G columns with LEFT(F,4)=LEFT(G,4) logic
+        
+        With a banner master list, pairs whose F and G both resolve to master banners pass
+        only when they resolve to the same one; other pairs keep the LEFT-4 comparison.
+        """
+        banner_mismatches = self._issue_list('banner_mismatches')
+        layout = self._sheet_layout(df)
+        
+        # Check if the client banner (F) and matched banner (G) columns exist
+        if not layout.has(df, 'client_banner', 'matched_banner'):
+            return banner_mismatches
+        
+        f_column = layout.column(df, 'client_banner')
+        g_column = layout.column(df, 'matched_banner')
+        
+        # Get AO and AP columns if they exist
+        ao_values, ap_values = self._id_column_values(df)
+        
+        # Banner pairs repeat heavily, so evaluate each distinct (F, G) pair only once
+        banners = self.reference_data.banners if self.reference_data is not None else None
+        if banners is not None:
+            codes, verdicts = self.evaluate_factorized([self._resolved(banners, f_column), self._resolved(banners, g_column)],
+                                                       self._banner_master_verdict)
+        else:
+            codes, verdicts = self.evaluate_distinct([f_column, g_column], self._banner_verdict)
+        
+        for pos in self._polled(self.flagged_positions(codes, verdicts)):
+            idx = int(pos) + layout.data_start
+            mismatch_record = {'row': idx + 1}
+            mismatch_record.update(verdicts[codes[pos]])
+            self._add_id_fields(mismatch_record, ao_values, ap_values, idx)
+            banner_mismatches.append(mismatch_record)
         
         return banner_mismatches
     
+    @staticmethod
+    def _banner_verdict(f_cell: Any, g_cell: Any) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct (F, G) pair, None when the pair passes"""
+        f_value = str(f_cell) if f_cell is not None else ""
+        g_value = str(g_cell) if g_cell is not None else ""
+        
+        # Skip if G column is blank (don't treat as mismatch)
+        if not g_value.strip():
+            return None
+        
+        # Apply LEFT(F,4)=LEFT(G,4) logic (case-insensitive)
+        f_left4 = f_value[:4].upper()
+        g_left4 = g_value[:4].upper()
+        
+        if f_left4 == g_left4:
+            return None
+        
+        return {
+            'client_banner': f_value,
+            'matched_info': g_value,
+            'f_left4': f_left4,
+            'g_left4': g_left4,
+            'reason': f'Banner mismatch: "{f_left4}" ≠ "{g_left4}"'
+        }
+    
+    def _banner_master_verdict(self, f_entry: Optional[Tuple[Any, int]], g_entry: Optional[Tuple[Any, int]]) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct pair of (F cell, master record) and (G cell, master record)"""
+        f_cell, f_record = f_entry if f_entry is not None else (None, UNRESOLVED)
+        g_cell, g_record = g_entry if g_entry is not None else (None, UNRESOLVED)
+        
+        # Not both in the master list (or G blank): fall back to LEFT(F,4)=LEFT(G,4)
+        if f_record == UNRESOLVED or g_record == UNRESOLVED:
+            return self._banner_verdict(f_cell, g_cell)
+        
+        if f_record == g_record:
+            return None
+        
+        banners = self.reference_data.banners
+        return {
+            'client_banner': str(f_cell),
+            'matched_info': str(g_cell),
+            'client_master': banners.name(f_record),
+            'matched_master': banners.name(g_record),
+            'reason': f'Banner mismatch: "{banners.name(f_record)}" and "{banners.name(g_record)}" are different master banners'
+        }
+    
     def check_non_us_states_op_columns(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """Check for non-US states in O and P columns"""
-        non_us_states = []
+        non_us_states = self._issue_list('non_us_states')
+        layout = self._sheet_layout(df)
         
-        # Check if O and P columns exist (0-based indexing: O=14, P=15)
-        if len(df.columns) < 16:
+        # Check if the O and P state columns exist
+        if not layout.has(df, 'state_o', 'state_p'):
             return non_us_states
         
-        o_column = df.iloc[:, 14]  # O column (15th column, 0-based index 14)
-        p_column = df.iloc[:, 15]  # P column (16th column, 0-based index 15)
-        
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        for idx in range(3, len(df)):  # Start validation from 4th row (index 3)
-            # Check O column
-            o_value = str(o_column.iloc[idx]) if pd.notna(o_column.iloc[idx]) else ""
-            if o_value.strip() and not self._is_us_state(o_value.strip()):
-                state_record = {
-                    'row': idx + 1,
-                    'column': 'O',
-                    'state': o_value.strip(),
-                    'reason': 'Not a recognized US state or territory'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    state_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    state_record['client_store_id'] = client_store_id
-                
-                non_us_states.append(state_record)
+        ao_values, ap_values = self._id_column_values(df)
+        
+        # Each state column is judged per distinct value; keep the row-then-column order
+        found = []
+        for order, field in enumerate(('state_o', 'state_p')):
+            codes, verdicts = self.evaluate_distinct([layout.column(df, field)], self._state_verdict)
+            for pos in self._polled(self.flagged_positions(codes, verdicts)):
+                found.append((int(pos), order, layout.letter(field), verdicts[codes[pos]]))
+        found.sort(key=lambda item: (item[0], item[1]))
+        
+        for pos, _, column_letter, verdict in found:
+            idx = pos + layout.data_start
+            state_record = {'row': idx + 1, 'column': column_letter}
+            state_record.update(verdict)
             
-            # Check P column
-            p_value = str(p_column.iloc[idx]) if pd.notna(p_column.iloc[idx]) else ""
-            if p_value.strip() and not self._is_us_state(p_value.strip()):
-                state_record = {
-                    'row': idx + 1,
-                    'column': 'P',
-                    'state': p_value.strip(),
-                    'reason': 'Not a recognized US state or territory'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    state_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    state_record['client_store_id'] = client_store_id
-                
-                non_us_states.append(state_record)
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(state_record, ao_values, ap_values, idx)
+            
+            non_us_states.append(state_record)
         
         return non_us_states
     
+    def _state_verdict(self, state_cell: Any) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct state cell value, None when it is blank or a US state"""
+        state_value = str(state_cell).strip() if state_cell is not None else ""
+        if not state_value or self._is_us_state(state_value):
+            return None
+        return {'state': state_value, 'reason': 'Not a recognized US state or territory'}
+    
     def _is_us_state(self, state_value: str) -> bool:
         """Helper method to check if a state value is a valid US state"""
         state_str = state_value.upper().strip()
         
-        # Skip header-like text (Column D header text)
-        header_texts = ['CLIENT STATE', 'CLIENTSTATE', 'STATE', 'CLIENT', 'STATES', 
-                       'CLIENT BANNED', 'CLIENTBANNED', 'BANNED', 'CLIENT ADDRESS', 
-                       'CLIENTADDRESS', 'ADDRESS', 'Z CODE', 'ZCODE']
-        if state_str in header_texts:
-            return True  # Treat header text as valid to skip validation
-        
         # Check if it's a valid US state abbreviation
-        if len(state_str) == 2 and state_str in self.us_states:
+        if len(state_str) == 2 and state_str in US_STATES:
             return True
         
         # Check if it's a full state name
         state_lower = state_str.lower()
-        if state_lower in self.state_name_to_abbr:
+        if state_lower in STATE_NAME_TO_ABBR:
             return True
         
         # Check if it might be a typo of a US state (similarity check)
-        for us_state in list(self.us_states) + list(self.state_name_to_abbr.keys()):
+        for us_state in _STATE_CANDIDATES:
             if abs(len(state_str) - len(us_state)) <= 2:  # Similar length
                 # Simple similarity check
-                matches = sum(1 for a, b in zip(state_str.lower(), us_state.lower()) if a == b)
+                matches = sum(1 for a, b in zip(state_lower, us_state) if a == b)
                 if matches / max(len(state_str), len(us_state)) > 0.7:
                     return True
         
@@ -497,151 +700,373 @@ class DataValidator:
     
     def check_trade_errors(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """Check C column for valid trade codes (05, 03, 07)"""
-        trade_errors = []
+        trade_errors = self._issue_list('trade_errors')
+        layout = self._sheet_layout(df)
         
-        # Check if C column exists (0-based indexing: C=2)
-        if len(df.columns) < 3:
+        # Check if the trade code column (C) exists
+        if not layout.has(df, 'trade_code'):
             return trade_errors
         
-        c_column = df.iloc[:, 2]  # C column (3rd column, 0-based index 2)
-        
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        # Valid trade codes
-        valid_trade_codes = ['05', '03', '07']
+        ao_values, ap_values = self._id_column_values(df)
         
-        # Header text to exclude (Column D and other header text)
-        header_texts = ['trade class', 'tradeclass', 'trade', 'class', 'client banned', 
-                       'clientbanned', 'banned', 'client address', 'clientaddress', 
-                       'address', 'z code', 'zcode']
+        codes, verdicts = self.evaluate_distinct([layout.column(df, 'trade_code')], self._trade_verdict)
         
-        for idx in range(3, len(df)):  # Start validation from 4th row (index 3)
-            c_value = str(c_column.iloc[idx]).strip() if pd.notna(c_column.iloc[idx]) else ""
+        for pos in self._polled(self.flagged_positions(codes, verdicts)):
+            idx = int(pos) + layout.data_start
+            trade_record = {'row': idx + 1}
+            trade_record.update(verdicts[codes[pos]])
             
-            # Skip empty values and header-like text
-            if not c_value or c_value.lower() in header_texts:
-                continue
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(trade_record, ao_values, ap_values, idx)
             
-            if c_value not in valid_trade_codes:
-                trade_record = {
-                    'row': idx + 1,
-                    'trade_code': c_value,
-                    'reason': f'Invalid trade code "{c_value}" (valid codes: 05, 03, 07)'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    trade_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    trade_record['client_store_id'] = client_store_id
-                
-                trade_errors.append(trade_record)
+            trade_errors.append(trade_record)
         
         return trade_errors
     
+    @staticmethod
+    def _trade_verdict(c_cell: Any) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct trade code, None when it is blank or valid"""
+        # Valid trade codes
+        valid_trade_codes = ['05', '03', '07']
+        
+        c_value = str(c_cell).strip() if c_cell is not None else ""
+        if not c_value or c_value in valid_trade_codes:
+            return None
+        
+        return {
+            'trade_code': c_value,
+            'reason': f'Invalid trade code "{c_value}" (valid codes: 05, 03, 07)'
+        }
+    
     def check_address_column_mismatches(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Check address mismatches using J and K columns with LEFT formula logic"""
-        address_mismatches = []
+        """Check address mismatches using J and K columns with LEFT formula logic
         
-        # Check if J and K columns exist (0-based indexing: J=9, K=10)
-        if len(df.columns) < 11:
+        With a store address master list, pairs whose J and K both resolve to master
+        addresses pass only when they resolve to the same store.
+        """
+        address_mismatches = self._issue_list('address_column_mismatches')
+        layout = self._sheet_layout(df)
+        
+        # Check if the client address (J) and matched address (K) columns exist
+        if not layout.has(df, 'client_address', 'matched_address'):
             return address_mismatches
         
-        j_column = df.iloc[:, 9]   # J column (10th column, 0-based index 9)
-        k_column = df.iloc[:, 10]  # K column (11th column, 0-based index 10)
+        j_column = self._normalized_column(df, layout.columns['client_address'])
+        k_column = self._normalized_column(df, layout.columns['matched_address'])
         
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
-        
-        # Header text to exclude
-        header_texts = ['client address', 'clientaddress', 'address', 'client banned', 
-                       'clientbanned', 'banned']
+        ao_values, ap_values = self._id_column_values(df)
+        
+        # Address pairs repeat heavily, so evaluate each distinct (J, K) pair only once
+        addresses = self.reference_data.addresses if self.reference_data is not None else None
+        if addresses is not None:
+            codes, verdicts = self.evaluate_factorized([self._resolved_normalized(addresses, j_column, layout.data_start),
+                                                        self._resolved_normalized(addresses, k_column, layout.data_start)],
+                                                       self._address_master_verdict)
+        else:
+            codes, verdicts = self.evaluate_factorized([j_column.factorized(layout.data_start),
+                                                        k_column.factorized(layout.data_start)],
+                                                       self._address_pair_verdict)
+        
+        for pos in self._polled(self.flagged_positions(codes, verdicts)):
+            idx = int(pos) + layout.data_start
+            mismatch_record = {'row': idx + 1}
+            mismatch_record.update(verdicts[codes[pos]])
+            self._add_id_fields(mismatch_record, ao_values, ap_values, idx)
+            address_mismatches.append(mismatch_record)
         
-        for idx in range(3, len(df)):  # Start validation from 4th row (index 3)
-            j_value = str(j_column.iloc[idx]) if pd.notna(j_column.iloc[idx]) else ""
-            k_value = str(k_column.iloc[idx]) if pd.notna(k_column.iloc[idx]) else ""
-            
-            # Skip if K column is blank or contains header text (don't treat as mismatch)
-            if not k_value.strip() or j_value.lower().strip() in header_texts or k_value.lower().strip() in header_texts:
+        return address_mismatches
+    
+    @staticmethod
+    def _address_pair_verdict(j_cell: Any, k_cell: Any) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct (J, K) pair, None when the pair passes"""
+        j_value = str(j_cell) if j_cell is not None else ""
+        k_value = str(k_cell) if k_cell is not None else ""
+        
+        # Skip if K column is blank (don't treat as mismatch)
+        if not k_value.strip():
+            return None
+        
+        # Apply LEFT formula logic (case-insensitive)
+        # Use first 4 characters for comparison, similar to banner validation
+        j_left4 = j_value[:4].upper()
+        k_left4 = k_value[:4].upper()
+        
+        if j_left4 == k_left4:
+            return None
+        
+        return {
+            'client_address': j_value,
+            'reference_info': k_value,
+            'j_left4': j_left4,
+            'k_left4': k_left4,
+            'reason': f'Address mismatch: "{j_left4}" ≠ "{k_left4}"'
+        }
+    
+    def _address_master_verdict(self, j_entry: Optional[Tuple[str, int]], k_entry: Optional[Tuple[str, int]]) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct pair of (J text, master record) and (K text, master record)"""
+        j_text, j_record = j_entry if j_entry is not None else (None, UNRESOLVED)
+        k_text, k_record = k_entry if k_entry is not None else (None, UNRESOLVED)
+        
+        # Not both in the master list (or K blank): fall back to LEFT(J,4)=LEFT(K,4)
+        if j_record == UNRESOLVED or k_record == UNRESOLVED:
+            return self._address_pair_verdict(j_text, k_text)
+        
+        if j_record == k_record:
+            return None
+        
+        addresses = self.reference_data.addresses
+        return {
+            'client_address': j_text,
+            'reference_info': k_text,
+            'client_master': addresses.record_id(j_record),
+            'matched_master': addresses.record_id(k_record),
+            'reason': f'Address mismatch: "{j_text}" and "{k_text}" are different master stores '
+                      f'({addresses.record_id(j_record)} vs {addresses.record_id(k_record)})'
+        }
+    
+    def check_cross_batch_repeats(self, df: pd.DataFrame, file_hash: str) -> List[Dict[str, Any]]:
+        """Check AO job IDs and AP client store IDs against IDs matched in previously validated files"""
+        cross_batch_repeats = self._issue_list('cross_batch_repeats')
+        
+        if self.cross_batch_index is None:
+            return cross_batch_repeats
+        
+        layout = self._sheet_layout(df)
+        id_labels = {'job': 'Job ID', 'store': 'Client Store ID'}
+        found = []
+        
+        for kind, positions, ids, fingerprints in self.cross_batch_index.file_ids(df, layout.data_start,
+                                                                                  self._cross_batch_columns(layout)):
+            # One bulk lookup per ID column
+            previous = self.cross_batch_index.lookup(kind, list(dict.fromkeys(ids)), exclude_file=file_hash)
+            if not previous:
                 continue
             
-            # Apply LEFT formula logic (case-insensitive)
-            # Use first 4 characters for comparison, similar to banner validation
-            j_left4 = j_value[:4].upper() if len(j_value) >= 4 else j_value.upper()
-            k_left4 = k_value[:4].upper() if len(k_value) >= 4 else k_value.upper()
-            
-            if j_left4 != k_left4:
-                mismatch_record = {
-                    'row': idx + 1,
-                    'client_address': j_value,
-                    'reference_info': k_value,
-                    'j_left4': j_left4,
-                    'k_left4': k_left4,
-                    'reason': f'Address mismatch: "{j_left4}" ≠ "{k_left4}"'
-                }
+            for pos, id_value, banner_fp, address_fp, state_fp in zip(positions, ids, *fingerprints):
+                earlier = previous.get(id_value)
+                if not earlier:
+                    continue
                 
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    mismatch_record['job_id'] = job_id
+                last_file = earlier[-1][0] or 'an earlier file'
+                changed = set()
+                for _, old_banner, old_address, old_state, _ in earlier:
+                    for field, old_fp, new_fp in zip(FINGERPRINT_COLUMNS, (old_banner, old_address, old_state),
+                                                     (banner_fp, address_fp, state_fp)):
+                        if old_fp != new_fp:
+                            changed.add(field)
                 
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    mismatch_record['client_store_id'] = client_store_id
+                if changed:
+                    fields = '/'.join(field for field in FINGERPRINT_COLUMNS if field in changed)
+                    reason = f'{id_labels[kind]} {id_value} was matched to a different {fields} in {last_file}'
+                else:
+                    reason = f'{id_labels[kind]} {id_value} was already matched in {last_file}'
                 
-                address_mismatches.append(mismatch_record)
+                found.append((int(pos), kind, {
+                    'row': int(pos) + 1,
+                    'id_type': id_labels[kind],
+                    'id_value': id_value,
+                    'conflict': bool(changed),
+                    'previous_files': len(earlier),
+                    'last_seen_in': last_file,
+                    'reason': reason
+                }))
         
-        return address_mismatches
+        # Get AO and AP columns if they exist
+        ao_values, ap_values = self._id_column_values(df)
+        
+        found.sort(key=lambda item: (item[0], item[1]))
+        for idx, _, repeat_record in found:
+            self._add_id_fields(repeat_record, ao_values, ap_values, idx)
+            cross_batch_repeats.append(repeat_record)
+        
+        return cross_batch_repeats
+    
+    def _issue_list(self, rule: str) -> List[Dict[str, Any]]:
+        """Issue list for a check, backed by the run's result collector when one is set"""
+        if self._collector is None:
+            return []
+        return self._collector.issue_list(rule)
+    
+    @staticmethod
+    def _resolved(index: MasterIndex, column: pd.Series) -> Tuple[np.ndarray, List[Tuple[Any, int]]]:
+        """(codes, values) of a column whose values are (cell, master record) pairs, resolved in bulk"""
+        codes, uniques = factorize_cells(column)
+        return codes, list(zip(uniques, index.resolve(uniques).tolist()))
+    
+    @staticmethod
+    def _resolved_normalized(index: MasterIndex, column: NormalizedColumn, start: int) -> Tuple[np.ndarray, List[Tuple[str, int]]]:
+        """_resolved for an address column, resolved from its canonical forms"""
+        codes, texts = column.factorized(start)
+        return codes, list(zip(texts, index.resolve(column.canonical, normalized=True).tolist()))
+    
+    def evaluate_distinct(self, columns: List[pd.Series], rule: Callable[..., Any]) -> Tuple[np.ndarray, List[Any]]:
+        """Evaluate a value-only rule once per distinct combination of cell values
+        
+        The columns are factorized into a single integer code per row and rule(*values) is
+        called once for each distinct combination (missing cells are passed as None); equal
+        values of different types, such as 1 and True, count as distinct.
+        Returns (codes, verdicts) where the verdict for row i is verdicts[codes[i]].
+        Only use this for rules whose verdict depends on nothing but the cell values.
+        """
+        return self.evaluate_factorized([factorize_cells(column) for column in columns], rule)
+    
+    def evaluate_factorized(self, factorized: List[Tuple[np.ndarray, Any]], rule: Callable[..., Any]) -> Tuple[np.ndarray, List[Any]]:
+        """evaluate_distinct for columns already split into (codes, values), code -1 meaning missing"""
+        combined = None
+        for column_codes, uniques in factorized:
+            column_codes = np.asarray(column_codes).astype(np.int64) + 1  # 0 is reserved for missing cells
+            if combined is None:
+                combined = column_codes
+            else:
+                # Re-factorize after each column so the combined key stays small
+                combined, _ = pd.factorize(combined * (len(uniques) + 1) + column_codes)
+                combined = combined.astype(np.int64)
+        
+        if combined is None or len(combined) == 0:
+            return np.zeros(0, dtype=np.int64), []
+        
+        codes, _ = pd.factorize(combined)
+        
+        # Read each distinct combination from the first row it occurs in
+        _, first_positions = np.unique(codes, return_index=True)
+        distinct_values = []
+        for column_codes, uniques in factorized:
+            distinct_values.append([uniques[code] if code >= 0 else None for code in np.asarray(column_codes)[first_positions]])
+        
+        combinations = list(zip(*distinct_values))
+        verdicts = []
+        for start in range(0, len(combinations), POLL_EVERY):
+            self._poll()
+            verdicts.extend(rule(*combination) for combination in combinations[start:start + POLL_EVERY])
+        
+        # Every row beyond the first of its combination reuses a verdict
+        CACHE_LOOKUPS.inc(len(codes), cache='distinct_values')
+        CACHE_HITS.inc(len(codes) - len(verdicts), cache='distinct_values')
+        return codes, verdicts
+    
+    @staticmethod
+    def flagged_positions(codes: np.ndarray, verdicts: List[Any]) -> np.ndarray:
+        """Positions of the rows whose broadcast verdict is not None"""
+        if not verdicts:
+            return np.zeros(0, dtype=np.int64)
+        failing = np.fromiter((verdict is not None for verdict in verdicts), dtype=bool, count=len(verdicts))
+        return np.flatnonzero(failing[codes])
+    
+    def _id_column_values(self, df: pd.DataFrame) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """AO (Job ID) and AP (Client Store ID) cell arrays, None when the columns are missing"""
+        layout = self._sheet_layout(df)
+        ao_column = layout.full_column(df, 'job_id')  # AO column (Job ID)
+        ap_column = layout.full_column(df, 'client_store_id')  # AP column (Client Store ID)
+        ao_values = ao_column.to_numpy(dtype=object) if ao_column is not None else None
+        ap_values = ap_column.to_numpy(dtype=object) if ap_column is not None else None
+        return ao_values, ap_values
+    
+    def _polled(self, positions: np.ndarray) -> Iterator[int]:
+        """Row positions for an issue-building loop, checking for cancellation every POLL_EVERY rows"""
+        for start in range(0, len(positions), POLL_EVERY):
+            self._poll()
+            yield from positions[start:start + POLL_EVERY].tolist()
+    
+    def _poll(self):
+        """Stop the current validate_data call if it was cancelled or ran out of time"""
+        if self._cancel_token is not None:
+            self._cancel_token.raise_if_cancelled()
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise DeadlineExceeded()
+    
+    def _normalized_column(self, df: pd.DataFrame, column: Any) -> Optional[NormalizedColumn]:
+        """Shared normalization of an address-like column, by position (int) or column name
+        
+        During validate_data each column is normalized once and reused by every address rule.
+        """
+        if column is None:
+            return None
+        if isinstance(column, (int, np.integer)) and not isinstance(column, bool):
+            if column >= len(df.columns):
+                return None
+            position = int(column)
+        elif column in df.columns:
+            position = df.columns.get_loc(column)
+            if not isinstance(position, int):
+                return None  # duplicate column names
+        else:
+            return None
+        
+        if self._normalized is None:
+            return NormalizedColumn(df.iloc[:, position])
+        if position not in self._normalized:
+            self._normalized[position] = NormalizedColumn(df.iloc[:, position])
+            CACHE_LOOKUPS.inc(cache='address_normalization')
+        else:
+            CACHE_LOOKUPS.inc(cache='address_normalization')
+            CACHE_HITS.inc(cache='address_normalization')
+        return self._normalized[position]
+    
+    def _sheet_layout(self, df: pd.DataFrame) -> SheetLayout:
+        """Layout detected by validate_data, or detected now when a check is called on its own"""
+        if self._layout is not None:
+            return self._layout
+        return detect_layout(df)
+    
+    @staticmethod
+    def _cross_batch_columns(layout: SheetLayout) -> Dict[str, int]:
+        """Physical columns of the ID and fingerprint fields for the cross-batch index"""
+        return {
+            'job': layout.columns['job_id'],
+            'store': layout.columns['client_store_id'],
+            'banner': layout.columns['matched_banner'],
+            'address': layout.columns['matched_address'],
+            'state': layout.columns['state_p']
+        }
+    
+    @staticmethod
+    def _add_id_fields(record: Dict[str, Any], ao_values: Optional[np.ndarray], ap_values: Optional[np.ndarray], idx: int):
+        """Add Job ID and Client Store ID to an issue record if available"""
+        if ao_values is not None:
+            record['job_id'] = str(ao_values[idx]) if pd.notna(ao_values[idx]) else ""
+        
+        if ap_values is not None:
+            record['client_store_id'] = str(ap_values[idx]) if pd.notna(ap_values[idx]) else ""
     
     def check_z_code_errors(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """Check AL column for valid Z codes (777750Z and 777796Z)"""
-        z_code_errors = []
+        z_code_errors = self._issue_list('z_code_errors')
+        layout = self._sheet_layout(df)
         
-        # Check if AL column exists (0-based indexing: AL=37)
-        if len(df.columns) < 38:
+        # Check if the Z code column (AL) exists
+        if not layout.has(df, 'z_code'):
             return z_code_errors
         
-        al_column = df.iloc[:, 37]  # AL column (38th column, 0-based index 37)
-        
         # Get AO and AP columns if they exist
-        ao_column = df.iloc[:, 40] if len(df.columns) > 40 else None  # AO column (Job ID)
-        ap_column = df.iloc[:, 41] if len(df.columns) > 41 else None  # AP column (Client Store ID)
+        ao_values, ap_values = self._id_column_values(df)
         
-        # Valid Z codes
-        valid_z_codes = ['777750Z', '777796Z']
+        codes, verdicts = self.evaluate_distinct([layout.column(df, 'z_code')], self._z_code_verdict)
         
-        # Header text to exclude
-        header_texts = ['z code', 'zcode', 'z-code', 'code']
-        
-        for idx in range(3, len(df)):  # Start validation from 4th row (index 3)
-            z_value = str(al_column.iloc[idx]).strip() if pd.notna(al_column.iloc[idx]) else ""
+        for pos in self._polled(self.flagged_positions(codes, verdicts)):
+            idx = int(pos) + layout.data_start
+            z_code_record = {'row': idx + 1}
+            z_code_record.update(verdicts[codes[pos]])
             
-            # Skip empty/blank values and header-like text
-            if not z_value or z_value.lower() in header_texts:
-                continue
+            # Add Job ID and Client Store ID if available
+            self._add_id_fields(z_code_record, ao_values, ap_values, idx)
             
-            if z_value not in valid_z_codes:
-                z_code_record = {
-                    'row': idx + 1,
-                    'z_code': z_value,
-                    'reason': f'Invalid Z code "{z_value}" (valid codes: 777750Z, 777796Z)'
-                }
-                
-                # Add Job ID and Client Store ID if available
-                if ao_column is not None:
-                    job_id = str(ao_column.iloc[idx]) if pd.notna(ao_column.iloc[idx]) else ""
-                    z_code_record['job_id'] = job_id
-                
-                if ap_column is not None:
-                    client_store_id = str(ap_column.iloc[idx]) if pd.notna(ap_column.iloc[idx]) else ""
-                    z_code_record['client_store_id'] = client_store_id
-                
-                z_code_errors.append(z_code_record)
+            z_code_errors.append(z_code_record)
         
         return z_code_errors
+    
+    @staticmethod
+    def _z_code_verdict(z_cell: Any) -> Optional[Dict[str, Any]]:
+        """Verdict for one distinct Z code, None when it is blank or valid"""
+        # Valid Z codes
+        valid_z_codes = ['777750Z', '777796Z']
+        
+        z_value = str(z_cell).strip() if z_cell is not None else ""
+        if not z_value or z_value in valid_z_codes:
+            return None
+        
+        return {
+            'z_code': z_value,
+            'reason': f'Invalid Z code "{z_value}" (valid codes: 777750Z, 777796Z)'
+        }
@@ -0,0 +1,345 @@
+"""Watch-folder daemon: validate every workbook dropped into the watched folders.
+
+    python watcher.py /shared/matching_exports --output-dir /shared/qc_reports
+
+A file is picked up once it has had no file-system events for --debounce seconds and
+its size and modification time have stopped changing, so half-copied exports are not
+read. Each workbook is validated on a warm process pool and gets two reports, written
+atomically next to it (or into --output-dir):
+
+    <name>.qc.json          row count, issue counts per check, timings
+    <name>.issues.<format>  every issue, see exporters.py
+
+Latency is measured from the first event for the file (it landing) to its reports
+being written, and logged per file with a rolling p50/p95 summary.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+import metrics
+from exporters import EXPORT_FORMATS, export_issues
+from service import ServiceStats
+from worker_pool import PRIMARY_CHECKS, collect_metrics, create_pool, validate_workbook
+
+logger = logging.getLogger('qc.watcher')
+
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+
+# Tries per file when a worker dies under it (a crash is retried once, in case another file caused it)
+MAX_ATTEMPTS = 2
+
+LANDING_TO_REPORT_SECONDS = metrics.REGISTRY.histogram('qc_watcher_landing_to_report_seconds',
+                                                       'Time from a workbook landing to its reports being written')
+
+
+def write_reports(path: str, validation_options: Dict[str, bool], output_dir: Optional[str],
+                  export_format: str, checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Validate one workbook and write its reports (runs inside a worker process)"""
+    outcome = validate_workbook(path, validation_options, checkpoint_dir=checkpoint_dir)
+    started = time.perf_counter()
+
+    directory = output_dir or os.path.dirname(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    issues_path = os.path.join(directory, f"{stem}.issues{EXPORT_FORMATS[export_format][0]}")
+    summary_path = os.path.join(directory, f"{stem}.qc.json")
+
+    # Write under a temporary name and rename, so readers never see half a report
+    partial = issues_path + '.partial'
+    issues = export_issues(outcome['results'], partial, export_format)
+    os.replace(partial, issues_path)
+
+    # Issue counts per banner, state, trade code and job
+    breakdown_path = None
+    rollups = getattr(outcome['results'], 'rollups', None)
+    if rollups is not None:
+        breakdown_path = os.path.join(directory, f"{stem}.breakdown.csv")
+        rollups.to_frame().to_csv(breakdown_path + '.partial', index=False)
+        os.replace(breakdown_path + '.partial', breakdown_path)
+
+    timings = dict(outcome['timings'], write_seconds=time.perf_counter() - started)
+    summary = {
+        'file': os.path.basename(path),
+        'rows': outcome['rows'],
+        'columns': outcome['columns'],
+        'issue_counts': {rule: len(rule_issues) for rule, rule_issues in outcome['results'].items()},
+        'issues': issues,
+        'issues_file': os.path.basename(issues_path),
+        'breakdown_file': os.path.basename(breakdown_path) if breakdown_path else None,
+        'warnings': list(getattr(outcome['results'], 'warnings', [])),
+        'incomplete': getattr(outcome['results'], 'incomplete', False),
+        'timings': timings
+    }
+    with open(summary_path + '.partial', 'w', encoding='utf-8') as handle:
+        json.dump(summary, handle, indent=2, default=str)
+    os.replace(summary_path + '.partial', summary_path)
+
+    return {'rows': outcome['rows'], 'issues': issues, 'summary_path': summary_path, 'timings': timings,
+            'metrics': outcome.get('metrics')}
+
+
+class _LandingHandler(FileSystemEventHandler):
+    """Feeds workbook events into the watcher's debounce table"""
+
+    def __init__(self, watcher: 'FolderWatcher'):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+
+class FolderWatcher:
+    """Debounces landing workbooks and hands the settled ones to the process pool"""
+
+    def __init__(self, folders: List[str], validation_options: Dict[str, bool], output_dir: Optional[str] = None,
+                 export_format: str = 'parquet', max_workers: Optional[int] = None, debounce: float = 2.0,
+                 recursive: bool = False, checkpoint_dir: Optional[str] = None):
+        self.folders = folders
+        self.validation_options = validation_options
+        self.output_dir = output_dir
+        self.export_format = export_format
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.debounce = debounce
+        self.recursive = recursive
+        self.checkpoint_dir = checkpoint_dir
+
+        self.stats = ServiceStats()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}   # path -> landed_at, last_event, signature
+        self._running: Dict[str, float] = {}            # path -> landed_at
+        self._rerun: Dict[str, float] = {}              # changed again while running
+        self._attempts: Dict[str, int] = {}             # worker crashes seen per file
+        self._stop = threading.Event()
+        self._pool = None
+        self._observer = None
+
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._pending) + max(self.stats.in_flight - self.max_workers, 0),
+                                         queue='watcher')
+        metrics.IN_FLIGHT.set_function(lambda: min(self.stats.in_flight, self.max_workers), queue='watcher')
+
+    @staticmethod
+    def is_workbook(path: str) -> bool:
+        name = os.path.basename(path)
+        return name.lower().endswith(WORKBOOK_SUFFIXES) and not name.startswith(('~$', '.'))
+
+    def touch(self, path: str):
+        """Record a file-system event for path; restarts its quiet period"""
+        if not self.is_workbook(path):
+            return
+        path = os.path.abspath(path)
+        now = time.time()
+        signature = _signature(path)
+        with self._lock:
+            if path in self._running:
+                self._rerun.setdefault(path, now)
+                return
+            entry = self._pending.setdefault(path, {'landed_at': now})
+            entry['last_event'] = now
+            entry['signature'] = signature
+
+    def start(self, process_existing: bool = False):
+        self._pool = create_pool(self.max_workers)
+        self._observer = Observer()
+        for folder in self.folders:
+            self._observer.schedule(_LandingHandler(self), folder, recursive=self.recursive)
+        self._observer.start()
+
+        if process_existing:
+            for folder in self.folders:
+                for root, dirs, files in os.walk(folder):
+                    for name in files:
+                        self.touch(os.path.join(root, name))
+                    if not self.recursive:
+                        break
+
+        logger.info("Watching %s with %d workers (debounce %.1fs)", ', '.join(self.folders), self.max_workers, self.debounce)
+
+    def run_forever(self, poll_interval: float = 0.25, summary_interval: float = 60.0):
+        last_summary = time.time()
+        try:
+            while not self._stop.wait(poll_interval):
+                self.dispatch_settled()
+                if time.time() - last_summary >= summary_interval:
+                    self.log_summary()
+                    last_summary = time.time()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def dispatch_settled(self):
+        """Submit every pending file that has been quiet for the debounce period and stopped growing"""
+        now = time.time()
+        with self._lock:
+            candidates = [(path, entry) for path, entry in self._pending.items()
+                          if now - entry['last_event'] >= self.debounce]
+
+        for path, entry in candidates:
+            signature = _signature(path)
+            if signature is None:
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+
+            if signature != entry['signature'] or not zipfile.is_zipfile(path):
+                # Still changing (or not a complete zip yet): look again after another quiet period
+                with self._lock:
+                    entry['signature'] = signature
+                    entry['last_event'] = now
+                continue
+
+            with self._lock:
+                self._pending.pop(path, None)
+            self._submit(path, entry)
+
+    def _submit(self, path: str, entry: Dict[str, Any]):
+        pool = self._pool
+        try:
+            future = pool.submit(write_reports, path, self.validation_options, self.output_dir, self.export_format,
+                                 self.checkpoint_dir)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            self._retry(path, entry['landed_at'])
+            return
+        with self._lock:
+            self._running[path] = entry['landed_at']
+            self.stats.in_flight += 1
+        future.add_done_callback(lambda done, path=path, pool=pool: self._finished(path, done, pool))
+
+    def _replace_pool(self, broken):
+        """Swap a pool that lost a worker (e.g. to the OOM killer) for a new one, once per broken pool"""
+        with self._lock:
+            if self._pool is not broken or self._stop.is_set():
+                return
+            self._pool = create_pool(self.max_workers)
+        logger.warning("A validation worker died; restarted the process pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _retry(self, path: str, landed_at: float):
+        """Put a file back in the queue, ready to go on the next dispatch"""
+        with self._lock:
+            self._pending[path] = {'landed_at': landed_at, 'last_event': time.time() - self.debounce,
+                                   'signature': _signature(path)}
+
+    def _finished(self, path: str, future: Future, pool=None):
+        with self._lock:
+            landed_at = self._running.pop(path)
+            self.stats.in_flight -= 1
+            changed_at = self._rerun.pop(path, None)
+            if changed_at is not None:
+                # Modified while we were validating it: validate the new version too
+                self._pending[path] = {'landed_at': changed_at, 'last_event': changed_at, 'signature': _signature(path)}
+
+        latency = time.time() - landed_at
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_pool(pool)
+            attempts = self._attempts[path] = self._attempts.get(path, 0) + 1
+            if changed_at is None and attempts < MAX_ATTEMPTS:
+                logger.warning("%s: worker died during validation; trying again", os.path.basename(path))
+                self._retry(path, landed_at)
+                return
+        self._attempts.pop(path, None)
+        try:
+            outcome = future.result()
+        except Exception as e:
+            self.stats.record(latency, ok=False)
+            logger.error("%s: validation failed after %.2fs: %s", os.path.basename(path), latency, e)
+            return
+
+        collect_metrics(outcome)
+        LANDING_TO_REPORT_SECONDS.observe(latency)
+        self.stats.record(latency)
+        timings = outcome['timings']
+        logger.info("%s: %d rows, %d issues, report after %.2fs (parse %.2fs, validate %.2fs, write %.2fs)",
+                    os.path.basename(path), outcome['rows'], outcome['issues'], latency,
+                    timings['parse_seconds'], timings['validate_seconds'], timings['write_seconds'])
+
+    def log_summary(self):
+        snapshot = self.stats.snapshot(self.max_workers)
+        with self._lock:
+            waiting = len(self._pending)
+        if not snapshot['requests'] and not waiting and not snapshot['in_flight']:
+            return
+        latency = snapshot['latency_seconds']
+        logger.info("%d files done (%d failed), %d in flight, %d settling; landing-to-report p50 %s, p95 %s",
+                    snapshot['requests'], snapshot['failures'], snapshot['in_flight'], waiting,
+                    _seconds(latency['p50']), _seconds(latency['p95']))
+
+
+def _signature(path: str):
+    """(size, mtime) of a file, None once it is gone"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _seconds(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate workbooks as soon as they land in the watched folders')
+    parser.add_argument('folders', nargs='+', help='folders to watch')
+    parser.add_argument('--output-dir', default=None, help='where reports go (default: next to each workbook)')
+    parser.add_argument('--format', default='parquet', choices=list(EXPORT_FORMATS), help='issue export format')
+    parser.add_argument('--checks', nargs='+', default=PRIMARY_CHECKS, help='checks to run (default: primary checks)')
+    parser.add_argument('--workers', type=int, default=None, help='validation worker processes')
+    parser.add_argument('--debounce', type=float, default=2.0, help='seconds a file must be quiet before it is read')
+    parser.add_argument('--recursive', action='store_true', help='also watch subfolders')
+    parser.add_argument('--process-existing', action='store_true', help='validate workbooks already in the folders')
+    parser.add_argument('--summary-interval', type=float, default=60.0, help='seconds between latency summaries')
+    parser.add_argument('--checkpoint-dir', default=None, help='save progress per chunk so a restart resumes large files')
+    parser.add_argument('--metrics-port', type=int, default=None, help='serve Prometheus metrics on this local port')
+    parser.add_argument('--metrics-file', default=None, help='write Prometheus metrics to this file every 15s')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    watcher = FolderWatcher(args.folders, {check: True for check in args.checks}, output_dir=args.output_dir,
+                            export_format=args.format, max_workers=args.workers, debounce=args.debounce,
+                            recursive=args.recursive, checkpoint_dir=args.checkpoint_dir)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file)
+
+    watcher.start(process_existing=args.process_existing)
+    try:
+        watcher.run_forever(summary_interval=args.summary_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Process pool that validates workbooks off the request path.
+
+Importing this module is cheap: pandas, openpyxl and the validator are only imported
+inside worker processes. Where the platform supports it, workers are forked from a
+fork server that imported PRELOAD_MODULES once, so each new worker starts with the
+validation stack already loaded and shares those pages with its siblings.
+
+    python worker_pool.py --benchmark    cold vs warm start timings
+"""
+import argparse
+import hashlib
+import importlib
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+from metrics import PARSE_SECONDS, REGISTRY, STARTUP_SECONDS
+
+# Checks that only rely on the fixed column layout (same set the Streamlit page offers)
+PRIMARY_CHECKS = [
+    'banner_mismatches',
+    'trade_errors',
+    'address_column_mismatches',
+    'z_code_errors',
+    'non_us_states'
+]
+
+# Imported by the fork server before any worker is forked (openpyxl reads the string table and styles)
+PRELOAD_MODULES = ['pandas', 'openpyxl', 'validators', 'checkpoint', 'sampling', 'xlsx_reader']
+
+# One DataValidator per worker process, created by the pool initializer
+_validator = None
+
+# Pool workers hand their metrics back with each result; the parent merges them
+_ship_metrics = False
+
+
+def _init_worker():
+    """Build the validator once so every task in this process reuses it"""
+    global _validator
+    from reference_data import load_reference_data
+    from validators import DataValidator
+    _validator = DataValidator(reference_data=load_reference_data())
+
+
+def prewarm():
+    """Load everything the first validation would otherwise load: imports, ZIP table, validator"""
+    started = time.perf_counter()
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    imported = time.perf_counter()
+
+    from zip_index import get_zip_index
+    get_zip_index()
+    if _validator is None:
+        _init_worker()
+
+    STARTUP_SECONDS.observe(imported - started, phase='import')
+    STARTUP_SECONDS.observe(time.perf_counter() - imported, phase='warm')
+
+
+def _init_pool_worker(warm: bool = False):
+    global _ship_metrics
+    _ship_metrics = True
+    # Forked workers inherit the parent's totals; start from zero so nothing is counted twice
+    REGISTRY.drain()
+    if warm:
+        prewarm()
+    else:
+        _init_worker()
+
+
+def collect_metrics(outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge metrics shipped back by a pool worker into this process's registry"""
+    REGISTRY.merge(outcome.pop('metrics', None))
+    return outcome
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def validate_workbook(path: str, validation_options: Dict[str, bool],
+                      column_mapping: Optional[Dict[str, str]] = None,
+                      checkpoint_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Read a workbook from disk and run the selected checks (runs inside a worker process)
+
+    With checkpoint_dir, progress is saved per chunk and a rerun for the same file resumes.
+    """
+    from checkpoint import validate_with_checkpoints
+    from xlsx_reader import read_xlsx, rule_columns
+
+    global _validator
+    if _validator is None:
+        _init_worker()
+
+    started = time.perf_counter()
+    # The pool already runs a file per core, so the sheet is parsed in this process
+    df = read_xlsx(path, columns=rule_columns(column_mapping or {}), workers=1)
+    parsed = time.perf_counter()
+    PARSE_SECONDS.observe(parsed - started)
+
+    if checkpoint_dir:
+        results = validate_with_checkpoints(_validator, df, column_mapping or {}, validation_options,
+                                            _file_hash(path), checkpoint_dir, file_name=os.path.basename(path))
+    else:
+        results = _validator.validate_data(df, column_mapping or {}, validation_options)
+    finished = time.perf_counter()
+
+    # Calibrates the pre-flight estimate uploads are routed by
+    from preflight import inspect_workbook, load_cost_model
+    try:
+        load_cost_model().observe(inspect_workbook(path), parsed - started,
+                                  None if results.incomplete else finished - parsed)
+    except ValueError:
+        pass  # .xls files have no container to profile
+
+    outcome = {
+        'rows': len(df),
+        'columns': len(df.columns),
+        'results': results,
+        'timings': {
+            'parse_seconds': parsed - started,
+            'validate_seconds': finished - parsed
+        }
+    }
+    if _ship_metrics:
+        outcome['metrics'] = REGISTRY.drain()
+    return outcome
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def estimate_workbook(path: str, validation_options: Dict[str, bool], sample_size: int = 2000,
+                      column_mapping: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Quick mode: read only a stratified sample of rows and estimate per-rule issue rates"""
+    from sampling import read_excel_sample
+
+    global _validator
+    if _validator is None:
+        _init_worker()
+
+    started = time.perf_counter()
+    sample, population_rows = read_excel_sample(path, sample_size)
+    parsed = time.perf_counter()
+    PARSE_SECONDS.observe(parsed - started)
+
+    estimate = _validator.estimate_issue_rates(sample, column_mapping or {}, validation_options,
+                                               population_rows=population_rows)
+    estimate['timings'] = {
+        'parse_seconds': parsed - started,
+        'validate_seconds': time.perf_counter() - parsed
+    }
+    if _ship_metrics:
+        estimate['metrics'] = REGISTRY.drain()
+    return estimate
+
+
+def _pool_context(preload: bool):
+    """Fork server context with PRELOAD_MODULES imported, where the platform has one"""
+    if not preload or 'forkserver' not in multiprocessing.get_all_start_methods():
+        return None
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def create_pool(max_workers: Optional[int] = None, warm: bool = True, preload: bool = True) -> ProcessPoolExecutor:
+    """Create a bounded process pool whose workers are started and initialized up front
+
+    With warm, every worker is started, imports the validation stack and loads the ZIP
+    table before this returns, so the first task runs on a ready worker. With preload,
+    workers are forked from a fork server that already imported it.
+    """
+    max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context(preload),
+                               initializer=_init_pool_worker, initargs=(warm,))
+
+    if warm:
+        # Workers are spawned lazily on submit; force them all up now
+        for future in [pool.submit(_ping) for _ in range(max_workers)]:
+            future.result()
+
+    return pool
+
+
+def _import_seconds(module: str) -> float:
+    """Time to import module in a fresh interpreter"""
+    script = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def benchmark(path: Optional[str] = None, max_workers: int = 2) -> Dict[str, float]:
+    """Cold-start timings: module imports, pool start-up and the first task on cold and warm pools"""
+    timings = {f"import_{module}_seconds": _import_seconds(module)
+               for module in ['worker_pool', 'validators', 'openpyxl']}
+
+    for label, warm, preload in [('cold', False, False), ('warm', True, True)]:
+        started = time.perf_counter()
+        pool = create_pool(max_workers, warm=warm, preload=preload)
+        ready = time.perf_counter()
+        if path:
+            pool.submit(validate_workbook, path, {check: True for check in PRIMARY_CHECKS}).result()
+        else:
+            pool.submit(_init_worker).result()
+        timings[f"{label}_pool_start_seconds"] = ready - started
+        timings[f"{label}_first_task_seconds"] = time.perf_counter() - ready
+        pool.shutdown()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validation worker pool')
+    parser.add_argument('--benchmark', action='store_true', help='print cold vs warm start timings')
+    parser.add_argument('--workbook', help='workbook validated as the first task (default: no file, just start-up)')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for name, seconds in benchmark(args.workbook, args.workers).items():
+            print(f"{name:32s} {seconds:8.3f}")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
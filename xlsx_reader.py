@@ -0,0 +1,695 @@
+"""Parallel .xlsx reader: one large worksheet parsed across processes into typed columns.
+
+    df = read_xlsx(path)                                        # same frame as pd.read_excel(path)
+    df = read_xlsx(path, columns=rule_columns(column_mapping))  # only what the checks read
+    df = read_xlsx_rows(path, [2, 3, 500])                      # the header row and those rows
+
+pd.read_excel parses a sheet on one core through openpyxl cell objects, at about 12us a
+cell. Here the worksheet XML is cut into row-range byte segments at <row> boundaries as
+it is decompressed, so no more than a few segments of it are in memory at once. Worker
+processes scan their segments with a regex tokenizer and hand back one typed array per
+column. The shared-string table and the date styles are
+read once with openpyxl's own readers and sent to each worker when it starts.
+
+The parent then stitches the segments in row order. It applies read_excel's rules for
+column types: a column is numeric only when every segment is numeric, and text is
+converted to numbers only when the whole column is numeric text. The resulting frame
+equals pd.read_excel's. The header block (the first HEAD_ROWS rows) is always parsed
+for every column, so detect_layout sees the same header text. With a column subset,
+the other columns are empty below the header block.
+
+.xls files, single-column sheets (read_excel drops their blank rows), sheets without
+rows and sheets whose row numbers repeat or go back go through pd.read_excel.
+
+    python xlsx_reader.py book.xlsx      check against pd.read_excel, with timings
+    python xlsx_reader.py --edge-cases   the same on a generated workbook of awkward cells
+"""
+import argparse
+import datetime
+import html
+import math
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Union
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from layout import HEADER_SCAN_ROWS, detect_layout
+from preflight import sheet_parts
+
+# Rows parsed in the parent for every column before the body is split up
+HEAD_ROWS = HEADER_SCAN_ROWS + 1
+
+# Sheets with less XML than this parse in-process; starting workers costs more
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+# Segments per worker, so one slow segment does not hold up the rest
+SEGMENTS_PER_WORKER = 2
+
+# Largest segment of sheet XML, and the decompressed bytes read from the archive at a time.
+# Segments waiting for a worker are capped at SEGMENTS_PER_WORKER per worker, so the
+# parent holds about workers * SEGMENTS_PER_WORKER * SEGMENT_BYTES of XML at most.
+SEGMENT_BYTES = 4 * 1024 * 1024
+READ_BYTES = 1024 * 1024
+
+# Values read_excel reads as missing (pandas' default na_values)
+NA_STRINGS = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                        '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+# Text read_excel turns into booleans when a whole column is made of them
+BOOL_STRINGS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+_P = rb'(?:\w+:)?'  # any namespace prefix
+_ROW_START = re.compile(rb'<' + _P + rb'row[\s>/]')
+_SHEET_DATA_END = re.compile(rb'</' + _P + rb'sheetData>')
+# A <row ...> start tag, or a whole cell. Cells with r/s/t attributes in the order Excel,
+# openpyxl and xlsxwriter write them and a plain <v> or <is><t> come apart in one match:
+#   row, row attrs | column, style, type, <v> text, <is><t> text, other content | attrs, content
+_TOKEN = re.compile(
+    rb'<' + _P + rb'(?:(row)\b([^>]*)>'
+    rb'|c\s+r="([A-Z]+)\d+"(?:\s+s="(\d+)")?(?:\s+t="(\w+)")?\s*(?:/>|>(?:<' + _P + rb'v>([^<]*)</' + _P + rb'v>'
+    rb'|<' + _P + rb'is><' + _P + rb't>([^<]*)</' + _P + rb't></' + _P + rb'is>|(.*?))</' + _P + rb'c>)'
+    rb'|c\b([^>]*?)(?:/>|>(.*?)</' + _P + rb'c>))', re.S)
+_ROW_NUMBER = re.compile(rb'\br="(\d+)"')
+_CELL_REF = re.compile(rb'\br="([A-Z]+)\d*"')
+_CELL_STYLE = re.compile(rb'\bs="(\d+)"')
+_CELL_TYPE = re.compile(rb'\bt="(\w+)"')
+_VALUE = re.compile(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+_TEXT = re.compile(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', re.S)
+_PHONETIC = re.compile(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+
+
+class SheetContext:
+    """What every segment needs from the rest of the workbook"""
+
+    def __init__(self, shared_strings: List[str], date_styles: frozenset, timedelta_styles: frozenset, epoch):
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.timedelta_styles = timedelta_styles
+        self.epoch = epoch
+
+
+# The SheetContext of the workbook a pool worker was started for
+_context: Optional[SheetContext] = None
+
+
+def _column_index(letters: bytes) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + letter - 64
+    return index - 1
+
+
+def _text(raw: bytes) -> str:
+    """XML character data as the parser would report it"""
+    if b'\r' in raw:
+        raw = raw.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    text = raw.decode('utf-8')
+    return html.unescape(text) if '&' in text else text
+
+
+def _value(kind: bytes, style: Optional[bytes], raw: bytes, context: SheetContext) -> Any:
+    """The value read_excel gets for a cell's <v> text (openpyxl's reading, then pandas' cell conversion)"""
+    if not raw:
+        return None
+    if kind is None or kind == b'n':
+        value = float(raw) if (b'.' in raw or b'E' in raw or b'e' in raw) else int(raw)
+        if context.date_styles and int(style or 0) in context.date_styles:
+            from openpyxl.utils.datetime import from_excel
+            try:
+                return from_excel(value, context.epoch, timedelta=int(style or 0) in context.timedelta_styles)
+            except (OverflowError, ValueError):
+                return math.nan
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+    if kind == b's':
+        return context.shared_strings[int(raw)]
+    if kind == b'str':
+        return _text(raw)
+    if kind == b'b':
+        return bool(int(raw))
+    if kind == b'd':
+        from openpyxl.utils.datetime import from_ISO8601
+        return from_ISO8601(_text(raw))
+    if kind == b'inlineStr':
+        return None  # the text of inline strings is in <is>, not <v>
+    return math.nan  # 'e': error values
+
+
+def _cell_value(kind: Optional[bytes], style: Optional[bytes], body: Optional[bytes], context: SheetContext) -> Any:
+    """The value of a cell from its content (formulas, rich text, ...); None when empty"""
+    if not body:
+        return None
+    if kind == b'inlineStr':
+        if b'rPh' in body:
+            body = _PHONETIC.sub(b'', body)
+        texts = _TEXT.findall(body)
+        return ''.join(_text(text) for text in texts) if b'<' in body else None
+    match = _VALUE.search(body)
+    return _value(kind, style, match.group(1), context) if match else None
+
+
+def _token_value(kind: Optional[bytes], style: Optional[bytes], raw: Optional[bytes], inline: Optional[bytes],
+                 body: Optional[bytes], context: SheetContext) -> Any:
+    """Value of a cell token: its plain <v> text, plain inline string or other content"""
+    if inline is not None:
+        return _text(inline) if kind == b'inlineStr' else None
+    if raw is not None:
+        return _value(kind, style, raw, context)
+    return _cell_value(kind, style, body, context) if body else None
+
+
+def parse_rows(segment: bytes, first_ordinal: int, columns: Optional[frozenset],
+               context: SheetContext) -> Dict[str, Any]:
+    """Cell values of whole <row> elements, one typed array per column
+
+    first_ordinal is the number of rows before the segment, for numbering rows that have
+    no r attribute. first_row / last_row are the sheet rows the arrays cover (the header,
+    row 1, is kept apart); rows missing from the XML in between are empty. With columns,
+    only those 0-based columns are converted, but width still counts every filled cell.
+    ordered is False when a row number repeats or goes back.
+    """
+    header: Optional[List[Any]] = None
+    values: Dict[int, List[Any]] = {}
+    first_row = last_row = last_filled_row = width = 0
+    row_number = first_ordinal
+    previous_row, ordered = 0, True
+    row: Dict[int, Any] = {}
+    skipped: List[tuple] = []
+    row_width = 0
+    position = -1
+
+    def finish_row():
+        nonlocal header, first_row, last_row, last_filled_row, width, row_width, previous_row, ordered
+        if row_number <= previous_row:
+            ordered = False
+        previous_row = row_number
+        # Unconverted cells only matter when one past the last converted one is filled
+        for cell in reversed(skipped):
+            if cell[0] < row_width:
+                break
+            if _token_value(*cell[1:], context) not in (None, ''):
+                row_width = cell[0] + 1
+                break
+        if row_width:
+            last_filled_row = row_number
+            width = max(width, row_width)
+        if row_number == 1:
+            header = [row.get(column, '') for column in range(row_width)]
+            return
+        if not first_row:
+            first_row, last_row = row_number, row_number - 1
+        # Rows the XML skips are empty rows
+        for _ in range(last_row + 1, row_number):
+            for column_values in values.values():
+                column_values.append(None)
+        for column in (columns if columns is not None else values.keys() | row.keys()):
+            column_values = values.get(column)
+            if column_values is None:
+                column_values = values[column] = [None] * (row_number - first_row)
+            column_values.append(row.get(column))
+        last_row = row_number
+
+    column_index = {}
+    for token in _TOKEN.finditer(segment):
+        row_tag, row_attrs, letters, style, kind, raw, inline, body, attrs, other = token.groups()
+        if row_tag:
+            if position >= 0:
+                finish_row()
+            match = _ROW_NUMBER.search(row_attrs)
+            row_number = int(match.group(1)) if match else row_number + 1
+            row, skipped, row_width, position = {}, [], 0, -1
+            continue
+
+        if attrs is not None:
+            letters, style, kind = (match and match.group(1) for match in
+                                    (_CELL_REF.search(attrs), _CELL_STYLE.search(attrs), _CELL_TYPE.search(attrs)))
+            body = other
+        if letters:
+            position = column_index.get(letters)
+            if position is None:
+                position = column_index[letters] = _column_index(letters)
+        else:
+            position += 1
+
+        if columns is not None and position not in columns and row_number != 1:
+            skipped.append((position, kind, style, raw, inline, body))
+            continue
+        value = _token_value(kind, style, raw, inline, body, context)
+        if value is not None and value != '':
+            row[position] = value
+            row_width = position + 1
+    if position >= 0:
+        finish_row()
+
+    return {
+        'header': header,
+        'first_row': first_row,
+        'last_row': last_row,
+        'last_filled_row': last_filled_row,
+        'width': width,
+        'ordered': ordered,
+        'columns': {column: typed_column(column_values) for column, column_values in values.items()}
+    }
+
+
+def _segment_task(segment: bytes, first_ordinal: int, columns: Optional[frozenset]) -> Dict[str, Any]:
+    return parse_rows(segment, first_ordinal, columns, _context)
+
+
+def _init_segment_worker(context: SheetContext):
+    global _context
+    _context = context
+
+
+def typed_column(values: List[Any]) -> Dict[str, Any]:
+    """One segment of a column as read_excel would type it, with what the parent needs to merge segments
+
+    numeric columns come back as int64/float64 (or object when ints and blanks are mixed,
+    so a later object merge keeps them ints); everything else as object with the missing
+    markers turned into NaN.
+    """
+    array = np.array(values, dtype=object)
+    inferred = pd.api.types.infer_dtype(array, skipna=True)
+    missing = pd.isna(array)
+    if inferred == 'empty':
+        return {'numeric': True, 'values': np.full(len(array), np.nan)}
+    if inferred in ('integer', 'floating', 'mixed-integer-float'):
+        if not missing.any() and inferred != 'mixed-integer-float':
+            try:
+                return {'numeric': True, 'values': array.astype(np.int64 if inferred == 'integer' else np.float64)}
+            except OverflowError:
+                pass
+        if inferred == 'floating':
+            return {'numeric': True, 'values': np.where(missing, np.nan, array).astype(np.float64)}
+        array[missing] = np.nan
+        return {'numeric': True, 'values': array}
+
+    # Text and anything mixed: can the whole column still become numbers or booleans?
+    numeric_text = bools = True
+    for value in array:
+        if isinstance(value, str):
+            if value in NA_STRINGS:
+                continue
+            if value not in BOOL_STRINGS:
+                bools = False
+            if numeric_text:
+                try:
+                    float(value)
+                except ValueError:
+                    numeric_text = False
+        elif isinstance(value, bool):
+            continue  # read_excel's numeric conversion takes booleans as 1/0
+        elif value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        elif isinstance(value, (int, float)):
+            bools = False
+        else:
+            numeric_text = bools = False
+        if not numeric_text and not bools:
+            break
+    array[missing | pd.Series(array).isin(NA_STRINGS).to_numpy()] = np.nan
+    return {'numeric': False, 'values': array, 'numeric_text': numeric_text, 'bools': bools}
+
+
+def _merge_column(parts: List[Dict[str, Any]]) -> np.ndarray:
+    """One column from its segments, typed as read_excel types the whole column"""
+    if all(part['numeric'] for part in parts):
+        merged = np.concatenate([part['values'] for part in parts])
+        return merged.astype(np.float64) if merged.dtype == object else merged
+
+    merged = np.concatenate([part['values'].astype(object) for part in parts])
+    if all(part['numeric'] or part['numeric_text'] for part in parts):
+        try:
+            return pd.to_numeric(merged)
+        except (ValueError, TypeError):
+            pass
+    if all(part['bools'] if not part['numeric'] else np.isnan(part['values'].astype(np.float64)).all() for part in parts):
+        # Booleans, with any blanks left as NaN
+        converted = [BOOL_STRINGS.get(value, value) if isinstance(value, str) else value for value in merged]
+        return np.array(converted, dtype=bool if not pd.isna(merged).any() else object)
+    return merged
+
+
+def _empty_part(rows: int) -> Dict[str, Any]:
+    return {'numeric': True, 'values': np.full(rows, np.nan)}
+
+
+def load_context(archive: zipfile.ZipFile) -> SheetContext:
+    """Shared strings, date styles and date epoch, read the way openpyxl reads them"""
+    from openpyxl.reader.strings import read_string_table
+    from openpyxl.styles.stylesheet import Stylesheet
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+    names = set(archive.namelist())
+    shared_strings = []
+    if 'xl/sharedStrings.xml' in names:
+        with archive.open('xl/sharedStrings.xml') as stream:
+            shared_strings = read_string_table(stream)
+
+    date_styles = timedelta_styles = frozenset()
+    if 'xl/styles.xml' in names:
+        stylesheet = Stylesheet.from_tree(ElementTree.fromstring(archive.read('xl/styles.xml')))
+        date_styles, timedelta_styles = frozenset(stylesheet.date_formats), frozenset(stylesheet.timedelta_formats)
+
+    properties = ElementTree.fromstring(archive.read('xl/workbook.xml')).find(f'{_MAIN_NS}workbookPr')
+    date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+    return SheetContext(shared_strings, date_styles, timedelta_styles,
+                        CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900)
+
+
+def row_pieces(stream: BinaryIO, head_rows: int, piece_bytes: int) -> Iterator[bytes]:
+    """The <row> elements of a worksheet stream, in pieces cut at row boundaries while it is read
+
+    The first piece holds the first head_rows rows, the others about piece_bytes each.
+    Nothing is yielded for a sheet without rows.
+    """
+    buffer = bytearray()
+    started = ended = False
+    head = True
+    while True:
+        if not ended:
+            chunk = stream.read(READ_BYTES)
+            searched = max(len(buffer) - 64, 0)
+            buffer += chunk
+            end = _SHEET_DATA_END.search(buffer, searched)
+            if end is not None:
+                del buffer[end.start():]
+            ended = end is not None or not chunk
+        if not started:
+            first = _ROW_START.search(buffer)
+            if first is None:
+                if ended:
+                    return
+                del buffer[:max(len(buffer) - 64, 0)]
+                continue
+            del buffer[:first.start()]
+            started = True
+
+        while True:
+            if head:
+                cut = -1
+                for _ in range(head_rows + 1):
+                    match = _ROW_START.search(buffer, cut + 1)
+                    cut = match and match.start()
+                    if cut is None:
+                        break
+            else:
+                match = _ROW_START.search(buffer, piece_bytes) if len(buffer) > piece_bytes else None
+                cut = match and match.start()
+            if cut is None:
+                break
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+            head = False
+        if ended:
+            if buffer:
+                yield bytes(buffer)
+            return
+
+
+def rule_columns(column_mapping: Optional[Dict[str, Any]] = None) -> Callable[[pd.DataFrame], List[int]]:
+    """columns= argument for read_xlsx: the layout's field columns plus the mapped ones"""
+    def select(head: pd.DataFrame) -> List[int]:
+        selected = {column for column in detect_layout(head).columns.values() if column is not None}
+        for name in (column_mapping or {}).values():
+            if name in head.columns:
+                selected.add(head.columns.get_loc(name))
+        return sorted(selected)
+    return select
+
+
+def read_xlsx(source: Union[str, BinaryIO], columns: Union[None, Iterable[int], Callable[[pd.DataFrame], Iterable[int]]] = None,
+              workers: Optional[int] = None) -> pd.DataFrame:
+    """First worksheet as pd.read_excel(source) reads it, the body parsed by up to workers processes
+
+    columns limits the body to those 0-based columns; a callable gets the header block
+    (as a frame) and returns them. workers defaults to QC_PARSE_WORKERS, else the CPU count.
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        return _read_with_pandas(source)
+
+    with archive:
+        parts = sheet_parts(archive)
+        if not parts:
+            return _read_with_pandas(source)
+        context = load_context(archive)
+        member = archive.getinfo(parts[0][1])
+
+        workers = workers or int(os.environ.get('QC_PARSE_WORKERS', 0)) or os.cpu_count() or 1
+        parallel = workers > 1 and member.file_size >= MIN_PARALLEL_BYTES
+        piece_bytes = SEGMENT_BYTES
+        if parallel:
+            piece_bytes = min(piece_bytes, member.file_size // (workers * SEGMENTS_PER_WORKER) + 1)
+
+        with archive.open(member) as stream:
+            pieces = row_pieces(stream, HEAD_ROWS, piece_bytes)
+            head_piece = next(pieces, None)
+            if head_piece is None:
+                return _read_with_pandas(source)
+
+            # Header block: every column, in this process
+            head = parse_rows(head_piece, 0, None, context)
+            if callable(columns):
+                columns = columns(_frame([dict(head, columns=dict(head['columns']))], head['width'],
+                                         head['last_filled_row']))
+            selected = frozenset(columns) if columns is not None else None
+
+            # Rows without an r attribute are numbered by counting the rows before them
+            numbered = _ROW_NUMBER.search(head_piece, 0, head_piece.index(b'>')) is not None
+
+            def tasks():
+                ordinal = HEAD_ROWS
+                for piece in pieces:
+                    yield piece, ordinal, selected
+                    if not numbered:
+                        ordinal += len(_ROW_START.findall(piece))
+
+            if parallel:
+                segments = _parse_in_pool(tasks(), context, workers)
+            else:
+                segments = [parse_rows(*task, context) for task in tasks()]
+
+    segments = [head] + segments
+    width = max(segment['width'] for segment in segments)
+    last_row = max(segment['last_filled_row'] for segment in segments)
+    if width <= 1 or last_row <= 1 or not _in_order(segments):
+        return _read_with_pandas(source)
+    return _frame(segments, width, last_row)
+
+
+def read_xlsx_rows(source: Union[str, BinaryIO], rows: Iterable[int]) -> pd.DataFrame:
+    """The header row plus the given 1-based sheet rows of the first worksheet
+
+    This is the frame read_excel gives with skiprows dropping every other row, except that
+    its width only counts the rows read. The other rows are skipped by a byte search for
+    their <row> tags, so their cells are never parsed. Reading stops after the last
+    wanted row.
+    """
+    wanted = sorted(set(rows) - {1})
+    numbers = {row: number for number, row in enumerate(wanted, start=2)}
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        return _read_with_pandas(source, wanted)
+
+    with archive:
+        parts = sheet_parts(archive)
+        if not parts:
+            return _read_with_pandas(source, wanted)
+        context = load_context(archive)
+
+        fragments = []
+        row_start = None
+        row_number = 0
+        with archive.open(parts[0][1]) as stream:
+            for piece in row_pieces(stream, 1, SEGMENT_BYTES):
+                if row_start is None:
+                    # One spelling of the tag for the whole sheet, found by a literal search
+                    row_start = re.compile(re.escape(_ROW_START.match(piece).group()[:-1]) + rb'[\s>/]')
+                starts = [match.start() for match in row_start.finditer(piece)] + [len(piece)]
+                for start, end in zip(starts, starts[1:]):
+                    match = _ROW_NUMBER.search(piece, start, piece.index(b'>', start))
+                    number = int(match.group(1)) if match else row_number + 1
+                    if number <= row_number:
+                        return _read_with_pandas(source, wanted)
+                    row_number = number
+                    if number == 1 or number in numbers:
+                        fragments.append(_renumbered(piece[start:end], numbers.get(number, 1)))
+                if wanted and row_number >= wanted[-1]:
+                    break
+
+    segment = parse_rows(b''.join(fragments), 0, None, context)
+    if segment['width'] <= 1 or segment['last_filled_row'] <= 1:
+        return _read_with_pandas(source, wanted)
+    return _frame([segment], segment['width'], segment['last_filled_row'])
+
+
+def _renumbered(row: bytes, number: int) -> bytes:
+    """A <row> element with its r attribute set to number (cells only keep their column letters)"""
+    tag_end = row.index(b'>')
+    start_tag = _ROW_NUMBER.sub(b'', row[:tag_end], 1)
+    name_end = start_tag.index(b'row') + 3
+    return start_tag[:name_end] + b' r="%d"' % number + start_tag[name_end:] + row[tag_end:]
+
+
+def _in_order(segments: List[Dict[str, Any]]) -> bool:
+    """Whether the sheet's rows ascend, within and across segments (openpyxl reads repeats its own way)"""
+    last_row = 1
+    for number, segment in enumerate(segments):
+        if not segment['ordered'] or (number and segment['header'] is not None):
+            return False
+        if segment['first_row']:
+            if segment['first_row'] <= last_row:
+                return False
+            last_row = segment['last_row']
+    return True
+
+
+def _parse_in_pool(tasks: Iterable[tuple], context: SheetContext, workers: int) -> List[Dict[str, Any]]:
+    """parse_rows over the tasks in worker processes, in order, feeding segments as workers free up"""
+    futures, waiting = [], set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(),
+                             initializer=_init_segment_worker, initargs=(context,)) as pool:
+        for task in tasks:
+            if len(waiting) >= workers * SEGMENTS_PER_WORKER:
+                _, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+            futures.append(pool.submit(_segment_task, *task))
+            waiting.add(futures[-1])
+        return [future.result() for future in futures]
+
+
+def _frame(segments: List[Dict[str, Any]], width: int, last_row: int) -> pd.DataFrame:
+    """Stitch parsed segments into read_excel's frame: sheet rows 2 to last_row, width columns"""
+    header = next((segment['header'] for segment in segments if segment['header'] is not None), [])
+    names = list(_column_names(list(header) + [''] * (width - len(header))))
+
+    arrays = {}
+    for column in range(width):
+        parts = []
+        next_row = 2
+        for segment in segments:
+            if not segment['first_row'] or segment['first_row'] > last_row:
+                continue
+            if segment['first_row'] > next_row:
+                parts.append(_empty_part(segment['first_row'] - next_row))
+            count = min(segment['last_row'], last_row) - segment['first_row'] + 1
+            part = segment['columns'].pop(column, None)  # dropped once merged
+            parts.append(_empty_part(count) if part is None else dict(part, values=part['values'][:count]))
+            next_row = segment['first_row'] + count
+        if next_row <= last_row:
+            parts.append(_empty_part(last_row + 1 - next_row))
+        arrays[column] = _merge_column(parts)
+
+    frame = pd.DataFrame(arrays)
+    frame.columns = names
+    return frame
+
+
+def _column_names(header: List[Any]) -> pd.Index:
+    """Header row to column names the way read_excel names them ("Unnamed: 3", "Store.1")"""
+    from pandas.io.parsers import TextParser
+    return TextParser([header], header=0).read().columns
+
+
+def _read_with_pandas(source, rows: Optional[List[int]] = None) -> pd.DataFrame:
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    if rows is None:
+        return pd.read_excel(source)
+    wanted = set(rows)
+    return pd.read_excel(source, skiprows=lambda index: index != 0 and index + 1 not in wanted)
+
+
+def _pool_context():
+    from worker_pool import _pool_context
+    return _pool_context(True)
+
+
+def edge_case_workbook(path: str, rows: int = 400):
+    """Write a sheet of the cells read_xlsx must type exactly as read_excel does
+
+    Most columns change kind halfway down, so segments of one column disagree and the
+    merge has to settle the type.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['id', 'bool_blank', 'bools', 'bool_text_blank', 'bool_number', 'int_then_blank',
+                  'int_then_float', 'numeric_text', 'dates', 'na_text', 'markup', 'errors', 'late'])
+    for row in range(rows):
+        top = row < rows // 2
+        if row == rows // 3:
+            sheet.append([])  # a blank row inside the data
+            continue
+        sheet.append([
+            row,
+            (True, None, False)[row % 3],
+            row % 2 == 0,
+            ('TRUE', None, 'false')[row % 3],
+            True if top else row,
+            row if top else None,
+            row if top else row + 0.5,
+            str(row) if row % 4 else f'{row}.25',
+            datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=row * 7),
+            ('NA', 'n/a', 'text', '')[row % 4],
+            'A & B <c>\r\nline' if row % 5 == 0 else None,
+            '#N/A' if row % 7 == 0 else row,
+            None if top else f'late {row}',
+        ])
+    workbook.save(path)
+
+
+def compare(path: str, workers: Optional[int] = None) -> Dict[str, float]:
+    """Read path both ways; AssertionError when the frames differ"""
+    started = time.perf_counter()
+    expected = pd.read_excel(path)
+    middle = time.perf_counter()
+    actual = read_xlsx(path, workers=workers)
+    finished = time.perf_counter()
+    pd.testing.assert_frame_equal(actual, expected)
+    return {'read_excel_seconds': middle - started, 'read_xlsx_seconds': finished - middle}
+
+
+def main():
+    global MIN_PARALLEL_BYTES
+
+    parser = argparse.ArgumentParser(description='Check read_xlsx against pd.read_excel')
+    parser.add_argument('workbooks', nargs='*')
+    parser.add_argument('--edge-cases', action='store_true', help='also check a generated workbook of awkward cells')
+    parser.add_argument('--workers', type=int, help='processes (default: QC_PARSE_WORKERS, else the CPU count)')
+    parser.add_argument('--split-all', action='store_true', help='split sheets of any size into segments')
+    args = parser.parse_args()
+
+    if args.split_all:
+        MIN_PARALLEL_BYTES = 0
+    with tempfile.TemporaryDirectory() as directory:
+        workbooks = list(args.workbooks)
+        if args.edge_cases:
+            workbooks.append(os.path.join(directory, 'edge_cases.xlsx'))
+            edge_case_workbook(workbooks[-1])
+        if not workbooks:
+            parser.print_help()
+        for path in workbooks:
+            try:
+                timings = compare(path, args.workers)
+            except AssertionError as error:
+                print(f"{os.path.basename(path)}: differs from read_excel\n{error}")
+                continue
+            print(f"{os.path.basename(path)}: same frame; read_excel {timings['read_excel_seconds']:.2f}s, "
+                  f"read_xlsx {timings['read_xlsx_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import csv
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Offline ZIP range -> state table bundled with the tool (military APO/FPO prefixes are not listed)
+ZIP_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data', 'zip_prefix_states.csv')
+
+
+class ZipStateIndex:
+    """Sorted, non-overlapping ZIP ranges stored as NumPy arrays and queried with binary search"""
+
+    def __init__(self, zip_low: np.ndarray, zip_high: np.ndarray, states: np.ndarray):
+        order = np.argsort(zip_low, kind='stable')
+        self.zip_low = np.asarray(zip_low, dtype=np.int32)[order]
+        self.zip_high = np.asarray(zip_high, dtype=np.int32)[order]
+        self.states = np.asarray(states, dtype='<U2')[order]
+
+        if np.any(self.zip_low[1:] <= self.zip_high[:-1]):
+            raise ValueError("ZIP ranges in the state table must not overlap")
+
+    @classmethod
+    def from_csv(cls, path: str = ZIP_TABLE_PATH) -> 'ZipStateIndex':
+        with open(path, newline='') as handle:
+            rows = list(csv.DictReader(handle))
+        return cls(
+            np.array([int(row['zip_low']) for row in rows]),
+            np.array([int(row['zip_high']) for row in rows]),
+            np.array([row['state'].strip().upper() for row in rows])
+        )
+
+    def lookup(self, zip5: np.ndarray) -> np.ndarray:
+        """State abbreviation for each 5-digit ZIP (as integers); '' where unknown or negative"""
+        zip5 = np.asarray(zip5, dtype=np.int64)
+        slots = np.searchsorted(self.zip_low, zip5, side='right') - 1
+        safe_slots = np.clip(slots, 0, len(self.zip_low) - 1)
+        found = (slots >= 0) & (zip5 >= 0) & (zip5 <= self.zip_high[safe_slots])
+        return np.where(found, self.states[safe_slots], '')
+
+    def lookup_series(self, zip_codes: pd.Series) -> np.ndarray:
+        """State abbreviation for each ZIP in a column of ZIP cells; '' when not a ZIP or unknown
+
+        Numeric cells are read by value: Excel stores 02134 as the number 2134 and a column
+        with blanks comes back as float, so 2134.0 is ZIP 02134 rather than the text '2134.0'.
+        """
+        values = pd.Series(zip_codes).reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            return self.lookup(_numeric_zip5(values.to_numpy(dtype=float)))
+        
+        numbers = values.map(_is_number).to_numpy(dtype=bool)
+        zip5 = np.full(len(values), -1, dtype=np.int64)
+        if numbers.any():
+            zip5[numbers] = _numeric_zip5(values[numbers].to_numpy(dtype=float))
+        text = values[~numbers]
+        if len(text):
+            cleaned = text.fillna('').astype(str).str.replace(r'[^\d-]', '', regex=True)
+            digits = cleaned.str.extract(r'^(\d{5})(?:-\d{4})?$', expand=False)
+            zip5[~numbers] = pd.to_numeric(digits, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        return self.lookup(zip5)
+
+
+def _is_number(value) -> bool:
+    """True for int/float cells (bools excluded) that should be read as a ZIP by value"""
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _numeric_zip5(numbers: np.ndarray) -> np.ndarray:
+    """Whole numbers of 4 or 5 digits as ZIP5 integers (a 4-digit number lost its leading zero); -1 otherwise"""
+    with np.errstate(invalid='ignore'):
+        whole = np.isfinite(numbers) & (numbers == np.floor(numbers)) & (numbers >= 1000) & (numbers <= 99999)
+    return np.where(whole, numbers, -1).astype(np.int64)
+
+
+@lru_cache(maxsize=1)
+def get_zip_index() -> ZipStateIndex:
+    """Shared index built from the bundled table on first use"""
+    return ZipStateIndex.from_csv()